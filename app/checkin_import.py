@@ -0,0 +1,287 @@
+# app/checkin_import.py
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert as generic_insert
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .daily_insights_worker import upsert_insight_for_date
+from .embedding_model import rag_enabled
+from .services.feature_snapshot import rebuild_feature_snapshot
+from .streaks import rebuild_streak_state
+
+logger = logging.getLogger("mindgarden.checkin_import")
+
+IMPORT_BATCH_ROWS = 1000
+MAX_REPORTED_ERRORS = 100
+
+CSV_HABIT_PREFIX = "habit_"
+CSV_TRUE = {"1", "true", "yes", "y", "done", "x"}
+CSV_FALSE = {"0", "false", "no", "n"}
+
+
+class ImportFormatError(ValueError):
+    """The payload as a whole is unusable (e.g. a CSV header without date/mood)."""
+
+
+@dataclass
+class CheckinImportReport:
+    received: int = 0
+    imported: int = 0
+    skipped: int = 0  # a check-in already existed for that date
+    failed: int = 0
+    errors: List[Dict] = field(default_factory=list)  # first MAX_REPORTED_ERRORS {"line", "detail"}
+    duration_ms: int = 0
+    rows_per_sec: float = 0.0
+
+    def fail(self, line: int, detail: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+
+# (line number, validated check-in)
+ParsedRow = Tuple[int, schemas.CheckinCreate]
+# Lines that could not be parsed: (line number, error)
+RowError = Tuple[int, str]
+
+
+def _validation_detail(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()
+    )
+
+
+def parse_ndjson(text: str) -> Iterator[ParsedRow | RowError]:
+    """One CheckinCreate JSON object per line; blank lines are ignored."""
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, schemas.CheckinCreate.model_validate_json(line)
+        except ValidationError as exc:
+            yield line_no, _validation_detail(exc)
+
+
+def _csv_habit_columns(header: List[str]) -> Dict[str, int]:
+    columns: Dict[str, int] = {}
+    for name in header:
+        if name in ("date", "mood", "note"):
+            continue
+        suffix = name[len(CSV_HABIT_PREFIX):] if name.startswith(CSV_HABIT_PREFIX) else ""
+        if not suffix.isdigit():
+            raise ImportFormatError(f"Unknown CSV column {name!r}; expected date, mood, note or habit_<id>.")
+        columns[name] = int(suffix)
+    return columns
+
+
+def parse_csv(text: str) -> Iterator[ParsedRow | RowError]:
+    """
+    Header row `date,mood[,note][,habit_<id>...]`. Habit cells take 1/0, true/false,
+    yes/no (case-insensitive); an empty cell records no result for that habit.
+    """
+    reader = csv.DictReader(io.StringIO(text, newline=""))
+    header = [h.strip() for h in (reader.fieldnames or [])]
+    if "date" not in header or "mood" not in header:
+        raise ImportFormatError("CSV header must include 'date' and 'mood' columns.")
+    reader.fieldnames = header
+    habit_columns = _csv_habit_columns(header)
+
+    for raw in reader:
+        line_no = reader.line_num
+        if None in raw:
+            yield line_no, "row has more cells than the header"
+            continue
+        habit_results = []
+        bad_cell = None
+        for column, habit_id in habit_columns.items():
+            cell = (raw.get(column) or "").strip().lower()
+            if not cell:
+                continue
+            if cell not in CSV_TRUE and cell not in CSV_FALSE:
+                bad_cell = f"{column}: expected 1/0, true/false or yes/no, got {raw[column]!r}"
+                break
+            habit_results.append({"habit_id": habit_id, "done": cell in CSV_TRUE})
+        if bad_cell is not None:
+            yield line_no, bad_cell
+            continue
+        note = raw.get("note")
+        try:
+            yield line_no, schemas.CheckinCreate.model_validate(
+                {
+                    "date": (raw.get("date") or "").strip(),
+                    "mood": (raw.get("mood") or "").strip(),
+                    "note": note if note else None,
+                    "habit_results": habit_results,
+                }
+            )
+        except ValidationError as exc:
+            yield line_no, _validation_detail(exc)
+
+
+PARSERS = {"ndjson": parse_ndjson, "csv": parse_csv}
+
+
+def _dialect_insert(db: Session):
+    """ON CONFLICT-capable insert() for the bound dialect, or None."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def _insert_checkins(db: Session, user_id: int, batch: List[schemas.CheckinCreate]) -> Dict[date, int]:
+    """
+    Inserts the batch's check-ins in one executemany, skipping dates the user already
+    has. Returns {date: new checkin id} for the rows actually inserted.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": user_id, "date": c.date, "mood": c.mood, "note": c.note, "created_at": now, "updated_at": now}
+        for c in batch
+    ]
+    insert = _dialect_insert(db)
+    if insert is not None:
+        # Core table, not the ORM entity: the ORM's bulk path would fall back to one
+        # INSERT per row for RETURNING + ON CONFLICT; Core batches them into multi-row
+        # VALUES statements ("insertmanyvalues").
+        table = models.Checkin.__table__
+        stmt = (
+            insert(table)
+            .on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.date])
+            .returning(table.c.date, table.c.id)
+        )
+        return {d: cid for d, cid in db.execute(stmt, rows)}
+
+    # No ON CONFLICT: filter out existing dates first (not race-free; the unique
+    # constraint still rejects a concurrent duplicate and fails the import).
+    existing = {
+        d
+        for (d,) in db.query(models.Checkin.date).filter(
+            models.Checkin.user_id == user_id, models.Checkin.date.in_([c.date for c in batch])
+        )
+    }
+    created = [models.Checkin(**row) for row in rows if row["date"] not in existing]
+    db.add_all(created)
+    db.flush()
+    return {c.date: c.id for c in created}
+
+
+def _insert_batch(
+    db: Session, user_id: int, batch: List[schemas.CheckinCreate], report: CheckinImportReport, touched: Set[int]
+) -> List[int]:
+    """Writes one batch; returns the ids of new check-ins queued for embedding."""
+    ids = _insert_checkins(db, user_id, batch)
+    report.imported += len(ids)
+    report.skipped += len(batch) - len(ids)
+
+    results = []
+    pending = []
+    now = datetime.utcnow()
+    for c in batch:
+        checkin_id = ids.get(c.date)
+        if checkin_id is None:
+            continue
+        for hr in c.habit_results:
+            results.append({"checkin_id": checkin_id, "habit_id": hr.habit_id, "done": hr.done})
+            touched.add(hr.habit_id)
+        if (c.note or "").strip():
+            pending.append({"user_id": user_id, "checkin_id": checkin_id, "created_at": now, "attempts": 0})
+
+    if results:
+        db.execute(generic_insert(models.CheckinHabitResult.__table__), results)
+    if pending and rag_enabled():
+        db.execute(generic_insert(models.PendingEmbedding.__table__), pending)
+        return [p["checkin_id"] for p in pending]
+    return []
+
+
+def import_checkins(
+    db: Session,
+    *,
+    user_id: int,
+    text: str,
+    fmt: str,
+    today: Optional[date] = None,
+    batch_rows: int = IMPORT_BATCH_ROWS,
+) -> Tuple[CheckinImportReport, List[int]]:
+    """
+    Bulk-imports historical check-ins for one user in a single transaction.
+
+    Habit ids are validated against one query of the user's active habits, rows are
+    written `batch_rows` at a time with executemany (ON CONFLICT DO NOTHING on
+    (user_id, date), so existing days are skipped rather than overwritten), and the
+    derived state (habit streaks, the 7-day feature snapshot, today's insight) is
+    recomputed once at the end instead of per row. Invalid rows are reported and
+    skipped; the rest are imported.
+
+    Commits. Returns the report and the ids of check-ins waiting for an embedding
+    (already durable as PendingEmbedding rows; the caller may hand them to the queue).
+    Raises ImportFormatError when the payload as a whole cannot be parsed.
+    """
+    started = time.perf_counter()
+    report = CheckinImportReport()
+    active_habits = {
+        hid
+        for (hid,) in db.query(models.Habit.id).filter(
+            models.Habit.user_id == user_id, models.Habit.active == True  # noqa: E712
+        )
+    }
+
+    touched: Set[int] = set()
+    pending: List[int] = []
+    seen_dates: Set[date] = set()
+    batch: List[schemas.CheckinCreate] = []
+    for line_no, parsed in PARSERS[fmt](text):
+        report.received += 1
+        if isinstance(parsed, str):
+            report.fail(line_no, parsed)
+            continue
+        missing = [hr.habit_id for hr in parsed.habit_results if hr.habit_id not in active_habits]
+        if missing:
+            report.fail(line_no, f"Invalid habit_id(s) for this user: {missing}")
+            continue
+        if parsed.date in seen_dates:
+            report.fail(line_no, f"Duplicate date {parsed.date} in this import.")
+            continue
+        seen_dates.add(parsed.date)
+        batch.append(parsed)
+        if len(batch) >= batch_rows:
+            pending += _insert_batch(db, user_id, batch, report, touched)
+            batch = []
+    if batch:
+        pending += _insert_batch(db, user_id, batch, report, touched)
+
+    if report.imported:
+        if touched:
+            rebuild_streak_state(db, user_id=user_id, habit_ids=sorted(touched))
+        rebuild_feature_snapshot(db, user_id=user_id, today=today)
+        upsert_insight_for_date(db, user_id=user_id, target_date=today or date.today())
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    report.duration_ms = int(elapsed * 1000)
+    report.rows_per_sec = round(report.received / elapsed, 1) if elapsed > 0 else 0.0
+    logger.info(
+        "checkin import user_id=%s received=%s imported=%s skipped=%s failed=%s rows_per_sec=%s",
+        user_id,
+        report.received,
+        report.imported,
+        report.skipped,
+        report.failed,
+        report.rows_per_sec,
+    )
+    return report, pending
@@ -4,18 +4,29 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 import json
-from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session, joinedload
 
-from .models import Checkin, Habit, Insight
+from .models import Checkin, Habit, Insight, InsightWorkerRun
+from .streaks import compute_habit_streaks, get_streak_state, streak_from_state
+
+logger = logging.getLogger("mindgarden.worker")
+
+# Re-scan a little behind the watermark so check-ins committed slightly out of
+# updated_at order (long transactions, clock skew between workers) are not missed.
+WATERMARK_OVERLAP = timedelta(seconds=60)
 
 
 @dataclass(frozen=True)
 class InsightMetrics:
     """Pure computed metrics (no DB objects)."""
     mood_avg_7d: Optional[float]
-    habit_streaks: List[Dict[str, int]]  # [{"habit_id": 123, "streak": 5}, ...]
+    habit_streaks: List[Dict[str, int]]  # [{"habit_id": 123, "streak": 5, "longest_streak": 9}, ...]
 
 
 def _get_contiguous_checkins_ending_on(
@@ -94,6 +105,49 @@ def _compute_habit_streaks(
     target_date: date,
 ) -> List[Dict[str, int]]:
     """
+    Computes the current (and longest) streak per active habit, ending at target_date.
+
+    Rules (same as _compute_habit_streaks_legacy):
+    - Streak counts consecutive days ending at target_date where:
+      (a) a check-in exists for that day AND
+      (b) the habit is marked done for that day.
+    - A missing day or a day with the habit not done (or absent) breaks the streak.
+
+    Reads the materialized habit_streak_state rows (O(habits)); only habits whose state
+    can't answer for target_date (a date before their last done day) fall back to the
+    chunked history query in streaks.compute_habit_streaks.
+    """
+    habit_ids = [
+        r[0]
+        for r in db.query(Habit.id)
+        .filter(Habit.user_id == user_id, Habit.active == True)  # noqa: E712
+        .order_by(Habit.id.asc())
+        .all()
+    ]
+
+    states = get_streak_state(db, user_id=user_id, habit_ids=habit_ids)
+    streaks: Dict[int, Optional[int]] = {hid: streak_from_state(states[hid], target_date) for hid in habit_ids}
+
+    unanswered = [hid for hid, s in streaks.items() if s is None]
+    if unanswered:
+        streaks.update(compute_habit_streaks(db, user_id, target_date, unanswered))
+
+    return [
+        {"habit_id": hid, "streak": int(streaks[hid]), "longest_streak": int(states[hid].longest_streak)}
+        for hid in habit_ids
+    ]
+
+
+def _compute_habit_streaks_legacy(
+    db: Session,
+    *,
+    user_id: int,
+    target_date: date,
+) -> List[Dict[str, int]]:
+    """
+    Reference implementation (walks the full contiguous check-in history in Python).
+    Kept to verify _compute_habit_streaks; not used on the request path.
+
     Computes the current streak per active habit, ending at target_date.
 
     Rules:
@@ -142,6 +196,10 @@ def _compute_habit_streaks(
     return streaks
 
 
+def _streaks_payload(streaks: List[Dict[str, int]]) -> str:
+    return json.dumps({"habits": streaks}, ensure_ascii=False)
+
+
 def compute_metrics_for_date(
     db: Session,
     *,
@@ -174,15 +232,11 @@ def upsert_insight_for_date(
         .first()
     )
 
-    payload = {
-        "habits": metrics.habit_streaks,
-    }
-
     now = datetime.utcnow()
 
     if existing:
         existing.mood_avg_7d = metrics.mood_avg_7d
-        existing.habit_streaks_json = json.dumps(payload, ensure_ascii=False)
+        existing.habit_streaks_json = _streaks_payload(metrics.habit_streaks)
         existing.updated_at = now
         return existing
 
@@ -190,9 +244,227 @@ def upsert_insight_for_date(
         user_id=user_id,
         date=target_date,
         mood_avg_7d=metrics.mood_avg_7d,
-        habit_streaks_json=json.dumps(payload, ensure_ascii=False),
+        habit_streaks_json=_streaks_payload(metrics.habit_streaks),
         created_at=now,
         updated_at=now,
     )
     db.add(insight)
     return insight
+
+
+def get_fresh_insight(db: Session, *, user_id: int, target_date: date) -> Optional[Insight]:
+    """
+    Returns the stored Insight for (user_id, target_date) if nothing it depends on has
+    changed since it was computed, else None.
+
+    Fresh means: no check-in was written after the insight, and the habits in its
+    payload are exactly the user's active habits.
+    """
+    insight = (
+        db.query(Insight)
+        .filter(Insight.user_id == user_id, Insight.date == target_date)
+        .first()
+    )
+    if insight is None:
+        return None
+
+    latest_write = (
+        db.query(func.max(Checkin.updated_at))
+        .filter(Checkin.user_id == user_id)
+        .scalar()
+    )
+    if latest_write is not None and latest_write > insight.updated_at:
+        return None
+
+    active_ids = {
+        r[0]
+        for r in db.query(Habit.id)
+        .filter(Habit.user_id == user_id, Habit.active == True)  # noqa: E712
+        .all()
+    }
+    try:
+        stored_ids = {int(h["habit_id"]) for h in json.loads(insight.habit_streaks_json or "{}").get("habits", [])}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+    if stored_ids != active_ids:
+        return None
+
+    return insight
+
+
+def _compute_mood_avg_7d_for_users(
+    db: Session,
+    *,
+    user_ids: List[int],
+    target_date: date,
+) -> Dict[int, float]:
+    """Grouped version of _compute_mood_avg_7d: one query for a whole chunk of users."""
+    start = target_date - timedelta(days=6)
+    rows = (
+        db.query(Checkin.user_id, func.sum(Checkin.mood), func.count(Checkin.id))
+        .filter(
+            Checkin.user_id.in_(user_ids),
+            Checkin.date >= start,
+            Checkin.date <= target_date,
+        )
+        .group_by(Checkin.user_id)
+        .all()
+    )
+    return {uid: float(total) / float(n) for uid, total, n in rows if n}
+
+
+def _bulk_upsert_insights(db: Session, rows: List[Dict]) -> int:
+    """
+    INSERT ... ON CONFLICT (user_id, date) DO UPDATE for a chunk of computed insights.
+    Falls back to per-row ORM upserts on dialects without ON CONFLICT support.
+    """
+    if not rows:
+        return 0
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for r in rows:
+            upsert_insight_for_date(db, user_id=r["user_id"], target_date=r["date"])
+        return len(rows)
+
+    stmt = insert(Insight).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Insight.user_id, Insight.date],
+        set_={
+            "mood_avg_7d": stmt.excluded.mood_avg_7d,
+            "habit_streaks_json": stmt.excluded.habit_streaks_json,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+    return len(rows)
+
+
+def _users_to_refresh(
+    db: Session,
+    *,
+    target_date: date,
+    last_run: Optional[InsightWorkerRun],
+) -> List[int]:
+    """
+    Users whose insight for target_date may have changed since the last run:
+      - anyone with a check-in written after the last watermark, and
+      - on a new target date, anyone with a check-in in the 7-day window
+        (their mood average and streaks roll over at midnight).
+    """
+    changed = db.query(Checkin.user_id).distinct()
+    if last_run is not None and last_run.watermark is not None:
+        changed = changed.filter(Checkin.updated_at > last_run.watermark - WATERMARK_OVERLAP)
+    user_ids = {r[0] for r in changed.all()}
+
+    if last_run is not None and last_run.target_date != target_date:
+        window = (
+            db.query(Checkin.user_id)
+            .filter(Checkin.date >= target_date - timedelta(days=6), Checkin.date <= target_date)
+            .distinct()
+        )
+        user_ids.update(r[0] for r in window.all())
+
+    return sorted(user_ids)
+
+
+def _chunks(items: List[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def run_batch(
+    db: Session,
+    *,
+    target_date: Optional[date] = None,
+    chunk_size: int = 500,
+) -> InsightWorkerRun:
+    """
+    One incremental batch run: recompute insights for users changed since the last
+    watermark, in chunks, with one bulk upsert (and commit) per chunk.
+    Records the run (timing + row counts) in insight_worker_runs.
+    """
+    target_date = target_date or date.today()
+    started = time.perf_counter()
+    run = InsightWorkerRun(target_date=target_date, started_at=datetime.utcnow())
+
+    last_run = (
+        db.query(InsightWorkerRun)
+        .filter(InsightWorkerRun.finished_at.isnot(None))
+        .order_by(InsightWorkerRun.finished_at.desc(), InsightWorkerRun.id.desc())
+        .first()
+    )
+    # Snapshot the watermark before reading users, so writes racing with this run are
+    # picked up next time rather than skipped.
+    run.watermark = db.query(func.max(Checkin.updated_at)).scalar() or (last_run.watermark if last_run else None)
+    user_ids = _users_to_refresh(db, target_date=target_date, last_run=last_run)
+
+    upserted = 0
+    for chunk in _chunks(user_ids, max(1, chunk_size)):
+        moods = _compute_mood_avg_7d_for_users(db, user_ids=chunk, target_date=target_date)
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": uid,
+                "date": target_date,
+                "mood_avg_7d": moods.get(uid),
+                "habit_streaks_json": _streaks_payload(
+                    _compute_habit_streaks(db, user_id=uid, target_date=target_date)
+                ),
+                "created_at": now,
+                "updated_at": now,
+            }
+            for uid in chunk
+        ]
+        upserted += _bulk_upsert_insights(db, rows)
+        db.commit()
+
+    run.users_processed = len(user_ids)
+    run.rows_upserted = upserted
+    run.duration_ms = int((time.perf_counter() - started) * 1000)
+    run.finished_at = datetime.utcnow()
+    db.add(run)
+    db.commit()
+    return run
+
+
+def main() -> None:
+    from .db import Base, SessionLocal, engine
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        run = run_batch(db, chunk_size=int(os.getenv("INSIGHTS_WORKER_CHUNK_SIZE", "500")))
+        logger.info(
+            "insights batch done target_date=%s users=%s rows=%s duration_ms=%s",
+            run.target_date,
+            run.users_processed,
+            run.rows_upserted,
+            run.duration_ms,
+        )
+
+        # Retention for the DB rate limiter backend (RateLimitEvent rows only grow otherwise).
+        from .observability.rate_limit import prune_rate_limit_events
+
+        retention = timedelta(hours=float(os.getenv("RATE_LIMIT_RETENTION_HOURS", "48")))
+        pruned = prune_rate_limit_events(db, older_than=retention)
+        logger.info("pruned rate_limit_events rows=%s", pruned)
+
+        # Per-minute AI metrics rollups are only read for "today"; daily rows are kept.
+        from .observability.rollups import prune_rollups
+
+        retention = timedelta(days=float(os.getenv("METRICS_ROLLUP_RETENTION_DAYS", "14")))
+        pruned = prune_rollups(db, older_than=retention)
+        logger.info("pruned ai_metrics_rollups rows=%s", pruned)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,68 @@
 from dotenv import load_dotenv
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from .observability.registry import instrument_engine
+
 load_dotenv()
 
 DB_URL = os.getenv("DB_URL", "sqlite:///app.db")
 
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+def pool_kwargs(url: str) -> dict:
+    """
+    Connection pool settings shared by the sync and async engines:
+      DB_POOL_SIZE (5), DB_MAX_OVERFLOW (10), DB_POOL_TIMEOUT (30s),
+      DB_POOL_PRE_PING (1), DB_POOL_RECYCLE (1800s; -1 disables)
+    In-memory SQLite uses a single shared connection, so no pool settings apply.
+    """
+    if _is_sqlite_memory(url):
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1").strip() == "1",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL lets readers run alongside the single writer, and busy_timeout makes a second
+    # writer wait instead of failing with "database is locked".
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}")
+    finally:
+        cursor.close()
+
+
+def configure_sqlite(sync_engine: Engine) -> None:
+    """Applies the SQLite pragmas on every new DBAPI connection of sync_engine."""
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+
+
 engine = create_engine(
     DB_URL,
-    connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {},
+    connect_args={"check_same_thread": False} if is_sqlite(DB_URL) else {},
+    **pool_kwargs(DB_URL),
 )
+configure_sqlite(engine)
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
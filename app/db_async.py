@@ -0,0 +1,69 @@
+# app/db_async.py
+from __future__ import annotations
+
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from .db import DB_URL, configure_sqlite, is_sqlite, pool_kwargs
+from .observability.registry import instrument_engine
+
+# Async counterpart of app/db.py, over the same database. Routers can move to
+# `db: AsyncSession = Depends(get_async_db)` one at a time; both layers share the
+# pool settings (DB_POOL_*) and the SQLite pragmas.
+
+
+def async_url(url: str) -> str:
+    """sqlite:// -> sqlite+aiosqlite://, postgresql[+psycopg2]:// -> postgresql+asyncpg://"""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        return url
+    base = scheme.split("+", 1)[0]
+    if base == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if base in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+def _engine_kwargs(url: str) -> dict:
+    if is_sqlite(url):
+        # aiosqlite connections are cheap and each runs on its own thread; not pooling them
+        # keeps connections from outliving the event loop that opened them.
+        return {"poolclass": NullPool}
+    return pool_kwargs(url)
+
+
+_ASYNC_ENGINE: Optional[AsyncEngine] = None
+_ASYNC_SESSION_FACTORY: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """Created on first use, so the async driver is only imported by apps that need it."""
+    global _ASYNC_ENGINE, _ASYNC_SESSION_FACTORY
+    if _ASYNC_ENGINE is None:
+        url = async_url(DB_URL)
+        _ASYNC_ENGINE = create_async_engine(url, **_engine_kwargs(url))
+        configure_sqlite(_ASYNC_ENGINE.sync_engine)
+        instrument_engine(_ASYNC_ENGINE.sync_engine)
+        _ASYNC_SESSION_FACTORY = async_sessionmaker(_ASYNC_ENGINE, expire_on_commit=False, autoflush=False)
+    return _ASYNC_ENGINE
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    get_async_engine()
+    return _ASYNC_SESSION_FACTORY()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    """Closes pooled async connections (app shutdown). A later call recreates the engine."""
+    global _ASYNC_ENGINE, _ASYNC_SESSION_FACTORY
+    engine, _ASYNC_ENGINE, _ASYNC_SESSION_FACTORY = _ASYNC_ENGINE, None, None
+    if engine is not None:
+        await engine.dispose()
@@ -0,0 +1,140 @@
+# app/embedding_batcher.py
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class MicroBatchEncoder:
+    """
+    Wraps a SentenceTransformer-like embedder and coalesces concurrent encode() calls.
+
+    Callers block on their own result while a single background thread collects requests
+    for up to `max_wait_ms` (or until `max_batch_size` texts are waiting), runs one
+    embedder.encode() over the whole batch, and fans the rows back out. A caller waits at
+    most `timeout_s`; if the batch fails every caller in it gets the error, and if the
+    thread dies, callers still queued get it too (the next call starts a new thread).
+
+    Exposes the same two methods RagStore uses, so it is a drop-in replacement.
+    """
+
+    def __init__(self, embedder, *, max_batch_size: int = 32, max_wait_ms: float = 5.0, timeout_s: float = 30.0):
+        self.embedder = embedder
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout_s = float(timeout_s)
+
+        self._requests: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.batches = 0
+        self.texts = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.embedder.get_sentence_embedding_dimension())
+
+    def encode(self, texts: Sequence[str], normalize_embeddings: bool = False) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype="float32")
+
+        self._ensure_started()
+        fut: Future = Future()
+        self._requests.put((texts, fut))
+        try:
+            out = fut.result(timeout=self.timeout_s)
+        except FutureTimeoutError:
+            # Cancelled while still queued, so the batch thread skips it.
+            fut.cancel()
+            raise TimeoutError(f"embedding batch did not complete within {self.timeout_s}s") from None
+        if normalize_embeddings:
+            out = out / (np.linalg.norm(out, axis=1, keepdims=True) + 1e-12)
+        return out
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        batch = [self._requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait_s
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self) -> None:
+        error: BaseException = RuntimeError("embedding batcher thread exited")
+        try:
+            while True:
+                self._process(self._collect())
+        except BaseException as exc:
+            error = exc
+        finally:
+            # Nobody is left to serve what is still queued.
+            while True:
+                try:
+                    _texts, fut = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if fut.set_running_or_notify_cancel():
+                    fut.set_exception(error)
+
+    def _process(self, batch: List[Tuple[List[str], Future]]) -> None:
+        # Callers that timed out have cancelled their future; skip them.
+        batch = [(texts, fut) for texts, fut in batch if fut.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        all_texts = [t for texts, _fut in batch for t in texts]
+        try:
+            vecs = np.asarray(self.embedder.encode(all_texts, normalize_embeddings=False), dtype="float32")
+            if vecs.ndim == 1:
+                vecs = vecs.reshape(1, -1)
+            if vecs.shape[0] != len(all_texts):
+                raise ValueError(f"embedder returned {vecs.shape[0]} rows for {len(all_texts)} texts")
+        except BaseException as exc:
+            for _texts, fut in batch:
+                fut.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+            return
+
+        self.batches += 1
+        self.texts += len(all_texts)
+        offset = 0
+        for texts, fut in batch:
+            fut.set_result(vecs[offset : offset + len(texts)])
+            offset += len(texts)
+
+
+def maybe_batched(embedder):
+    """
+    Wraps `embedder` in a MicroBatchEncoder unless batching is disabled.
+
+    EMBED_BATCH_MAX_SIZE (default 32; <= 1 disables batching)
+    EMBED_BATCH_MAX_WAIT_MS (default 5)
+    EMBED_BATCH_TIMEOUT_S (default 30): how long a caller waits for its batch
+    """
+    max_batch_size = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+    if max_batch_size <= 1:
+        return embedder
+    max_wait_ms = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+    timeout_s = float(os.getenv("EMBED_BATCH_TIMEOUT_S", "30"))
+    return MicroBatchEncoder(embedder, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, timeout_s=timeout_s)
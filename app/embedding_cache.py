@@ -0,0 +1,189 @@
+# app/embedding_cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by a content hash of (namespace, text).
+
+    The namespace should identify the model (name + dim) so vectors from a different
+    model are never returned. With `disk_dir` set, entries are also written as .npy files
+    and read back on an in-memory miss, so the cache survives restarts. The disk tier
+    keeps at most `disk_max_files` files: past that, the least recently used (oldest
+    mtime; a disk hit refreshes it) are deleted down to 90% of the limit. The directory
+    is pruned the same way on startup.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int,
+        disk_dir: Optional[str] = None,
+        namespace: str = "",
+        disk_max_files: int = 20000,
+    ):
+        self.max_entries = max(0, int(max_entries))
+        self.disk_dir = disk_dir or None
+        self.disk_max_files = max(1, int(disk_max_files))
+        self.namespace = namespace
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_files = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            self._prune_disk(self.disk_max_files)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        k = self.key(text)
+        with self._lock:
+            vec = self._entries.get(k)
+            if vec is not None:
+                self._entries.move_to_end(k)
+                self.hits += 1
+                return vec
+
+        vec = self._read_disk(k)
+        with self._lock:
+            if vec is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(k, vec)
+            return vec
+
+    def put(self, text: str, vec: np.ndarray) -> None:
+        k = self.key(text)
+        vec = np.asarray(vec, dtype="float32")
+        vec.setflags(write=False)  # shared between callers
+        with self._lock:
+            self._remember(k, vec)
+        self._write_disk(k, vec)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remember(self, k: str, vec: np.ndarray) -> None:
+        if self.max_entries == 0:
+            return
+        self._entries[k] = vec
+        self._entries.move_to_end(k)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, k: str) -> str:
+        return os.path.join(self.disk_dir, k[:2], f"{k}.npy")
+
+    def _read_disk(self, k: str) -> Optional[np.ndarray]:
+        if not self.disk_dir:
+            return None
+        path = self._path(k)
+        try:
+            vec = np.load(path, allow_pickle=False)
+            os.utime(path)  # recently used: pruned last
+        except Exception:
+            return None
+        vec = np.asarray(vec, dtype="float32")
+        vec.setflags(write=False)
+        return vec
+
+    def _write_disk(self, k: str, vec: np.ndarray) -> None:
+        if not self.disk_dir:
+            return
+        path = self._path(k)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            is_new = not os.path.exists(path)
+            # Write-then-rename so concurrent readers never see a partial file.
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, vec, allow_pickle=False)
+            os.replace(tmp, path)
+        except Exception:
+            # Disk tier is best-effort.
+            return
+        if is_new:
+            with self._disk_lock:
+                self._disk_files += 1
+                over = self._disk_files > self.disk_max_files
+            if over:
+                # Prune below the limit so the directory is not rescanned on every write.
+                self._prune_disk(int(self.disk_max_files * 0.9))
+
+    def _prune_disk(self, keep: int) -> None:
+        """Deletes the oldest .npy files beyond `keep` (and stale temp files); recounts."""
+        with self._disk_lock:
+            files = []
+            stale_before = time.time() - 3600
+            for root, _dirs, names in os.walk(self.disk_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        mtime = os.path.getmtime(path)
+                        if name.endswith(".npy"):
+                            files.append((mtime, path))
+                        elif name.endswith(".tmp") and mtime < stale_before:
+                            os.remove(path)  # left behind by a crashed write
+                    except OSError:
+                        continue
+            files.sort()
+            removed = 0
+            for _mtime, path in files[: max(0, len(files) - keep)]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            self._disk_files = len(files) - removed
+
+
+_QUERY_CACHE: Optional[EmbeddingCache] = None
+
+
+def get_query_embedding_cache() -> EmbeddingCache:
+    """
+    Process-wide cache for RAG query embeddings.
+
+    EMBED_CACHE_MAX_ENTRIES (default 2048; 0 disables the in-memory tier)
+    EMBED_CACHE_DIR (optional; enables the on-disk tier)
+    EMBED_CACHE_DISK_MAX_FILES (default 20000; oldest files beyond it are deleted)
+    """
+    global _QUERY_CACHE
+    if _QUERY_CACHE is None:
+        _QUERY_CACHE = EmbeddingCache(
+            max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "2048")),
+            disk_dir=os.getenv("EMBED_CACHE_DIR", "").strip() or None,
+            namespace=os.getenv("EMBED_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2").strip(),
+            disk_max_files=int(os.getenv("EMBED_CACHE_DISK_MAX_FILES", "20000")),
+        )
+    return _QUERY_CACHE
@@ -1,10 +1,16 @@
 import os
 
+from .embedding_batcher import maybe_batched
+
 _EMBEDDER = None
 
+
+def rag_enabled() -> bool:
+    return os.getenv("RAG_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+
+
 def get_embedder():
-    enabled = os.getenv("RAG_ENABLED", "0").strip().lower() in ("1", "true", "yes")
-    if not enabled:
+    if not rag_enabled():
         return None
 
     global _EMBEDDER
@@ -14,7 +20,8 @@ def get_embedder():
     model_name = os.getenv("EMBED_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2").strip()
     try:
         from sentence_transformers import SentenceTransformer
-        _EMBEDDER = SentenceTransformer(model_name)
+        # Concurrent requests share one encode() call per micro-batch.
+        _EMBEDDER = maybe_batched(SentenceTransformer(model_name))
         return _EMBEDDER
     except Exception:
         return None
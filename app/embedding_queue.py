@@ -0,0 +1,308 @@
+# app/embedding_queue.py
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import SessionLocal
+from .embedding_model import get_embedder, rag_enabled
+from .rag_store import get_rag_store
+
+logger = logging.getLogger("mindgarden.embedding_queue")
+
+
+def record_pending_embedding(db: Session, *, user_id: int, checkin: models.Checkin) -> bool:
+    """
+    Adds a durable PendingEmbedding row for checkin.note inside the caller's transaction.
+    Returns False (and writes nothing) if RAG is disabled or there is no note.
+    """
+    if not rag_enabled():
+        return False
+    if not (checkin.note or "").strip():
+        return False
+    db.add(models.PendingEmbedding(user_id=user_id, checkin_id=checkin.id, created_at=datetime.utcnow()))
+    return True
+
+
+class EmbeddingQueue:
+    """
+    Background embedding pipeline for check-in notes.
+
+    - POST /checkins writes a PendingEmbedding row and calls submit() after commit.
+    - A single worker thread drains a bounded in-process queue and stores the embedding
+      via RagStore.add_reflection_for_checkin, deleting the pending row in the same commit.
+    - When the queue is full, or the process restarts, work is not lost: the worker
+      periodically sweeps the pending_embeddings table and re-enqueues what it finds.
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int,
+        session_factory: Callable[[], Session] = SessionLocal,
+        sweep_seconds: float = 30.0,
+        max_attempts: int = 5,
+    ):
+        self.maxsize = int(maxsize)
+        self.session_factory = session_factory
+        self.sweep_seconds = float(sweep_seconds)
+        self.max_attempts = int(max_attempts)
+
+        self._queue: "queue.Queue[Tuple[int, float]]" = queue.Queue(maxsize=self.maxsize)
+        self._queued: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.processed = 0
+        self.failed = 0
+        self.last_lag_seconds: Optional[float] = None
+
+    # ---- producer side ----
+
+    def submit(self, checkin_id: int, enqueued_at: Optional[float] = None) -> bool:
+        """Non-blocking. Returns False if the queue is full (the sweep will pick it up)."""
+        with self._lock:
+            if checkin_id in self._queued:
+                return True
+            try:
+                self._queue.put_nowait((int(checkin_id), enqueued_at if enqueued_at is not None else time.time()))
+            except queue.Full:
+                return False
+            self._queued.add(int(checkin_id))
+            return True
+
+    def recover(self) -> int:
+        """Re-enqueues pending rows from the table (oldest first). Returns how many were added."""
+        free = self.maxsize - self._queue.qsize()
+        if free <= 0:
+            return 0
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(models.PendingEmbedding.checkin_id, models.PendingEmbedding.created_at)
+                .filter(models.PendingEmbedding.attempts < self.max_attempts)
+                .order_by(models.PendingEmbedding.created_at.asc())
+                .limit(free + len(self._queued))
+                .all()
+            )
+        finally:
+            db.close()
+
+        added = 0
+        for checkin_id, created_at in rows:
+            if checkin_id in self._queued:
+                continue
+            enqueued_at = (created_at - datetime.utcnow()).total_seconds() + time.time()
+            if not self.submit(checkin_id, enqueued_at):
+                break
+            added += 1
+        return added
+
+    # ---- worker side ----
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="embedding-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def requeue_dead(self) -> int:
+        """Gives dead rows (attempts exhausted) a fresh set of attempts."""
+        db = self.session_factory()
+        try:
+            requeued = requeue_dead_embeddings(db, max_attempts=self.max_attempts)
+        finally:
+            db.close()
+        if requeued:
+            logger.info("requeued %s dead pending embedding(s)", requeued)
+        return requeued
+
+    def _run(self) -> None:
+        # Startup sweep: a restart (often a deploy with the fix for whatever made them
+        # fail) retries dead rows once more, then recovers everything pending.
+        try:
+            self.requeue_dead()
+            self.recover()
+        except Exception:
+            logger.exception("embedding queue recovery failed")
+
+        last_sweep = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                checkin_id, enqueued_at = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if time.monotonic() - last_sweep >= self.sweep_seconds:
+                    last_sweep = time.monotonic()
+                    try:
+                        self.recover()
+                    except Exception:
+                        logger.exception("embedding queue sweep failed")
+                continue
+
+            try:
+                self.process_one(checkin_id, enqueued_at)
+            finally:
+                with self._lock:
+                    self._queued.discard(checkin_id)
+                self._queue.task_done()
+
+    def process_one(self, checkin_id: int, enqueued_at: Optional[float] = None) -> bool:
+        """Embeds one pending check-in note. Returns True when the pending row is resolved."""
+        rag = get_rag_store(get_embedder())
+        if rag is None:
+            # Model/FAISS unavailable: leave the row for a later sweep.
+            return False
+
+        db = self.session_factory()
+        try:
+            pending = (
+                db.query(models.PendingEmbedding)
+                .filter(models.PendingEmbedding.checkin_id == checkin_id)
+                .first()
+            )
+            if pending is None:
+                return True
+            checkin = db.query(models.Checkin).filter(models.Checkin.id == checkin_id).first()
+            try:
+                if checkin is not None:
+                    rag.add_reflection_for_checkin(db=db, user_id=checkin.user_id, checkin=checkin)
+                db.delete(pending)
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                self.failed += 1
+                logger.warning("embedding failed for checkin_id=%s: %s", checkin_id, exc)
+                db.query(models.PendingEmbedding).filter(
+                    models.PendingEmbedding.checkin_id == checkin_id
+                ).update(
+                    {
+                        models.PendingEmbedding.attempts: models.PendingEmbedding.attempts + 1,
+                        models.PendingEmbedding.last_error: str(exc)[:500],
+                    },
+                    synchronize_session=False,
+                )
+                db.commit()
+                return False
+
+            self.processed += 1
+            if enqueued_at is not None:
+                self.last_lag_seconds = max(0.0, time.time() - enqueued_at)
+            return True
+        finally:
+            db.close()
+
+    def drain(self) -> int:
+        """Synchronously processes everything currently queued (used by tests and scripts)."""
+        done = 0
+        while True:
+            try:
+                checkin_id, enqueued_at = self._queue.get_nowait()
+            except queue.Empty:
+                return done
+            try:
+                if self.process_one(checkin_id, enqueued_at):
+                    done += 1
+            finally:
+                with self._lock:
+                    self._queued.discard(checkin_id)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            "depth": self._queue.qsize(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "last_lag_seconds": round(self.last_lag_seconds, 3) if self.last_lag_seconds is not None else None,
+        }
+
+
+def pending_embedding_stats(db: Session, *, max_attempts: int) -> Dict[str, Optional[float]]:
+    """
+    Durable view of the backlog: rows still being retried (count and age of the oldest)
+    and, separately, dead rows that used up max_attempts. Dead rows are never swept, so
+    counting them as pending would pin the count above zero and grow the lag forever.
+    """
+    retrying = models.PendingEmbedding.attempts < max_attempts
+    count, oldest = (
+        db.query(func.count(models.PendingEmbedding.id), func.min(models.PendingEmbedding.created_at))
+        .filter(retrying)
+        .one()
+    )
+    dead = db.query(func.count(models.PendingEmbedding.id)).filter(~retrying).scalar()
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest is not None else None
+    return {
+        "pending": int(count or 0),
+        "lag_seconds": round(lag, 3) if lag is not None else None,
+        "dead": int(dead or 0),
+    }
+
+
+def requeue_dead_embeddings(db: Session, *, max_attempts: int) -> int:
+    """Resets attempts on dead rows so the sweep retries them. Commits; returns the row count."""
+    updated = (
+        db.query(models.PendingEmbedding)
+        .filter(models.PendingEmbedding.attempts >= max_attempts)
+        .update({models.PendingEmbedding.attempts: 0}, synchronize_session=False)
+    )
+    db.commit()
+    return int(updated or 0)
+
+
+_QUEUE_SINGLETON: Optional[EmbeddingQueue] = None
+
+
+def get_embedding_queue() -> EmbeddingQueue:
+    global _QUEUE_SINGLETON
+    if _QUEUE_SINGLETON is None:
+        _QUEUE_SINGLETON = EmbeddingQueue(
+            maxsize=int(os.getenv("EMBED_QUEUE_MAXSIZE", "1000")),
+            sweep_seconds=float(os.getenv("EMBED_QUEUE_SWEEP_SECONDS", "30")),
+            max_attempts=int(os.getenv("EMBED_QUEUE_MAX_ATTEMPTS", "5")),
+        )
+    return _QUEUE_SINGLETON
+
+
+def main() -> None:
+    """Backlog report / manual retry: python -m app.embedding_queue [--requeue-dead]"""
+    import argparse
+
+    from .db import Base, engine
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    parser = argparse.ArgumentParser(description="Inspect the pending embedding backlog.")
+    parser.add_argument("--requeue-dead", action="store_true", help="reset attempts on rows that used them all up")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    max_attempts = get_embedding_queue().max_attempts
+    db = SessionLocal()
+    try:
+        if args.requeue_dead:
+            logger.info("requeued dead pending embeddings rows=%s", requeue_dead_embeddings(db, max_attempts=max_attempts))
+        stats = pending_embedding_stats(db, max_attempts=max_attempts)
+        logger.info(
+            "pending embeddings pending=%s dead=%s lag_seconds=%s", stats["pending"], stats["dead"], stats["lag_seconds"]
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# app/http_caching.py
+import hashlib
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request
+
+
+def weak_etag(validator: str) -> str:
+    """Weak ETag over a string that changes whenever the representation may change."""
+    return 'W/"' + hashlib.sha256(validator.encode()).hexdigest()[:32] + '"'
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    True if the request's validators still match: If-None-Match takes precedence;
+    If-Modified-Since is only consulted without it (RFC 9110 13.2.2).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+    return False
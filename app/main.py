@@ -1,17 +1,21 @@
 ﻿# app/main.py
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from sqlalchemy import text
+import hashlib
+import json
 import os
+import threading
 
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import JSONResponse
 
 from .db import engine, Base
+from .db_async import dispose_async_engine, get_async_engine
+from .migrations import run_migrations
 from . import models  # ensure models are imported so tables are registered
 from .routes_auth import router as auth_router
 from .routes_habits import router as habits_router
@@ -19,11 +23,19 @@ from .routes_checkins import router as checkins_router
 from .routes_insights import router as insights_router
 from .routes_ai import router as ai_router
 from .routes_rag import router as rag_router
-from .routes_metrics import router as metrics_router
+from .routes_metrics import get_db_gauges, router as metrics_router
 from .observability.logging_config import configure_logging
 from .observability.middleware import RequestLoggingMiddleware
+from .observability.registry import get_registry
+from .observability.rollups import get_rollup_accumulator
 from .routes_billing import router as billing_router
 from .routes_export import router as export_router
+from .embedding_model import rag_enabled
+from .embedding_queue import get_embedding_queue
+from .http_caching import not_modified
+from .offload import shutdown_model_executor
+from .password_hashing import shutdown_password_hasher
+from .services.ollama_client import close_ollama_client, start_ollama_client
 
 
 class HealthStatus(BaseModel):
@@ -34,7 +46,36 @@ class HealthStatus(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
-    yield
+    run_migrations(engine)
+
+    embedding_queue = get_embedding_queue() if rag_enabled() else None
+    if embedding_queue is not None:
+        embedding_queue.start()
+    # Long-lived, pooled Ollama client (None when OLLAMA_URL is unset).
+    await start_ollama_client()
+    # Periodic flush of pre-aggregated AI metrics into ai_metrics_rollups.
+    rollups = get_rollup_accumulator()
+    rollups.start()
+    # Per-worker snapshots for multi-process /metrics (no-op without METRICS_MULTIPROC_DIR).
+    registry = get_registry()
+    registry.start()
+    # Today's counters and the embedding backlog, refreshed off the scrape path.
+    db_gauges = get_db_gauges()
+    db_gauges.start()
+    # Build the OpenAPI payload now rather than on the first /docs visit.
+    openapi_cache.get()
+    try:
+        yield
+    finally:
+        db_gauges.stop()
+        registry.stop()
+        rollups.stop()
+        await close_ollama_client()
+        shutdown_model_executor()
+        shutdown_password_hasher()
+        await dispose_async_engine()
+        if embedding_queue is not None:
+            embedding_queue.stop()
 
 
 # IMPORTANT:
@@ -72,14 +113,55 @@ def _build_openapi_schema():
     )
 
 
+class _OpenAPICache:
+    """
+    The schema serialized once, shared by /openapi.json and /api/openapi.json.
+
+    get_openapi walks every route and regenerates the Pydantic schemas, so it only runs
+    again after invalidate() or when the route table changes (checked by route
+    identity, so routers included after the first build are picked up).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes_key: tuple | None = None
+        self.body: bytes = b""
+        self.etag: str = ""
+
+    def get(self) -> tuple[bytes, str]:
+        routes_key = tuple(id(r) for r in app.routes)
+        if routes_key != self._routes_key:
+            with self._lock:
+                if routes_key != self._routes_key:
+                    body = json.dumps(_build_openapi_schema(), separators=(",", ":")).encode("utf-8")
+                    self.body, self.etag = body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+                    self._routes_key = routes_key
+        return self.body, self.etag
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._routes_key = None
+
+
+openapi_cache = _OpenAPICache()
+
+
+def _openapi_response(request: Request) -> Response:
+    body, etag = openapi_cache.get()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not_modified(request, etag, None):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/openapi.json", include_in_schema=False)
-def openapi_json():
-    return JSONResponse(_build_openapi_schema())
+def openapi_json(request: Request):
+    return _openapi_response(request)
 
 
 @app.get("/api/openapi.json", include_in_schema=False)
-def openapi_json_api():
-    return JSONResponse(_build_openapi_schema())
+def openapi_json_api(request: Request):
+    return _openapi_response(request)
 
 
 # --- Swagger UI ---
@@ -122,10 +204,11 @@ def root():
 
 
 @app.get("/healthz", response_model=HealthStatus)
-def healthz():
+async def healthz():
+    # First route on the async engine (app/db_async.py): no threadpool hop per probe.
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        async with get_async_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
         return HealthStatus(status="ok", db_ok=True)
     except Exception:
         return HealthStatus(status="error", db_ok=False)
@@ -143,3 +226,4 @@ app.include_router(export_router)
 if os.getenv("ENABLE_DEV_ROUTES", "0") == "1":
     from .routes_dev import router as dev_router
     app.include_router(dev_router)
+    openapi_cache.invalidate()
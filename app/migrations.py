@@ -0,0 +1,90 @@
+# app/migrations.py
+from __future__ import annotations
+
+import logging
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import ClauseElement
+
+from .db import Base
+
+logger = logging.getLogger("mindgarden.migrations")
+
+
+def _default_sql(column, engine: Engine) -> str:
+    arg = column.server_default.arg
+    if isinstance(arg, ClauseElement):
+        return str(arg.compile(dialect=engine.dialect))
+    return f"'{arg}'"
+
+
+def add_missing_columns(engine: Engine) -> List[str]:
+    """
+    create_all() only creates missing tables. This adds columns that were added to a
+    model after its table already existed. A NOT NULL column needs a server_default
+    to be added this way; such columns are logged and skipped.
+
+    Returns the "table.column" names that were added.
+    """
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    added: List[str] = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            if not column.nullable and column.server_default is None:
+                logger.warning("cannot add NOT NULL column %s.%s without a server_default", table.name, column.name)
+                continue
+
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {_default_sql(column, engine)}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+
+            with engine.begin() as conn:
+                conn.exec_driver_sql(ddl)
+            added.append(f"{table.name}.{column.name}")
+            logger.info("added column %s.%s", table.name, column.name)
+
+    return added
+
+
+def ensure_indexes(engine: Engine) -> List[str]:
+    """
+    create_all() only creates indexes together with their table. This creates indexes
+    declared on a model (Index(...) or index=True) whose table already existed.
+
+    Returns the names of the indexes that were created.
+    """
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    created: List[str] = []
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in present:
+                continue
+            # On PostgreSQL a large table is locked for writes while this runs; create the
+            # index CONCURRENTLY by hand beforehand and this step becomes a no-op.
+            index.create(bind=engine, checkfirst=True)
+            created.append(index.name)
+            logger.info("created index %s on %s", index.name, table.name)
+
+    return created
+
+
+def run_migrations(engine: Engine) -> None:
+    """Idempotent schema upgrades, run after Base.metadata.create_all() at startup."""
+    add_missing_columns(engine)
+    ensure_indexes(engine)
@@ -1,7 +1,7 @@
 # app/models.py
 from datetime import datetime, date
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Date, UniqueConstraint, Float, Text, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Date, UniqueConstraint, Float, Text, LargeBinary, false, Index
 from sqlalchemy.orm import relationship
 
 
@@ -46,6 +46,8 @@ class Checkin(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "date", name="uq_checkins_user_date"),
+        # Covering index for the 7-day feature window (date + mood, and the id via rowid).
+        Index("ix_checkins_user_date_mood", "user_id", "date", "mood"),
     )
 
     # Relationship name MUST match schema field name "habit_results"
@@ -110,7 +112,9 @@ class ReflectionEmbedding(Base):
 
     __table_args__ = (
         UniqueConstraint("checkin_id", name="uq_reflection_embedding_checkin"),
+        Index("ix_reflection_embeddings_user_date", "user_id", "checkin_date"),
     )
+
 class AIRequestEvent(Base):
     __tablename__ = "ai_request_events"
 
@@ -119,11 +123,19 @@ class AIRequestEvent(Base):
     endpoint = Column(String, nullable=False, index=True)
     provider = Column(String, nullable=False, default="rules")
     latency_ms = Column(Integer, nullable=False)
+    # Streaming endpoints only: time until the first suggestion text was sent.
+    ttfb_ms = Column(Integer, nullable=True)
     success = Column(Boolean, nullable=False, default=True)
+    # True when the polished text came from the suggestion cache instead of a new Ollama call.
+    cache_hit = Column(Boolean, nullable=False, default=False, server_default=false())
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_ai_request_events_user_created", "user_id", "created_at"),
+    )
+
 
 class RateLimitEvent(Base):
     __tablename__ = "rate_limit_events"
@@ -134,3 +146,121 @@ class RateLimitEvent(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     user = relationship("User")
+
+    __table_args__ = (
+        # Sliding-window COUNT(*) of the DB rate limiter, answered from the index alone.
+        Index("ix_rate_limit_events_user_endpoint_created", "user_id", "endpoint", "created_at"),
+    )
+
+
+class ReflectionIndexVersion(Base):
+    __tablename__ = "reflection_index_versions"
+
+    # Bumped every time a reflection embedding is added for the user, so every API
+    # worker can tell whether its cached FAISS index is still current.
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class PendingEmbedding(Base):
+    __tablename__ = "pending_embeddings"
+
+    # Durable work item for the background embedding worker: one row per check-in note
+    # that still needs a ReflectionEmbedding. Deleted once the embedding is stored.
+    id = Column(Integer, primary_key=True, index=True)
+    checkin_id = Column(Integer, ForeignKey("checkins.id"), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class InsightWorkerRun(Base):
+    __tablename__ = "insight_worker_runs"
+
+    # One row per daily_insights_worker batch run. The latest row's watermark is the
+    # max Checkin.updated_at already folded into insights.
+    id = Column(Integer, primary_key=True, index=True)
+    target_date = Column(Date, nullable=False)
+    watermark = Column(DateTime, nullable=True)
+
+    users_processed = Column(Integer, nullable=False, default=0)
+    rows_upserted = Column(Integer, nullable=False, default=0)
+    duration_ms = Column(Integer, nullable=False, default=0)
+
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True, index=True)
+
+
+class HabitStreakState(Base):
+    __tablename__ = "habit_streak_state"
+
+    # Materialized streak per (user, habit), maintained on check-in writes.
+    # current_streak is the run of consecutive done days ending at last_done_date.
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    habit_id = Column(Integer, ForeignKey("habits.id"), nullable=False, index=True)
+
+    current_streak = Column(Integer, nullable=False, default=0)
+    last_done_date = Column(Date, nullable=True)
+    longest_streak = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "habit_id", name="uq_habit_streak_state_user_habit"),
+    )
+
+
+class UserFeatureSnapshot(Base):
+    __tablename__ = "user_feature_snapshots"
+
+    # Rolling inputs for the AI suggestion Features, maintained on check-in writes.
+    # days_json maps "YYYY-MM-DD" -> [mood, habits_done, habits_total] for every day that can
+    # still fall inside a 7-day window; the aggregate columns cover the window ending on window_end.
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True)
+
+    days_json = Column(Text, nullable=False, default="{}")
+    window_end = Column(Date, nullable=False)
+    mood_sum = Column(Integer, nullable=False, default=0)
+    mood_count = Column(Integer, nullable=False, default=0)
+    habit_done = Column(Integer, nullable=False, default=0)
+    habit_total = Column(Integer, nullable=False, default=0)
+    latest_checkin_date = Column(Date, nullable=True)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class AIMetricsRollup(Base):
+    __tablename__ = "ai_metrics_rollups"
+
+    # Pre-aggregated AIRequestEvent stats, written by the in-process rollup accumulator.
+    # user_id 0 = all users. Global rows use 60s buckets (/metrics); per-user rows use
+    # daily buckets (/metrics/analytics). latency_hist_json holds counts per fixed
+    # latency bucket (observability.registry.LATENCY_BUCKETS_MS), so rows merge by addition.
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_start = Column(DateTime, nullable=False, index=True)
+    bucket_seconds = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, default=0, index=True)
+    endpoint = Column(String, nullable=False)
+    provider = Column(String, nullable=False)
+
+    count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    cache_hits = Column(Integer, nullable=False, default=0)
+    latency_sum_ms = Column(Integer, nullable=False, default=0)
+    latency_hist_json = Column(Text, nullable=False, default="[]")
+
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket_start", "bucket_seconds", "user_id", "endpoint", "provider",
+            name="uq_ai_metrics_rollup_bucket",
+        ),
+        # read_rollups: one user's (or the global) buckets of one size over a time range.
+        Index("ix_ai_metrics_rollups_user_size_start", "user_id", "bucket_seconds", "bucket_start"),
+    )
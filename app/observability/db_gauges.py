@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+
+logger = logging.getLogger("mindgarden.metrics")
+
+Figures = Dict[str, Optional[float]]
+
+
+class DbGauges:
+    """
+    Database-derived gauge values (today's counters, the durable embedding backlog),
+    recomputed by a background thread every `refresh_seconds` so a Prometheus scrape
+    only reads the last result from memory. Values are None until the first refresh.
+    """
+
+    def __init__(
+        self,
+        compute: Callable[[Session], Figures],
+        *,
+        session_factory: Callable[[], Session] = SessionLocal,
+        refresh_seconds: float = 15.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.compute = compute
+        self.session_factory = session_factory
+        self.refresh_seconds = float(refresh_seconds)
+        self.clock = clock
+        self._values: Figures = {}
+        self._refreshed_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> Figures:
+        db = self.session_factory()
+        try:
+            values = self.compute(db)
+        finally:
+            db.close()
+        self._values, self._refreshed_at = values, self.clock()
+        return values
+
+    def get(self, name: str) -> Optional[float]:
+        return self._values.get(name)
+
+    def age_seconds(self) -> float:
+        """Seconds since the last refresh (0 before the first one)."""
+        return self.clock() - self._refreshed_at if self._refreshed_at is not None else 0.0
+
+    def clear(self) -> None:
+        self._values, self._refreshed_at = {}, None
+
+    def start(self) -> None:
+        """Refreshes once synchronously (series are populated from the first scrape), then in the background."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._refresh_logged()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-db-gauges", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _refresh_logged(self) -> None:
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("metrics db gauge refresh failed")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_seconds):
+            self._refresh_logged()
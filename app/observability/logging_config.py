@@ -1,6 +1,15 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+
+REQUEST_FIELDS = ("method", "path", "status_code", "duration_ms", "user_id")
 
 
 class SafeRequestFormatter(logging.Formatter):
@@ -8,20 +17,51 @@ class SafeRequestFormatter(logging.Formatter):
 
     def format(self, record: logging.LogRecord) -> str:
         # Default fields for non-request log records (or anything missing extras)
-        for k, v in {
-            "method": "-",
-            "path": "-",
-            "status_code": "-",
-            "duration_ms": "-",
-            "user_id": "-",
-        }.items():
+        for k in REQUEST_FIELDS:
             if not hasattr(record, k):
-                setattr(record, k, v)
+                setattr(record, k, "-")
         return super().format(record)
 
 
+class JsonRequestFormatter(logging.Formatter):
+    """One JSON object per line (LOG_FORMAT=json); missing request fields are null."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k in REQUEST_FIELDS:
+            entry[k] = getattr(record, k, None)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def build_formatter(log_format: str) -> logging.Formatter:
+    if log_format == "json":
+        return JsonRequestFormatter()
+    return SafeRequestFormatter(
+        "%(asctime)s %(levelname)s %(name)s "
+        "method=%(method)s path=%(path)s status=%(status_code)s "
+        "duration_ms=%(duration_ms)s user_id=%(user_id)s"
+    )
+
+
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+
+
 def configure_logging() -> None:
-    """Configure ONLY our request logger so we don't break third-party logs."""
+    """
+    Configure ONLY our request logger so we don't break third-party logs.
+
+    Records go through a QueueHandler; a QueueListener thread formats them and writes
+    to stdout, so a slow or blocked stdout never stalls the event loop.
+    LOG_FORMAT=json switches to JSON lines.
+    """
+    global _LISTENER
     level_name = os.getenv("LOG_LEVEL", "INFO").upper().strip()
     level = getattr(logging, level_name, logging.INFO)
 
@@ -33,16 +73,27 @@ def configure_logging() -> None:
     if any(getattr(h, "_mindgarden_handler", False) for h in logger.handlers):
         return
 
-    handler = logging.StreamHandler(sys.stdout)
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setLevel(level)
+    stream.setFormatter(build_formatter(os.getenv("LOG_FORMAT", "text").strip().lower()))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(records)
     handler._mindgarden_handler = True  # marker to avoid duplicates
     handler.setLevel(level)
+    logger.addHandler(handler)
 
-    handler.setFormatter(
-        SafeRequestFormatter(
-            "%(asctime)s %(levelname)s %(name)s "
-            "method=%(method)s path=%(path)s status=%(status_code)s "
-            "duration_ms=%(duration_ms)s user_id=%(user_id)s"
-        )
-    )
+    _LISTENER = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _LISTENER.start()
+    atexit.register(stop_logging)
 
-    logger.addHandler(handler)
+
+def stop_logging() -> None:
+    """Drains queued records to stdout and stops the listener thread."""
+    global _LISTENER
+    listener, _LISTENER = _LISTENER, None
+    if listener is not None:
+        listener.stop()
+    logger = logging.getLogger("mindgarden.request")
+    for h in [h for h in logger.handlers if getattr(h, "_mindgarden_handler", False)]:
+        logger.removeHandler(h)
@@ -1,38 +1,78 @@
 import logging
+import os
+import random
 import time
-from typing import Any, Callable
+from typing import Callable, Optional
 
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .registry import HTTP_REQUEST_DURATION, HTTP_REQUESTS
 
 
 logger = logging.getLogger("mindgarden.request")
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Logs one line per request with latency and (when available) user_id."""
+class RequestLoggingMiddleware:
+    """
+    Logs one line per request with latency and (when available) user_id.
+
+    Plain ASGI middleware (no BaseHTTPMiddleware task/stream wrapping), so streamed
+    responses pass straight through. Duration covers the whole response body.
+    LOG_SAMPLE_RATE_2XX (default 1.0) logs only that fraction of successful requests;
+    everything else is always logged, and metrics always count every request.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate_2xx: Optional[float] = None,
+        rand: Callable[[], float] = random.random,
+    ):
+        self.app = app
+        if sample_rate_2xx is None:
+            sample_rate_2xx = float(os.getenv("LOG_SAMPLE_RATE_2XX", "1.0"))
+        self.sample_rate_2xx = min(1.0, max(0.0, sample_rate_2xx))
+        self.rand = rand
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-    async def dispatch(self, request: Request, call_next: Callable[[Request], Any]) -> Response:
         start = time.perf_counter()
-        response: Response | None = None
         status_code: int = 500
+        # request.state is backed by scope["state"]; create it here so the dict that
+        # get_current_user writes user_id into is the one we read back afterwards.
+        state = scope.setdefault("state", {})
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
         try:
-            response = await call_next(request)
-            status_code = response.status_code
-            return response
+            await self.app(scope, receive, send_with_status)
         finally:
-            duration_ms = int((time.perf_counter() - start) * 1000)
-            user_id = getattr(request.state, "user_id", None)
-
-            # Use logger "extra" so our formatter can render structured fields.
-            logger.info(
-                "request",
-                extra={
-                    "method": request.method,
-                    "path": request.url.path,
-                    "status_code": status_code,
-                    "duration_ms": duration_ms,
-                    "user_id": user_id,
-                },
-            )
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            method = scope["method"]
+
+            # Label by route template (/checkins/{checkin_id}), never the raw path, to keep
+            # series cardinality bounded; 404s for unknown paths share one label.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.inc(method=method, route=route, status=status_code)
+            HTTP_REQUEST_DURATION.observe(elapsed_ms, method=method, route=route)
+
+            sampled_out = 200 <= status_code < 300 and self.sample_rate_2xx < 1.0 and self.rand() >= self.sample_rate_2xx
+            if not sampled_out and logger.isEnabledFor(logging.INFO):
+                # Use logger "extra" so our formatter can render structured fields.
+                logger.info(
+                    "request",
+                    extra={
+                        "method": method,
+                        "path": scope["path"],
+                        "status_code": status_code,
+                        "duration_ms": int(elapsed_ms),
+                        "user_id": state.get("user_id") if isinstance(state, dict) else None,
+                    },
+                )
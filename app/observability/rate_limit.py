@@ -1,57 +1,275 @@
 from __future__ import annotations
 
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Callable
+from typing import Callable, Dict, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.models import RateLimitEvent, User
 from app.security import get_current_user
 
+logger = logging.getLogger("mindgarden.rate_limit")
 
-def rate_limit(
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    allowed: bool
+    retry_after: int = 0  # seconds until a request would be allowed (0 when allowed)
+
+
+def _sliding_window_retry_after(
     *,
-    endpoint_key: str,
+    prev: int,
+    cur: int,
+    elapsed: float,
+    window: float,
     limit: int,
-    window_seconds: int,
-) -> Callable:
-    """DB-backed per-user rate limiter.
+) -> int:
+    """
+    Seconds until the sliding-window-counter estimate
+        prev * (window - elapsed) / window + cur
+    leaves room for one more request.
+    """
+    room = limit - 1
+    if cur <= room:
+        # Still possible in the current window once enough of `prev` has slid out.
+        if prev <= 0:
+            return 0
+        wait = (window - elapsed) - (room - cur) * window / prev
+    else:
+        # Must wait for the window to roll; `cur` then becomes the sliding `prev`.
+        wait = (window - elapsed) + max(0.0, window * (1 - room / cur))
+    return max(1, int(math.ceil(wait)))
+
 
-    This works across process restarts and multiple API workers because the
-    counter lives in the database.
+class InMemoryRateLimitBackend:
     """
+    Per-process sliding window counter. O(1) memory per active key, no I/O.
+    Correct for a single API process; use the shared-store backend for several workers.
+
+    Keys idle for two full windows no longer count towards any limit; they are dropped
+    by a sweep that runs at most every `sweep_seconds`, so memory tracks active users.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time, *, sweep_seconds: float = 60.0):
+        self.clock = clock
+        self.sweep_seconds = float(sweep_seconds)
+        # key -> (window seconds, window index, prev, cur)
+        self._windows: Dict[str, Tuple[int, int, int, int]] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = clock()
+
+    def hit(self, *, key: str, limit: int, window_seconds: int, db: Optional[Session] = None) -> RateLimitDecision:
+        now = self.clock()
+        idx = int(now // window_seconds)
+        elapsed = now - idx * window_seconds
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_seconds:
+                self._sweep(now)
+            _w, w_idx, prev, cur = self._windows.get(key, (window_seconds, idx, 0, 0))
+            if w_idx != idx:
+                prev = cur if w_idx == idx - 1 else 0
+                cur = 0
+            estimate = prev * (window_seconds - elapsed) / window_seconds + cur
+            if estimate + 1 > limit:
+                self._windows[key] = (window_seconds, idx, prev, cur)
+                return RateLimitDecision(
+                    allowed=False,
+                    retry_after=_sliding_window_retry_after(
+                        prev=prev, cur=cur, elapsed=elapsed, window=window_seconds, limit=limit
+                    ),
+                )
+            self._windows[key] = (window_seconds, idx, prev, cur + 1)
+            return RateLimitDecision(allowed=True)
+
+    def _sweep(self, now: float) -> None:
+        """Drops keys whose counts have both slid out of the window (caller holds the lock)."""
+        stale = [
+            key
+            for key, (window_seconds, w_idx, _prev, _cur) in self._windows.items()
+            if int(now // window_seconds) - w_idx >= 2
+        ]
+        for key in stale:
+            del self._windows[key]
+        self._last_sweep = now
+
+
+class SharedStoreRateLimitBackend:
+    """
+    Sliding window counter in a Redis-compatible store, shared by every API worker.
+
+    `client` needs incr/decr/get/expire with redis-py semantics. Rejected requests are
+    un-counted with decr so they don't extend the block.
+    """
+
+    def __init__(self, client, *, prefix: str = "mindgarden:rl", clock: Callable[[], float] = time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+
+    def hit(self, *, key: str, limit: int, window_seconds: int, db: Optional[Session] = None) -> RateLimitDecision:
+        now = self.clock()
+        idx = int(now // window_seconds)
+        elapsed = now - idx * window_seconds
+        cur_key = f"{self.prefix}:{key}:{window_seconds}:{idx}"
+        prev_key = f"{self.prefix}:{key}:{window_seconds}:{idx - 1}"
+
+        cur = int(self.client.incr(cur_key))
+        if cur == 1:
+            self.client.expire(cur_key, window_seconds * 2)
+        prev = int(self.client.get(prev_key) or 0)
+
+        estimate = prev * (window_seconds - elapsed) / window_seconds + cur
+        if estimate > limit:
+            self.client.decr(cur_key)
+            return RateLimitDecision(
+                allowed=False,
+                retry_after=_sliding_window_retry_after(
+                    prev=prev, cur=cur - 1, elapsed=elapsed, window=window_seconds, limit=limit
+                ),
+            )
+        return RateLimitDecision(allowed=True)
+
+
+class DatabaseRateLimitBackend:
+    """
+    Original limiter: one RateLimitEvent row per allowed request, COUNT(*) over the window.
+    Works across processes with no extra infrastructure; kept as the fallback.
+    """
+
+    def hit(self, *, key: str, limit: int, window_seconds: int, db: Optional[Session] = None) -> RateLimitDecision:
+        if db is None:
+            raise RuntimeError("DatabaseRateLimitBackend needs a DB session")
+        user_id_str, endpoint_key = key.split(":", 1)
+        user_id = int(user_id_str)
 
-    async def _dep(
-        db: Session = Depends(get_db),
-        user: User = Depends(get_current_user),
-    ) -> None:
         now = datetime.utcnow()
         window_start = now - timedelta(seconds=window_seconds)
 
-        count = (
-            db.query(RateLimitEvent)
-            .filter(RateLimitEvent.user_id == user.id)
+        count, oldest = (
+            db.query(func.count(RateLimitEvent.id), func.min(RateLimitEvent.created_at))
+            .filter(RateLimitEvent.user_id == user_id)
             .filter(RateLimitEvent.endpoint == endpoint_key)
             .filter(RateLimitEvent.created_at >= window_start)
-            .count()
+            .one()
         )
 
         if count >= limit:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded for {endpoint_key}. Try again later.",
-                headers={"Retry-After": str(window_seconds)},
-            )
+            # Exact for a sliding log: the oldest event in the window expires first.
+            wait = (oldest + timedelta(seconds=window_seconds) - now).total_seconds() if oldest else window_seconds
+            return RateLimitDecision(allowed=False, retry_after=max(1, int(math.ceil(wait))))
 
         db.add(
             RateLimitEvent(
-                user_id=user.id,
+                user_id=user_id,
                 endpoint=endpoint_key,
                 created_at=now,
             )
         )
         db.commit()
+        return RateLimitDecision(allowed=True)
+
+
+class FallbackRateLimitBackend:
+    """Uses `primary`, and `fallback` for any call where primary raises (e.g. store down)."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def hit(self, *, key: str, limit: int, window_seconds: int, db: Optional[Session] = None) -> RateLimitDecision:
+        try:
+            return self.primary.hit(key=key, limit=limit, window_seconds=window_seconds, db=db)
+        except Exception as exc:
+            logger.warning("rate limit store unavailable, using DB fallback: %s", exc)
+            return self.fallback.hit(key=key, limit=limit, window_seconds=window_seconds, db=db)
+
+
+def _build_backend():
+    """
+    RATE_LIMIT_BACKEND:
+      - memory (default): per-process sliding window counter
+      - redis: shared sliding window counter at REDIS_URL, DB fallback on errors
+      - db: RateLimitEvent rows (original behavior)
+    """
+    name = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    if name == "db":
+        return DatabaseRateLimitBackend()
+    if name == "redis":
+        try:
+            import redis  # type: ignore
+
+            client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            return FallbackRateLimitBackend(SharedStoreRateLimitBackend(client), DatabaseRateLimitBackend())
+        except Exception as exc:
+            logger.warning("redis rate limit backend unavailable, using DB: %s", exc)
+            return DatabaseRateLimitBackend()
+    return InMemoryRateLimitBackend()
+
+
+_BACKEND = None
+
+
+def get_rate_limit_backend():
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = _build_backend()
+    return _BACKEND
+
+
+def set_rate_limit_backend(backend) -> None:
+    """Swap the process-wide backend (tests, custom deployments)."""
+    global _BACKEND
+    _BACKEND = backend
+
+
+def prune_rate_limit_events(db: Session, *, older_than: timedelta) -> int:
+    """Retention job for the DB backend: deletes RateLimitEvent rows older than `older_than`."""
+    cutoff = datetime.utcnow() - older_than
+    deleted = (
+        db.query(RateLimitEvent)
+        .filter(RateLimitEvent.created_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return int(deleted or 0)
+
+
+def rate_limit(
+    *,
+    endpoint_key: str,
+    limit: int,
+    window_seconds: int,
+) -> Callable:
+    """
+    Per-user rate limiter dependency backed by the configured RateLimitBackend.
+    Sync on purpose: backends may do blocking I/O, so FastAPI runs it in the threadpool.
+    """
+
+    def _dep(
+        db: Session = Depends(get_db),
+        user: User = Depends(get_current_user),
+    ) -> None:
+        decision = get_rate_limit_backend().hit(
+            key=f"{user.id}:{endpoint_key}",
+            limit=limit,
+            window_seconds=window_seconds,
+            db=db,
+        )
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for {endpoint_key}. Try again later.",
+                headers={"Retry-After": str(decision.retry_after)},
+            )
 
     return _dep
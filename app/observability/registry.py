@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("mindgarden.metrics")
+
+# Upper bounds (ms) of the latency histogram buckets; one extra overflow bucket (+Inf).
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Finer buckets for things that are usually sub-millisecond (SQL statements, FAISS search).
+FAST_BUCKETS_MS: Tuple[float, ...] = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, registry: "Registry", name: str, help_text: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = registry._lock
+        registry._register(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        super().__init__(registry, name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list:
+        return [[list(k), v] for k, v in self._values.items()]
+
+
+GAUGE_MERGE_MODES = ("sum", "max", "mean")
+
+
+class Gauge(_Metric):
+    """
+    Unlabelled value read from a callback at collection time; a None result is not
+    exposed. kind="counter" exposes a monotonic in-process total kept elsewhere (e.g.
+    cache stats). `merge` combines workers: "sum" for per-process amounts (queue
+    depth), "max" for values every worker reads from shared state (DB figures) or
+    worst-case values, "mean" for per-process ratios.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, registry, name, help_text, fn: Callable[[], Optional[float]], kind: str = "gauge", merge: str = "sum"):
+        if merge not in GAUGE_MERGE_MODES:
+            raise ValueError(f"{name}: merge must be one of {GAUGE_MERGE_MODES}")
+        super().__init__(registry, name, help_text, ())
+        self._fn = fn
+        self.type_name = kind
+        self.merge = merge
+
+    def _samples(self) -> list:
+        try:
+            value = self._fn()
+        except Exception:
+            logger.exception("gauge %s callback failed", self.name)
+            return []
+        return [] if value is None else [[[], float(value)]]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket..., overflow count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe((time.perf_counter() - start) * 1000, **labels)
+
+    def _samples(self) -> list:
+        return [[list(k), list(v)] for k, v in self._values.items()]
+
+
+class Registry:
+    """
+    Counters, callback gauges and fixed-bucket histograms, kept in process memory.
+
+    Multi-worker deployments set METRICS_MULTIPROC_DIR to a directory shared by the
+    workers: each one writes a JSON snapshot (<dir>/metrics_<pid>.json) every
+    METRICS_SNAPSHOT_SECONDS, and render() merges all of them. Counters and histograms
+    of exited workers keep counting; their callback gauges are dropped.
+    """
+
+    def __init__(self, multiproc_dir: Optional[str] = None, snapshot_seconds: float = 5.0):
+        self._lock = threading.Lock()
+        self._metrics: List[_Metric] = []
+        self.multiproc_dir = multiproc_dir or None
+        self.snapshot_seconds = float(snapshot_seconds)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _register(self, metric: _Metric) -> None:
+        if any(m.name == metric.name for m in self._metrics):
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics.append(metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return Counter(self, name, help_text, labelnames)
+
+    def gauge(
+        self, name: str, help_text: str, fn: Callable[[], Optional[float]], kind: str = "gauge", merge: str = "sum"
+    ) -> Gauge:
+        return Gauge(self, name, help_text, fn, kind, merge)
+
+    def histogram(
+        self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_MS
+    ) -> Histogram:
+        return Histogram(self, name, help_text, labelnames, buckets)
+
+    def reset(self) -> None:
+        """Zeroes counters and histograms (tests)."""
+        with self._lock:
+            for m in self._metrics:
+                if isinstance(m, (Counter, Histogram)):
+                    m._values.clear()
+
+    def snapshot(self) -> dict:
+        gauges = [m for m in self._metrics if isinstance(m, Gauge)]
+        gauge_samples = {m.name: m._samples() for m in gauges}  # callbacks run outside the lock
+        with self._lock:
+            metrics = {}
+            for m in self._metrics:
+                entry = {"type": m.type_name, "help": m.help, "labelnames": list(m.labelnames)}
+                if isinstance(m, Histogram):
+                    entry["buckets"] = list(m.buckets)
+                if isinstance(m, Gauge):
+                    entry["callback"] = True
+                    entry["merge"] = m.merge
+                entry["samples"] = gauge_samples[m.name] if isinstance(m, Gauge) else m._samples()
+                metrics[m.name] = entry
+        return {"pid": os.getpid(), "metrics": metrics}
+
+    # --- multi-process ---
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics_{pid}.json")
+
+    def write_snapshot(self) -> None:
+        if not self.multiproc_dir:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def collect(self) -> List[dict]:
+        """This process's snapshot plus, in multi-process mode, every other worker's."""
+        if not self.multiproc_dir:
+            return [self.snapshot()]
+        self.write_snapshot()
+        snapshots = []
+        for path in sorted(glob.glob(os.path.join(self.multiproc_dir, "metrics_*.json"))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue  # mid-write by another worker, or removed
+            if not _pid_alive(int(snap.get("pid", 0))):
+                for entry in snap["metrics"].values():
+                    if entry.get("callback"):
+                        entry["samples"] = []
+            snapshots.append(snap)
+        return snapshots
+
+    def start(self) -> None:
+        if not self.multiproc_dir or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.write_snapshot()
+        except OSError:
+            logger.exception("final metrics snapshot failed")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.snapshot_seconds):
+            try:
+                self.write_snapshot()
+            except OSError:
+                logger.exception("metrics snapshot failed")
+
+    def render(self) -> str:
+        return render_prometheus(self.collect())
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def merge_snapshots(snapshots: List[dict]) -> Dict[str, dict]:
+    merged: Dict[str, dict] = {}
+    seen: Dict[Tuple[str, LabelValues], int] = {}  # workers contributing to each sample ("mean")
+    for snap in snapshots:
+        for name, entry in snap["metrics"].items():
+            out = merged.setdefault(name, {**entry, "samples": {}})
+            mode = entry.get("merge", "sum")
+            for labels, value in entry["samples"]:
+                key = tuple(labels)
+                prev = out["samples"].get(key)
+                if entry["type"] == "histogram":
+                    out["samples"][key] = value if prev is None else [a + b for a, b in zip(prev, value)]
+                elif mode == "max":
+                    out["samples"][key] = value if prev is None else max(prev, value)
+                else:
+                    out["samples"][key] = (prev or 0.0) + value
+                    seen[(name, key)] = seen.get((name, key), 0) + 1
+    for (name, key), n in seen.items():
+        if merged[name].get("merge") == "mean":
+            merged[name]["samples"][key] /= n
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_prometheus(snapshots: List[dict]) -> str:
+    """Prometheus text exposition format (0.0.4) for the merged snapshots."""
+    lines: List[str] = []
+    for name, entry in merge_snapshots(snapshots).items():
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        names = entry["labelnames"]
+        for values, value in sorted(entry["samples"].items()):
+            if entry["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, values)} {_num(value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(entry["buckets"], value):
+                cumulative += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{name}_bucket{_labels(names, values, le)} {_num(cumulative)}")
+            count = cumulative + value[-2]
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_labels(names, values, le)} {_num(count)}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_num(round(value[-1], 3))}")
+            lines.append(f"{name}_count{_labels(names, values)} {_num(count)}")
+    return "\n".join(lines) + "\n"
+
+
+_REGISTRY = Registry(
+    multiproc_dir=os.getenv("METRICS_MULTIPROC_DIR", ""),
+    snapshot_seconds=float(os.getenv("METRICS_SNAPSHOT_SECONDS", "5")),
+)
+
+
+def get_registry() -> Registry:
+    return _REGISTRY
+
+
+# --- application metrics ---
+
+HTTP_REQUESTS = _REGISTRY.counter(
+    "mindgarden_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+HTTP_REQUEST_DURATION = _REGISTRY.histogram(
+    "mindgarden_http_request_duration_ms", "HTTP request latency in ms by route template", ("method", "route")
+)
+AI_REQUESTS = _REGISTRY.counter(
+    "mindgarden_ai_requests_total", "AI requests by endpoint, provider and outcome", ("endpoint", "provider", "outcome")
+)
+AI_LATENCY = _REGISTRY.histogram(
+    "mindgarden_ai_latency_ms", "AI request latency in ms by endpoint and provider", ("endpoint", "provider")
+)
+DB_QUERY_DURATION = _REGISTRY.histogram(
+    "mindgarden_db_query_duration_ms", "SQL statement execution time in ms", ("statement",), FAST_BUCKETS_MS
+)
+EMBEDDING_DURATION = _REGISTRY.histogram(
+    "mindgarden_embedding_duration_ms", "Time per embedding encode() call in ms"
+)
+FAISS_SEARCH_DURATION = _REGISTRY.histogram(
+    "mindgarden_faiss_search_duration_ms", "FAISS index search time in ms", (), FAST_BUCKETS_MS
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("mg_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("mg_query_start")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+    if verb not in ("select", "insert", "update", "delete"):
+        verb = "other"
+    DB_QUERY_DURATION.observe(elapsed_ms, statement=verb)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get("mg_query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(sync_engine) -> None:
+    """Times every SQL statement run on sync_engine (pass AsyncEngine.sync_engine for async)."""
+    from sqlalchemy import event
+
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
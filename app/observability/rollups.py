@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import AIMetricsRollup, AIRequestEvent
+from app.observability.registry import LATENCY_BUCKETS_MS
+
+logger = logging.getLogger("mindgarden.rollups")
+
+MINUTE = 60
+DAY = 86400
+
+# (bucket_start, bucket_seconds, user_id, endpoint, provider)
+RollupKey = Tuple[datetime, int, int, str, str]
+
+
+def empty_hist() -> List[int]:
+    return [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+
+def merge_hist(a: List[int], b: List[int]) -> List[int]:
+    if len(a) != len(b):
+        raise ValueError("histograms use different bucket layouts")
+    return [x + y for x, y in zip(a, b)]
+
+
+def hist_quantile(hist: List[int], q: float) -> Optional[float]:
+    """
+    Estimated q-quantile, interpolating linearly inside the bucket that holds the
+    nearest-rank observation. Values in the overflow bucket report the last bound.
+    """
+    total = sum(hist)
+    if total == 0:
+        return None
+    rank = max(1.0, q * total)
+    seen = 0
+    for i, n in enumerate(hist):
+        if n and seen + n >= rank:
+            if i >= len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[-1])
+            lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+            upper = LATENCY_BUCKETS_MS[i]
+            return round(lower + (upper - lower) * (rank - seen) / n, 2)
+        seen += n
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def _floor(at: datetime, seconds: int) -> datetime:
+    epoch = datetime(1970, 1, 1)
+    return epoch + timedelta(seconds=int((at - epoch).total_seconds()) // seconds * seconds)
+
+
+@dataclass
+class _Agg:
+    count: int = 0
+    error_count: int = 0
+    cache_hits: int = 0
+    latency_sum_ms: int = 0
+    hist: List[int] = field(default_factory=empty_hist)
+
+    def add(self, other: "_Agg") -> None:
+        self.count += other.count
+        self.error_count += other.error_count
+        self.cache_hits += other.cache_hits
+        self.latency_sum_ms += other.latency_sum_ms
+        self.hist = merge_hist(self.hist, other.hist)
+
+
+def _single(latency_ms: int, success: bool, cache_hit: bool) -> _Agg:
+    one = _Agg(
+        count=1,
+        error_count=0 if success else 1,
+        cache_hits=1 if cache_hit else 0,
+        latency_sum_ms=int(latency_ms),
+    )
+    one.hist[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+    return one
+
+
+def _bucket_keys(at: datetime, user_id: int, endpoint: str, provider: str) -> Tuple[RollupKey, RollupKey]:
+    """Every request counts in the global minute bucket and in its user's daily bucket."""
+    return (
+        (_floor(at, MINUTE), MINUTE, 0, endpoint, provider),
+        (_floor(at, DAY), DAY, int(user_id), endpoint, provider),
+    )
+
+
+class RollupAccumulator:
+    """
+    In-process pre-aggregation of AI request stats.
+
+    record() is O(1) and touches no I/O. flush() merges everything pending into
+    ai_metrics_rollups (adding counts and histograms onto existing rows), so several
+    workers can flush into the same buckets. A background thread flushes every
+    `flush_seconds`; /metrics also flushes before reading.
+    """
+
+    def __init__(
+        self,
+        *,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_seconds: float = 10.0,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self.session_factory = session_factory
+        self.flush_seconds = float(flush_seconds)
+        self.clock = clock
+        self._pending: Dict[RollupKey, _Agg] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(
+        self,
+        *,
+        user_id: int,
+        endpoint: str,
+        provider: str,
+        latency_ms: int,
+        success: bool,
+        cache_hit: bool = False,
+        at: Optional[datetime] = None,
+    ) -> None:
+        one = _single(latency_ms, success, cache_hit)
+        keys = _bucket_keys(at or self.clock(), user_id, endpoint, provider)
+        with self._lock:
+            for key in keys:
+                self._pending.setdefault(key, _Agg()).add(one)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Writes pending aggregates; returns how many bucket rows were touched."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            db = self.session_factory()
+            try:
+                for key, agg in batch.items():
+                    _merge_into_row(db, key, agg)
+                db.commit()
+            except Exception:
+                db.rollback()
+                # Keep the data for the next flush rather than dropping it.
+                with self._lock:
+                    for key, agg in batch.items():
+                        self._pending.setdefault(key, _Agg()).add(agg)
+                raise
+            finally:
+                db.close()
+            return len(batch)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("final metrics rollup flush failed")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("metrics rollup flush failed")
+
+
+def _merge_into_row(db: Session, key: RollupKey, agg: _Agg) -> None:
+    bucket_start, bucket_seconds, user_id, endpoint, provider = key
+    filters = (
+        AIMetricsRollup.bucket_start == bucket_start,
+        AIMetricsRollup.bucket_seconds == bucket_seconds,
+        AIMetricsRollup.user_id == user_id,
+        AIMetricsRollup.endpoint == endpoint,
+        AIMetricsRollup.provider == provider,
+    )
+    for _attempt in range(2):
+        row = db.query(AIMetricsRollup).filter(*filters).with_for_update().first()
+        if row is not None:
+            row.count += agg.count
+            row.error_count += agg.error_count
+            row.cache_hits += agg.cache_hits
+            row.latency_sum_ms += agg.latency_sum_ms
+            row.latency_hist_json = json.dumps(merge_hist(json.loads(row.latency_hist_json), agg.hist))
+            row.updated_at = datetime.utcnow()
+            return
+        try:
+            with db.begin_nested():
+                db.add(
+                    AIMetricsRollup(
+                        bucket_start=bucket_start,
+                        bucket_seconds=bucket_seconds,
+                        user_id=user_id,
+                        endpoint=endpoint,
+                        provider=provider,
+                        count=agg.count,
+                        error_count=agg.error_count,
+                        cache_hits=agg.cache_hits,
+                        latency_sum_ms=agg.latency_sum_ms,
+                        latency_hist_json=json.dumps(agg.hist),
+                    )
+                )
+            return
+        except IntegrityError:
+            # Another worker created the bucket first; merge into theirs.
+            continue
+    raise RuntimeError(f"could not merge rollup bucket {key}")
+
+
+@dataclass
+class RollupSummary:
+    count: int
+    error_count: int
+    cache_hits: int
+    latency_sum_ms: int
+    hist: List[int]
+
+    @property
+    def latency_avg_ms(self) -> Optional[float]:
+        return round(self.latency_sum_ms / self.count, 2) if self.count else None
+
+    @property
+    def latency_p95_ms(self) -> Optional[float]:
+        return hist_quantile(self.hist, 0.95)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        return round(self.cache_hits / self.count, 4) if self.count else 0.0
+
+
+def read_rollups(
+    db: Session,
+    *,
+    start: datetime,
+    end: datetime,
+    bucket_seconds: int,
+    user_id: int = 0,
+) -> RollupSummary:
+    """Merges every bucket in [start, end) for user_id (0 = all users)."""
+    rows = (
+        db.query(
+            AIMetricsRollup.count,
+            AIMetricsRollup.error_count,
+            AIMetricsRollup.cache_hits,
+            AIMetricsRollup.latency_sum_ms,
+            AIMetricsRollup.latency_hist_json,
+        )
+        .filter(AIMetricsRollup.bucket_seconds == bucket_seconds)
+        .filter(AIMetricsRollup.user_id == user_id)
+        .filter(AIMetricsRollup.bucket_start >= start)
+        .filter(AIMetricsRollup.bucket_start < end)
+        .all()
+    )
+    total = _Agg()
+    for count, errors, hits, latency_sum, hist_json in rows:
+        total.add(_Agg(count, errors, hits, latency_sum, json.loads(hist_json)))
+    return RollupSummary(total.count, total.error_count, total.cache_hits, total.latency_sum_ms, total.hist)
+
+
+def prune_rollups(db: Session, *, older_than: timedelta) -> int:
+    """Retention for per-minute rows (daily rows are kept for long-range analytics)."""
+    cutoff = datetime.utcnow() - older_than
+    deleted = (
+        db.query(AIMetricsRollup)
+        .filter(AIMetricsRollup.bucket_seconds == MINUTE)
+        .filter(AIMetricsRollup.bucket_start < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return int(deleted or 0)
+
+
+def backfill_rollups(db: Session, *, before: Optional[datetime] = None) -> int:
+    """
+    One-off after upgrading: folds the ai_request_events written before the rollups went
+    live into ai_metrics_rollups, so /metrics and /metrics/analytics cover that history.
+
+    `before` (UTC) is when the accumulator started writing. It defaults to the first
+    rollup bucket, i.e. midnight of the go-live day, so events earlier that day are only
+    included when `before` is given. Refuses to run when rollups older than `before`
+    already exist (the history was folded in before). Commits; returns the event count.
+    """
+    first = db.query(func.min(AIMetricsRollup.bucket_start)).scalar()
+    before = before or first
+    if first is not None and before is not None:
+        older = (
+            db.query(AIMetricsRollup.id)
+            .filter(
+                or_(
+                    and_(AIMetricsRollup.bucket_seconds == MINUTE, AIMetricsRollup.bucket_start < _floor(before, MINUTE)),
+                    and_(AIMetricsRollup.bucket_seconds == DAY, AIMetricsRollup.bucket_start < _floor(before, DAY)),
+                )
+            )
+            .first()
+        )
+        if older is not None:
+            raise ValueError(f"rollups before {before} already exist; the backfill has already run")
+
+    events = db.query(
+        AIRequestEvent.user_id,
+        AIRequestEvent.endpoint,
+        AIRequestEvent.provider,
+        AIRequestEvent.latency_ms,
+        AIRequestEvent.success,
+        AIRequestEvent.cache_hit,
+        AIRequestEvent.created_at,
+    )
+    if before is not None:
+        events = events.filter(AIRequestEvent.created_at < before)
+
+    batch: Dict[RollupKey, _Agg] = {}
+    folded = 0
+    for user_id, endpoint, provider, latency_ms, success, cache_hit, created_at in events.yield_per(1000):
+        one = _single(latency_ms, success, cache_hit)
+        for key in _bucket_keys(created_at, user_id, endpoint, provider or "rules"):
+            batch.setdefault(key, _Agg()).add(one)
+        folded += 1
+
+    for key, agg in batch.items():
+        _merge_into_row(db, key, agg)
+    db.commit()
+    return folded
+
+
+_ACCUMULATOR: Optional[RollupAccumulator] = None
+
+
+def get_rollup_accumulator() -> RollupAccumulator:
+    """METRICS_ROLLUP_FLUSH_SECONDS (default 10)."""
+    global _ACCUMULATOR
+    if _ACCUMULATOR is None:
+        _ACCUMULATOR = RollupAccumulator(flush_seconds=float(os.getenv("METRICS_ROLLUP_FLUSH_SECONDS", "10")))
+    return _ACCUMULATOR
+
+
+def main() -> None:
+    """One-off history backfill: python -m app.observability.rollups --backfill [--before ISO_UTC]"""
+    import argparse
+
+    from app.db import Base, engine
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    parser = argparse.ArgumentParser(description="Fold ai_request_events into ai_metrics_rollups.")
+    parser.add_argument("--backfill", action="store_true", help="fold in events older than the first rollup")
+    parser.add_argument(
+        "--before",
+        type=datetime.fromisoformat,
+        default=None,
+        help="UTC time the rollups went live (default: the first rollup bucket)",
+    )
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do (pass --backfill)")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        logger.info("backfilled ai metrics rollups events=%s", backfill_rollups(db, before=args.before))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
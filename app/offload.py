@@ -0,0 +1,45 @@
+# app/offload.py
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_model_executor() -> ThreadPoolExecutor:
+    """
+    Small dedicated pool for CPU-bound model work (embedding encode + FAISS search).
+
+    Kept separate from Starlette's shared threadpool (which serves every sync route and
+    dependency) so a burst of embedding calls queues here instead of starving DB I/O.
+    AI_MODEL_WORKERS (default: min(4, cpu count)).
+    """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                workers = int(os.getenv("AI_MODEL_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+                _EXECUTOR = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-model")
+    return _EXECUTOR
+
+
+async def run_model_work(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs fn on the model executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_model_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_model_executor() -> None:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        executor, _EXECUTOR = _EXECUTOR, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
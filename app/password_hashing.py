@@ -0,0 +1,130 @@
+# app/password_hashing.py
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from passlib.context import CryptContext
+
+T = TypeVar("T")
+
+DEFAULT_ROUNDS = 29000  # passlib's pbkdf2_sha256 default
+
+_CONTEXTS: Dict[int, CryptContext] = {}
+
+
+def crypt_context(rounds: int) -> CryptContext:
+    """
+    pbkdf2_sha256 at exactly `rounds`: hashes made with any other round count report
+    needs_update, so verify_and_update rehashes them on the next successful login.
+    """
+    ctx = _CONTEXTS.get(rounds)
+    if ctx is None:
+        ctx = _CONTEXTS[rounds] = CryptContext(
+            schemes=["pbkdf2_sha256"],
+            deprecated="auto",
+            pbkdf2_sha256__default_rounds=rounds,
+            pbkdf2_sha256__min_rounds=rounds,
+            pbkdf2_sha256__max_rounds=rounds,
+        )
+    return ctx
+
+
+# Module-level so they can be pickled into the worker processes.
+def _hash(password: str, rounds: int) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return crypt_context(rounds).verify_and_update(password, hashed)
+
+
+class PasswordHashPoolFull(Exception):
+    """Raised instead of queueing when max_pending hashes are already waiting."""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing/verification on a small process pool.
+
+    pbkdf2 is deliberately CPU-heavy; on the request threadpool a login burst would
+    occupy every thread and core. Here at most `workers` cores hash at once, at most
+    `max_pending` calls wait (each holds its request thread while it does), and
+    anything beyond that fails fast with PasswordHashPoolFull. workers=0 hashes
+    inline on the calling thread.
+    """
+
+    def __init__(self, *, workers: int, max_pending: int, rounds: int = DEFAULT_ROUNDS):
+        self.workers = max(0, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.rounds = int(rounds)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password, self.rounds)
+
+    def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new_hash); new_hash is set when the stored hash used other cost settings."""
+        return self._run(_verify_and_update, password, hashed, self.rounds)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "max_pending": self.max_pending}
+
+    def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.workers == 0:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordHashPoolFull()
+            self._pending += 1
+            if self._executor is None:
+                # spawn, not fork: the API process has live threads (and their locks).
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = self._executor
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_HASHER: Optional[PasswordHasher] = None
+_HASHER_LOCK = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """
+    PASSWORD_HASH_WORKERS (default 2; 0 = inline), PASSWORD_HASH_MAX_PENDING
+    (default 4 per worker), PASSWORD_HASH_ROUNDS (default 29000).
+    """
+    global _HASHER
+    if _HASHER is None:
+        with _HASHER_LOCK:
+            if _HASHER is None:
+                workers = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+                _HASHER = PasswordHasher(
+                    workers=workers,
+                    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "0")) or 4 * max(1, workers),
+                    rounds=int(os.getenv("PASSWORD_HASH_ROUNDS", str(DEFAULT_ROUNDS))),
+                )
+    return _HASHER
+
+
+def shutdown_password_hasher() -> None:
+    """Stops the worker processes; the next hash starts a fresh pool."""
+    if _HASHER is not None:
+        _HASHER.shutdown()
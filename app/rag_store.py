@@ -1,13 +1,21 @@
 # app/rag_store.py
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Optional
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 import numpy as np
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from . import models
+from .embedding_cache import EmbeddingCache, get_query_embedding_cache
+from .observability.registry import EMBEDDING_DURATION, FAISS_SEARCH_DURATION
 
 # RAG must never break core app behavior. If FAISS isn't available, we just disable RAG.
 try:  # pragma: no cover
@@ -30,6 +38,170 @@ def _normalize_rows(x: np.ndarray) -> np.ndarray:
     return x / norms
 
 
+@dataclass
+class _CachedIndex:
+    """A built FAISS index for one user, tagged with the index version it reflects."""
+    version: int
+    index: Any
+    reflection_ids: List[int]
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.index.ntotal) * int(self.index.d) * 4
+
+
+class UserIndexCache:
+    """
+    In-process LRU of per-user FAISS indexes, evicted by total vector memory.
+
+    Entries are keyed by user_id and tagged with the ReflectionIndexVersion they were
+    built from. A lookup with a different version is a miss, which is how other API
+    workers' writes invalidate our copy.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[int, _CachedIndex]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, version: int) -> Optional[_CachedIndex]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry.version != version:
+                self._drop(user_id)
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+
+    def put(self, user_id: int, entry: _CachedIndex) -> None:
+        with self._lock:
+            self._drop(user_id)
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[user_id] = entry
+            self._bytes += entry.nbytes
+            self._evict()
+
+    def append(
+        self,
+        user_id: int,
+        *,
+        new_version: int,
+        vector: np.ndarray,
+        reflection_id: int,
+    ) -> None:
+        """
+        Add one vector to a cached index in place, if that index is exactly one
+        version behind. Otherwise drop it so the next query rebuilds from SQL.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if entry.version != new_version - 1:
+                self._drop(user_id)
+                return
+            with entry.lock:
+                before = entry.nbytes
+                entry.index.add(vector)
+                entry.reflection_ids.append(int(reflection_id))
+                entry.version = new_version
+                self._bytes += entry.nbytes - before
+            self._entries.move_to_end(user_id)
+            self._evict()
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._drop(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"users": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _drop(self, user_id: int) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _uid, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.nbytes
+
+
+def _index_cache_max_bytes() -> int:
+    mb = float(os.getenv("RAG_INDEX_CACHE_MAX_MB", "64"))
+    return int(mb * 1024 * 1024)
+
+
+def _current_index_version(db: Session, user_id: int) -> int:
+    v = (
+        db.query(models.ReflectionIndexVersion.version)
+        .filter(models.ReflectionIndexVersion.user_id == user_id)
+        .scalar()
+    )
+    return int(v or 0)
+
+
+def _bump_index_version(db: Session, user_id: int) -> int:
+    """
+    Atomically increments the user's index version inside the caller's transaction.
+    One INSERT ... ON CONFLICT (user_id) DO UPDATE, so two workers adding a user's first
+    reflection can't both try to insert version 1; the row lock serializes later bumps
+    and each writer observes a distinct version.
+    """
+    now = datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return _bump_index_version_fallback(db, user_id, now)
+
+    table = models.ReflectionIndexVersion.__table__
+    stmt = insert(table).values(user_id=user_id, version=1, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={"version": table.c.version + 1, "updated_at": now},
+    ).returning(table.c.version)
+    return int(db.execute(stmt).scalar_one())
+
+
+def _bump_index_version_fallback(db: Session, user_id: int, now: datetime) -> int:
+    """UPDATE, else INSERT; losing the insert race to another writer retries the UPDATE."""
+    for _attempt in range(2):
+        updated = (
+            db.query(models.ReflectionIndexVersion)
+            .filter(models.ReflectionIndexVersion.user_id == user_id)
+            .update(
+                {
+                    models.ReflectionIndexVersion.version: models.ReflectionIndexVersion.version + 1,
+                    models.ReflectionIndexVersion.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            return _current_index_version(db, user_id)
+        try:
+            with db.begin_nested():
+                db.add(models.ReflectionIndexVersion(user_id=user_id, version=1, updated_at=now))
+            return 1
+        except IntegrityError:
+            continue
+    raise RuntimeError(f"could not bump the RAG index version for user {user_id}")
+
+
 class RagStore:
     """
     SQLite-backed reflection store + in-memory FAISS retrieval.
@@ -38,21 +210,47 @@ class RagStore:
       - Each check-in note embedding is stored in models.ReflectionEmbedding as float32 bytes.
 
     Retrieval:
-      - For a given user_id, we load their stored vectors from SQL, build a temporary FAISS
-        IndexFlatIP, and search with cosine similarity (via inner product on normalized vectors).
+      - For a given user_id, we keep a FAISS IndexFlatIP built from their stored vectors in
+        an LRU cache and search with cosine similarity (via inner product on normalized vectors).
+      - The cache entry is tagged with models.ReflectionIndexVersion; new reflections bump the
+        version, so a stale entry (e.g. written by another worker) is rebuilt from SQL.
 
-    This is MVP-simple and per-user only.
+    Per-user only.
     """
 
-    def __init__(self, embedder):
+    def __init__(
+        self,
+        embedder,
+        index_cache: Optional[UserIndexCache] = None,
+        query_cache: Optional[EmbeddingCache] = None,
+    ):
         if faiss is None:
             raise RuntimeError("faiss-cpu is not installed")
         self.embedder = embedder
         self.dim = int(embedder.get_sentence_embedding_dimension())
+        self.index_cache = index_cache if index_cache is not None else UserIndexCache(_index_cache_max_bytes())
+        self.query_cache = query_cache if query_cache is not None else get_query_embedding_cache()
 
     def embed_text(self, text: str) -> np.ndarray:
         """Returns a (1, dim) normalized float32 vector."""
-        vec = self.embedder.encode([text], normalize_embeddings=False)
+        return self.embed_texts([text])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """
+        Like embed_text, but served from the query embedding cache when possible.
+        Query strings repeat a lot (fallback query, latest note); stored notes do not.
+        """
+        cached = self.query_cache.get(text)
+        if cached is not None and cached.shape == (1, self.dim):
+            return cached
+        vec = self.embed_text(text)
+        self.query_cache.put(text, vec)
+        return vec
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Returns a (len(texts), dim) normalized float32 matrix from one encode() call."""
+        with EMBEDDING_DURATION.time():
+            vec = self.embedder.encode(list(texts), normalize_embeddings=False)
         vec = np.asarray(vec, dtype="float32")
         if vec.ndim == 1:
             vec = vec.reshape(1, -1)
@@ -95,66 +293,132 @@ class RagStore:
         )
         db.add(row)
         db.flush()  # assign row.id
+
+        new_version = _bump_index_version(db, user_id)
+        self._append_to_index_after_commit(
+            db,
+            user_id=user_id,
+            new_version=new_version,
+            vector=vec,
+            reflection_id=int(row.id),
+        )
         return int(row.id)
 
-    def query_reflections(
+    def _append_to_index_after_commit(
         self,
-        *,
         db: Session,
+        *,
         user_id: int,
-        query_text: str,
-        k: int = 5,
-    ) -> List[RetrievedReflection]:
+        new_version: int,
+        vector: np.ndarray,
+        reflection_id: int,
+    ) -> None:
         """
-        Return top-k reflections for this user relevant to query_text.
+        Defers the in-place cache update until the session commits, so a rolled-back
+        check-in never leaves a phantom vector in the cached index.
         """
-        query_text = (query_text or "").strip()
-        if not query_text:
-            return []
+        pending = db.info.setdefault("rag_index_appends", [])
+        pending.append((user_id, new_version, vector, reflection_id))
+
+        if db.info.get("rag_index_listeners"):
+            return
+        db.info["rag_index_listeners"] = True
 
+        def _apply(session: Session) -> None:
+            for uid, version, vec, rid in session.info.pop("rag_index_appends", []):
+                self.index_cache.append(uid, new_version=version, vector=vec, reflection_id=rid)
+
+        def _discard(session: Session) -> None:
+            session.info.pop("rag_index_appends", None)
+
+        event.listen(db, "after_commit", _apply)
+        event.listen(db, "after_soft_rollback", lambda session, previous_transaction: _discard(session))
+
+    def _build_index(self, db: Session, *, user_id: int, version: int) -> Optional[_CachedIndex]:
         rows = (
-            db.query(models.ReflectionEmbedding)
+            db.query(models.ReflectionEmbedding.id, models.ReflectionEmbedding.embedding)
             .filter(models.ReflectionEmbedding.user_id == user_id)
             .order_by(models.ReflectionEmbedding.checkin_date.desc())
             .all()
         )
-        if not rows:
-            return []
 
         vectors: List[np.ndarray] = []
-        kept_rows: List[models.ReflectionEmbedding] = []
+        kept_ids: List[int] = []
 
-        for r in rows:
-            v = np.frombuffer(r.embedding, dtype="float32")
+        for rid, blob in rows:
+            v = np.frombuffer(blob, dtype="float32")
             if v.size != self.dim:
                 # Skip any corrupted / old-dim vectors
                 continue
             vectors.append(v)
-            kept_rows.append(r)
+            kept_ids.append(int(rid))
 
         if not vectors:
-            return []
+            return None
 
         mat = np.vstack(vectors).astype("float32")
         mat = _normalize_rows(mat)
 
         index = faiss.IndexFlatIP(self.dim)
         index.add(mat)
+        return _CachedIndex(version=version, index=index, reflection_ids=kept_ids)
+
+    def query_reflections(
+        self,
+        *,
+        db: Session,
+        user_id: int,
+        query_text: str,
+        k: int = 5,
+    ) -> List[RetrievedReflection]:
+        """
+        Return top-k reflections for this user relevant to query_text.
+        """
+        query_text = (query_text or "").strip()
+        if not query_text:
+            return []
+
+        version = _current_index_version(db, user_id)
+        entry = self.index_cache.get(user_id, version)
+        if entry is None:
+            entry = self._build_index(db, user_id=user_id, version=version)
+            if entry is None:
+                return []
+            self.index_cache.put(user_id, entry)
+
+        qv = self.embed_query(query_text)
+        with entry.lock, FAISS_SEARCH_DURATION.time():
+            scores, idxs = entry.index.search(qv, min(k, len(entry.reflection_ids)))
+            hits = [
+                (float(score), entry.reflection_ids[int(i)])
+                for score, i in zip(scores[0].tolist(), idxs[0].tolist())
+                if i >= 0
+            ]
+        if not hits:
+            return []
 
-        qv = self.embed_text(query_text)
-        scores, idxs = index.search(qv, min(k, len(kept_rows)))
+        rows = (
+            db.query(
+                models.ReflectionEmbedding.id,
+                models.ReflectionEmbedding.checkin_date,
+                models.ReflectionEmbedding.text,
+            )
+            .filter(models.ReflectionEmbedding.id.in_([rid for _score, rid in hits]))
+            .all()
+        )
+        by_id = {int(r.id): r for r in rows}
 
         out: List[RetrievedReflection] = []
-        for score, i in zip(scores[0].tolist(), idxs[0].tolist()):
-            if i < 0:
+        for score, rid in hits:
+            r = by_id.get(rid)
+            if r is None:
                 continue
-            r = kept_rows[int(i)]
             out.append(
                 RetrievedReflection(
-                    score=float(score),
+                    score=score,
                     checkin_date=str(r.checkin_date),
                     text=r.text,
-                    reflection_id=int(r.id),
+                    reflection_id=rid,
                 )
             )
         return out
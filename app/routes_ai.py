@@ -1,21 +1,30 @@
 from __future__ import annotations
 
+import json
 import time
 from datetime import datetime
 
+import anyio
 from fastapi import APIRouter, Depends, Body
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.db import get_db
+from app.db import SessionLocal, get_db
+from app.offload import run_model_work
 from .security import get_current_user
 from .entitlements import require_premium
 
 from app.services.ai_suggestions import (
-    fetch_last_7_checkins,
-    build_features,
+    StreamOutcome,
     rule_based_suggestion,
-    maybe_ollama_polish_with_provider,  # NEW (Day 10)
+    polish_with_cache,
+    stream_polish,
+    polish_prompt,
+    suggestion_cache_key,
 )
+from app.services.feature_snapshot import get_features, latest_note_in_window
 
 # Day 8 (RAG)
 from .embedding_model import get_embedder
@@ -23,41 +32,28 @@ from .rag_store import get_rag_store
 
 # Day 10 (Observability + rate limiting)
 from app.observability.rate_limit import rate_limit
+from app.observability.registry import AI_LATENCY, AI_REQUESTS
+from app.observability.rollups import get_rollup_accumulator
 from app import models
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
 
-@router.get("/suggestions")
-async def get_ai_suggestions(
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
-    _rl=Depends(rate_limit(endpoint_key="/ai/suggestions", limit=30, window_seconds=3600)),  # NEW (Day 10)
-):
-    start = time.perf_counter()
-    success = True
-    provider = "rules"
-
-    checkins = fetch_last_7_checkins(db, user.id)
-    features = build_features(checkins)
-    suggestion, tone, ctx = rule_based_suggestion(features)
-
-    # Day 8: Retrieve relevant past reflections (per-user) and inject into context
+def _attach_retrieved_reflections(db: Session, user_id: int, ctx: dict) -> None:
+    """Adds ctx["retrieved_reflections"] from the user's RAG index (best-effort)."""
     try:
         embedder = get_embedder()
         rag = get_rag_store(embedder) if embedder is not None else None
 
         if rag is not None:
             # Use the latest note as the query if available; otherwise fall back to a generic query.
-            latest_note = ""
-            if checkins:
-                latest_note = (checkins[0].note or "").strip()
+            latest_note = latest_note_in_window(db, user_id)
 
             query_text = latest_note if latest_note else "recent mood and habits"
 
             retrieved = rag.query_reflections(
                 db=db,
-                user_id=user.id,
+                user_id=user_id,
                 query_text=query_text,
                 k=5,
             )
@@ -77,10 +73,159 @@ async def get_ai_suggestions(
     except Exception:
         # RAG is optional; suggestions must still work if model/FAISS aren't available.
         pass
+    finally:
+        # Read-only: end the transaction so no pooled connection is held while polishing.
+        db.rollback()
+
+
+def _load_features(db: Session, user_id: int):
+    """
+    get_features(), then commit: persists a snapshot rebuilt on read and returns the
+    pooled connection before the slow RAG/Ollama steps.
+    """
+    features = get_features(db, user_id)
+    db.commit()
+    return features
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+def _record_ai_event(
+    *,
+    user_id: int,
+    endpoint: str,
+    provider: str,
+    latency_ms: int,
+    success: bool,
+    cache_hit: bool = False,
+    ttfb_ms: int | None = None,
+    db: Session | None = None,
+) -> None:
+    """
+    Persists an AIRequestEvent (never breaks the user experience). Blocking: call it via
+    run_in_threadpool from async code. Streaming bodies pass no db, because request-scoped
+    sessions are already closed by the time they run, so a short-lived one is opened.
+    """
+    AI_REQUESTS.inc(endpoint=endpoint, provider=provider, outcome="ok" if success else "error")
+    AI_LATENCY.observe(latency_ms, endpoint=endpoint, provider=provider)
+    # Counted in the in-memory rollup first: /metrics reads rollups, not raw events.
+    get_rollup_accumulator().record(
+        user_id=user_id,
+        endpoint=endpoint,
+        provider=provider,
+        latency_ms=latency_ms,
+        success=success,
+        cache_hit=cache_hit,
+    )
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        db.add(
+            models.AIRequestEvent(
+                user_id=user_id,
+                endpoint=endpoint,
+                provider=provider,
+                latency_ms=latency_ms,
+                ttfb_ms=ttfb_ms,
+                success=success,
+                cache_hit=cache_hit,
+                created_at=datetime.utcnow(),
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+    finally:
+        if own_session:
+            db.close()
+
+
+def _event_stream(
+    *,
+    fallback: str,
+    prompt: str,
+    user_id: int,
+    endpoint: str,
+    start: float,
+    done_payload: dict,
+    cache_key: str | None = None,
+    max_sentences: int = 2,
+    max_chars: int = 260,
+) -> StreamingResponse:
+    """
+    Server-Sent Events: "token" chunks as Ollama produces them, an optional "replace"
+    (fallback text that supersedes what was sent), then "done" with the final text.
+    """
+
+    async def body():
+        outcome = StreamOutcome(text=fallback)
+        ttfb_ms = None
+        success = True
+        try:
+            async for kind, text in stream_polish(
+                fallback,
+                outcome=outcome,
+                prompt=prompt,
+                user_id=user_id,
+                cache_key=cache_key,
+                max_sentences=max_sentences,
+                max_chars=max_chars,
+            ):
+                if ttfb_ms is None:
+                    ttfb_ms = int((time.perf_counter() - start) * 1000)
+                yield _sse(kind, {"text": text})
+            yield _sse("done", {**done_payload, "text": outcome.text, "provider": outcome.provider})
+        except BaseException:
+            success = False
+            raise
+        finally:
+            # Shielded so the event is still written when the client disconnects mid-stream.
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(
+                    _record_ai_event,
+                    user_id=user_id,
+                    endpoint=endpoint,
+                    provider=outcome.provider,
+                    latency_ms=int((time.perf_counter() - start) * 1000),
+                    success=success,
+                    cache_hit=outcome.cache_hit,
+                    ttfb_ms=ttfb_ms,
+                )
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/suggestions")
+async def get_ai_suggestions(
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    _rl=Depends(rate_limit(endpoint_key="/ai/suggestions", limit=30, window_seconds=3600)),  # NEW (Day 10)
+):
+    start = time.perf_counter()
+    success = True
+    provider = "rules"
+    cache_hit = False
+    user_id = user.id
+
+    # Blocking work stays off the event loop: DB reads on the shared threadpool,
+    # embedding + FAISS on the bounded model executor.
+    # O(1) read of the rolling 7-day snapshot maintained by POST /checkins.
+    features = await run_in_threadpool(_load_features, db, user_id)
+    suggestion, tone, ctx = rule_based_suggestion(features)
+
+    # Day 8: Retrieve relevant past reflections (per-user) and inject into context
+    await run_model_work(_attach_retrieved_reflections, db, user_id, ctx)
 
     try:
         # Day 10: Provider-aware polish (tracks whether we used rules vs ollama)
-        suggestion, provider = await maybe_ollama_polish_with_provider(suggestion, tone, ctx)
+        suggestion, provider, cache_hit = await polish_with_cache(suggestion, tone, ctx, user_id=user_id)
 
         return {
             "suggestion": suggestion,
@@ -94,20 +239,50 @@ async def get_ai_suggestions(
     finally:
         # Day 10: Persist latency for /metrics (never break the user experience)
         latency_ms = int((time.perf_counter() - start) * 1000)
-        try:
-            db.add(
-                models.AIRequestEvent(
-                    user_id=user.id,
-                    endpoint="/ai/suggestions",
-                    provider=provider,
-                    latency_ms=latency_ms,
-                    success=success,
-                    created_at=datetime.utcnow(),
-                )
-            )
-            db.commit()
-        except Exception:
-            db.rollback()
+        await run_in_threadpool(
+            _record_ai_event,
+            db=db,
+            user_id=user_id,
+            endpoint="/ai/suggestions",
+            provider=provider,
+            latency_ms=latency_ms,
+            success=success,
+            cache_hit=cache_hit,
+        )
+
+
+@router.get("/suggestions/stream")
+async def stream_ai_suggestions(
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    _rl=Depends(rate_limit(endpoint_key="/ai/suggestions", limit=30, window_seconds=3600)),
+):
+    """Opt-in streaming variant of /ai/suggestions (text/event-stream)."""
+    start = time.perf_counter()
+    user_id = user.id
+
+    features = await run_in_threadpool(_load_features, db, user_id)
+    suggestion, tone, ctx = rule_based_suggestion(features)
+    await run_model_work(_attach_retrieved_reflections, db, user_id, ctx)
+
+    return _event_stream(
+        fallback=suggestion,
+        prompt=polish_prompt(suggestion, tone, ctx),
+        user_id=user_id,
+        endpoint="/ai/suggestions/stream",
+        start=start,
+        done_payload={"tone": tone, "context": ctx},
+        cache_key=suggestion_cache_key(suggestion, tone, ctx),
+    )
+
+
+def _deep_dive_text(topic: str) -> str:
+    # Minimal "deep dive" response (longer than /suggestions). Keep deterministic for tests/demos.
+    return (
+        f"Deep dive on {topic}: identify your highest-impact habit and the smallest daily action that preserves it. "
+        "Then pick one friction point (time, place, trigger, or people) and remove it with a 2-minute fallback plan. "
+        "Finally, schedule a single 15-minute review this week to check progress and adjust."
+    )
 
 
 @router.post("/deep_dive")
@@ -122,11 +297,37 @@ async def deep_dive(
 
     topic = (payload.get("topic") or "").strip() or "my habits and next week"
 
-    # Minimal "deep dive" response (longer than /suggestions). Keep deterministic for tests/demos.
-    response = (
-        f"Deep dive on {topic}: identify your highest-impact habit and the smallest daily action that preserves it. "
-        "Then pick one friction point (time, place, trigger, or people) and remove it with a 2-minute fallback plan. "
-        "Finally, schedule a single 15-minute review this week to check progress and adjust."
+    return {"topic": topic, "response": _deep_dive_text(topic)}
+
+
+@router.post("/deep_dive/stream")
+async def stream_deep_dive(
+    payload: dict = Body(...),
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    _rl=Depends(rate_limit(endpoint_key="/ai/deep_dive", limit=10, window_seconds=3600)),
+):
+    """Streams an Ollama-written deep dive; the deterministic text is the fallback."""
+    start = time.perf_counter()
+    require_premium(user)
+
+    topic = (payload.get("topic") or "").strip() or "my habits and next week"
+    fallback = _deep_dive_text(topic)
+    prompt = (
+        "Write a short coaching deep dive.\n"
+        "Constraints: 3 to 4 sentences, no lists, no emojis.\n"
+        f"Topic: {topic}\n"
+        f"Outline: {fallback}\n"
+        "Return only the deep dive text."
     )
 
-    return {"topic": topic, "response": response}
+    return _event_stream(
+        fallback=fallback,
+        prompt=prompt,
+        user_id=user.id,
+        endpoint="/ai/deep_dive/stream",
+        start=start,
+        done_payload={"topic": topic},
+        max_sentences=4,
+        max_chars=700,
+    )
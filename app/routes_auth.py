@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 
 from .db import get_db
 from . import models, schemas
-from .security import authenticate_user, get_password_hash, create_access_token
+from .security import authenticate_user, get_password_hash, create_access_token, invalidate_cached_user
 from fastapi.security import OAuth2PasswordRequestForm
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -32,6 +32,7 @@ def signup(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_cached_user(user.id)  # in case the id was reused (SQLite without AUTOINCREMENT)
 
     # 4) Immediately issue JWT
     access_token = create_access_token(data={"sub": str(user.id)})
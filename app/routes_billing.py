@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
 from .db import get_db
-from .security import get_current_user
+from .security import get_current_user, invalidate_cached_user
 from . import models
 
 router = APIRouter(tags=["billing"])
@@ -15,5 +15,6 @@ def upgrade_me(
     current_user.subscription_tier = "premium"
     db.add(current_user)
     db.commit()
+    invalidate_cached_user(current_user.id)
     db.refresh(current_user)
     return {"subscription_tier": current_user.subscription_tier}
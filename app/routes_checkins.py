@@ -1,12 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from datetime import date, timezone
+from email.utils import format_datetime
+from typing import Dict, List, Literal, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, selectinload
+from starlette.concurrency import run_in_threadpool
 
 from .db import get_db
 from . import models, schemas
 from .security import get_current_user
-from .embedding_model import get_embedder
-from .rag_store import get_rag_store
+from .http_caching import not_modified, weak_etag
+from .checkin_import import ImportFormatError, import_checkins
+from .embedding_queue import get_embedding_queue, record_pending_embedding
+from .streaks import apply_checkin_to_streak_state
+from .services.feature_snapshot import apply_checkin_to_feature_snapshot
 
 router = APIRouter(prefix="/checkins", tags=["checkins"])
 
@@ -60,13 +71,9 @@ def create_checkin(
 
     try:
         db.flush()  # assign checkin.id before inserting results
-        try:
-            embedder = get_embedder()
-            rag = get_rag_store(embedder) if embedder is not None else None
-            if rag is not None:
-                rag.add_reflection_for_checkin(db=db, user_id=current_user.id, checkin=checkin)
-        except Exception:
-            pass  # silently ignore RAG errors
+
+        # Embedding happens in the background worker; we only record the durable work item.
+        needs_embedding = record_pending_embedding(db, user_id=current_user.id, checkin=checkin)
 
         for hr in checkin_in.habit_results:
             db.add(
@@ -76,9 +83,27 @@ def create_checkin(
                     done=hr.done,
                 )
             )
+        db.flush()
+
+        apply_checkin_to_streak_state(
+            db,
+            user_id=current_user.id,
+            checkin_date=checkin.date,
+            results=[(hr.habit_id, hr.done) for hr in checkin_in.habit_results],
+        )
+        apply_checkin_to_feature_snapshot(
+            db,
+            user_id=current_user.id,
+            checkin_date=checkin.date,
+            mood=checkin.mood,
+            results=[(hr.habit_id, hr.done) for hr in checkin_in.habit_results],
+        )
 
         db.commit()
         db.refresh(checkin)
+
+        if needs_embedding:
+            get_embedding_queue().submit(checkin.id)  # if full, the worker's sweep picks it up
         return checkin
 
     except IntegrityError:
@@ -88,4 +113,197 @@ def create_checkin(
             status_code=status.HTTP_409_CONFLICT,
             detail="Check-in already exists for this date.",
         )
-    
+
+
+CHECKIN_FIELDS = ("id", "date", "mood", "note", "habit_results")
+
+
+def _parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """`fields=date,mood` -> the requested fields in canonical order; date is always included."""
+    if fields is None:
+        return CHECKIN_FIELDS
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = sorted(requested - set(CHECKIN_FIELDS))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s) {unknown}; choose from {list(CHECKIN_FIELDS)}.",
+        )
+    requested.add("date")  # the page cursor
+    return tuple(f for f in CHECKIN_FIELDS if f in requested)
+
+
+def _history_query(db: Session, user_id: int, start: Optional[date], end: Optional[date]):
+    q = db.query(models.Checkin).filter(models.Checkin.user_id == user_id)
+    if start is not None:
+        q = q.filter(models.Checkin.date >= start)
+    if end is not None:
+        q = q.filter(models.Checkin.date <= end)
+    return q
+
+
+def fetch_checkins_page(
+    db: Session,
+    *,
+    user_id: int,
+    start: Optional[date],
+    end: Optional[date],
+    after_date: Optional[date],
+    limit: int,
+    fields: Tuple[str, ...] = CHECKIN_FIELDS,
+) -> Tuple[List[Dict], Optional[date]]:
+    """
+    One page of the user's check-ins in date order, keyset-paginated on the date
+    (unique per user), as dicts holding only `fields`. Returns (rows, next_after_date);
+    next_after_date is None on the last page.
+
+    Without habit_results only the requested columns are selected (date + mood is
+    answered from the covering index alone); with them, results for the whole page
+    come from one selectinload query.
+    """
+    q = _history_query(db, user_id, start, end)
+    if after_date is not None:
+        q = q.filter(models.Checkin.date > after_date)
+    q = q.order_by(models.Checkin.date.asc()).limit(limit + 1)
+
+    columns = [f for f in fields if f != "habit_results"]
+    if "habit_results" in fields:
+        rows = q.options(
+            load_only(*(getattr(models.Checkin, f) for f in columns)),
+            selectinload(models.Checkin.habit_results),
+        ).all()
+        items = [{f: getattr(c, f) for f in fields} for c in rows]
+    else:
+        rows = q.with_entities(*(getattr(models.Checkin, f) for f in columns)).all()
+        items = [dict(zip(columns, r)) for r in rows]
+
+    if len(items) > limit:
+        items = items[:limit]
+        return items, items[-1]["date"]
+    return items, None
+
+
+@router.get("", response_model=schemas.CheckinPageOut, response_model_exclude_unset=True)
+def list_checkins(
+    request: Request,
+    response: Response,
+    start: Optional[date] = Query(None, description="First day to include"),
+    end: Optional[date] = Query(None, description="Last day to include"),
+    after_date: Optional[date] = Query(None, description="Page cursor: only check-ins dated after this day"),
+    limit: int = Query(100, ge=1, le=500),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of id,date,mood,note,habit_results"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    The user's check-ins between `start` and `end` (inclusive) in date order. When
+    more remain, `next_after_date` (and a `Link: rel="next"` header) points at the
+    next page. `fields=date,mood` returns just those columns, e.g. for calendar views.
+    Supports ETag / Last-Modified conditional requests for cheap polling.
+    """
+    selected = _parse_fields(fields)
+
+    total, max_id, max_updated = (
+        _history_query(db, current_user.id, start, end)
+        .with_entities(func.count(models.Checkin.id), func.max(models.Checkin.id), func.max(models.Checkin.updated_at))
+        .one()
+    )
+    validator = f"{current_user.id}:{total}:{max_id}:{max_updated}:{start}:{end}:{after_date}:{limit}:{','.join(selected)}"
+    etag = weak_etag(validator)
+    last_modified = max_updated.replace(tzinfo=timezone.utc) if max_updated is not None else None
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    items, next_after_date = fetch_checkins_page(
+        db,
+        user_id=current_user.id,
+        start=start,
+        end=end,
+        after_date=after_date,
+        limit=limit,
+        fields=selected,
+    )
+    if next_after_date is not None:
+        params = {k: v for k, v in request.query_params.items() if k != "after_date"}
+        params["after_date"] = str(next_after_date)
+        headers["Link"] = f'<{request.url.path}?{urlencode(params)}>; rel="next"'
+    response.headers.update(headers)
+    return schemas.CheckinPageOut(
+        checkins=[schemas.CheckinPartialOut.model_validate(item) for item in items],
+        next_after_date=next_after_date,
+    )
+
+
+IMPORT_CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+
+def _import_max_bytes() -> int:
+    return int(os.getenv("CHECKIN_IMPORT_MAX_BYTES", str(10 * 1024 * 1024)))
+
+
+def _import_format(request: Request, format: Optional[str]) -> str:
+    if format is not None:
+        return format
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    fmt = IMPORT_CONTENT_TYPES.get(content_type)
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send application/x-ndjson or text/csv (or pass ?format=ndjson|csv).",
+        )
+    return fmt
+
+
+async def _read_body(request: Request, limit: int) -> str:
+    """Reads the upload chunk by chunk, failing as soon as it exceeds `limit` bytes."""
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Import body exceeds {limit} bytes; split it into several imports.",
+            )
+        chunks.append(chunk)
+    try:
+        return b"".join(chunks).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Import body must be UTF-8.")
+
+
+@router.post("/import", response_model=schemas.CheckinImportOut)
+async def import_checkins_route(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="Overrides the Content-Type"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Bulk backfill of historical check-ins from NDJSON (one CheckinCreate object per
+    line) or CSV (`date,mood,note,habit_<id>,...`). Days that already have a check-in
+    are skipped, invalid rows are reported by line number, and streaks, the feature
+    snapshot and today's insight are recomputed once for the whole import.
+    """
+    fmt = _import_format(request, format)
+    text = await _read_body(request, _import_max_bytes())
+    try:
+        # The whole body is read before the transaction starts, so no write lock is
+        # held while waiting on a slow upload.
+        report, pending = await run_in_threadpool(import_checkins, db, user_id=current_user.id, text=text, fmt=fmt)
+    except ImportFormatError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    queue = get_embedding_queue()
+    for checkin_id in pending:
+        if not queue.submit(checkin_id):
+            break  # queue full: the worker's sweep picks up the remaining pending rows
+    return report
@@ -9,11 +9,11 @@ from sqlalchemy.orm import Session
 
 from .db import get_db
 from . import models
-from .security import get_password_hash
+from .security import get_password_hash, invalidate_cached_user
 
 # Optional (RAG). Seed should still work if these fail.
 from .embedding_model import get_embedder
-from .rag_store import get_rag_store
+from .rag_store import _bump_index_version, get_rag_store
 
 router = APIRouter(prefix="/dev", tags=["dev"])
 
@@ -64,6 +64,7 @@ def seed_demo(
         user.subscription_tier = tier
         user.hashed_password = get_password_hash(demo_password)
         db.commit()
+        invalidate_cached_user(user.id)
         db.refresh(user)
 
     # 2) Wipe existing demo data (safe reseed)
@@ -74,8 +75,13 @@ def seed_demo(
     if checkin_ids:
         db.query(models.CheckinHabitResult).filter(models.CheckinHabitResult.checkin_id.in_(checkin_ids)).delete(synchronize_session=False)
         db.query(models.ReflectionEmbedding).filter(models.ReflectionEmbedding.checkin_id.in_(checkin_ids)).delete(synchronize_session=False)
+        # Same transaction as the delete: every worker's cached FAISS index for this user is now stale.
+        _bump_index_version(db, user.id)
+        db.query(models.PendingEmbedding).filter(models.PendingEmbedding.checkin_id.in_(checkin_ids)).delete(synchronize_session=False)
 
     db.query(models.Checkin).filter(models.Checkin.user_id == user.id).delete(synchronize_session=False)
+    db.query(models.HabitStreakState).filter(models.HabitStreakState.user_id == user.id).delete(synchronize_session=False)
+    db.query(models.UserFeatureSnapshot).filter(models.UserFeatureSnapshot.user_id == user.id).delete(synchronize_session=False)
     db.query(models.Habit).filter(models.Habit.user_id == user.id).delete(synchronize_session=False)
     db.query(models.Insight).filter(models.Insight.user_id == user.id).delete(synchronize_session=False)
     db.commit()
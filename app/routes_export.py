@@ -1,32 +1,168 @@
-from fastapi import APIRouter, Depends
+import csv
+import io
+import json
+from datetime import date, timezone
+from email.utils import format_datetime
+from typing import Iterator, Literal, Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from .db import get_db
+from .db import SessionLocal, get_db
+from .http_caching import not_modified, weak_etag
 from .security import get_current_user
 from .entitlements import require_premium
 from . import models
 
 router = APIRouter(prefix="/export", tags=["export"])
 
+EXPORT_BATCH_ROWS = 500
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _reflections_query(db: Session, user_id: int, after_date: Optional[date]):
+    q = (
+        db.query(models.Checkin)
+        .filter(models.Checkin.user_id == user_id)
+        .filter(models.Checkin.note.isnot(None))
+    )
+    if after_date is not None:
+        q = q.filter(models.Checkin.date > after_date)
+    return q
+
+
+def _iter_rows(user_id: int, after_date: Optional[date], max_id: int, limit: Optional[int]) -> Iterator[tuple]:
+    """
+    (date, mood, note) tuples in date order, fetched EXPORT_BATCH_ROWS at a time.
+
+    Runs inside the response body, after the request-scoped session is closed, so it
+    opens its own. Check-ins are never updated, so bounding by the max id seen when
+    the ETag was computed makes the body match that ETag exactly.
+    """
+    db = SessionLocal()
+    try:
+        q = (
+            _reflections_query(db, user_id, after_date)
+            .filter(models.Checkin.id <= max_id)
+            .with_entities(models.Checkin.date, models.Checkin.mood, models.Checkin.note)
+            .order_by(models.Checkin.date.asc())
+            .execution_options(stream_results=True)
+            .yield_per(EXPORT_BATCH_ROWS)
+        )
+        if limit is not None:
+            q = q.limit(limit)
+        yield from q
+    finally:
+        db.close()
+
+
+def _batched(lines: Iterator[str]) -> Iterator[str]:
+    """Joins per-row strings into one chunk per batch (fewer, larger writes)."""
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= EXPORT_BATCH_ROWS:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
+
+
+def _ndjson_body(rows: Iterator[tuple]) -> Iterator[str]:
+    for d, mood, note in rows:
+        yield json.dumps({"date": str(d), "mood": mood, "note": note}) + "\n"
+
+
+def _csv_body(rows: Iterator[tuple]) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["date", "mood", "note"])
+    for d, mood, note in rows:
+        writer.writerow([str(d), mood, note])
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate(0)
+    if out.getvalue():
+        yield out.getvalue()
+
+
+def _json_body(rows: Iterator[tuple], next_after_date: Optional[date]) -> Iterator[str]:
+    # Same {"count", "reflections"} document as before, written incrementally. The count
+    # goes last because it is only known once every row has been written.
+    yield '{"reflections": ['
+    count = 0
+    for d, mood, note in rows:
+        yield ("" if count == 0 else ", ") + json.dumps({"date": str(d), "mood": mood, "note": note})
+        count += 1
+    tail = {"count": count}
+    if next_after_date is not None:
+        tail["next_after_date"] = str(next_after_date)
+    yield "], " + json.dumps(tail)[1:]
+
+
 @router.get("/reflections")
 def export_reflections(
+    request: Request,
+    format: Literal["json", "ndjson", "csv"] = Query("json"),
+    after_date: Optional[date] = Query(None, description="Only reflections dated after this day (page cursor)"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
 ):
+    """
+    Streams the user's notes in date order (json, ndjson or csv), holding at most one
+    batch of rows in memory. With `limit`, a `Link: rel="next"` header (and
+    `next_after_date` in json) points at the following page. Supports ETag /
+    Last-Modified conditional requests.
+    """
     require_premium(current_user)
 
-    rows = (
-        db.query(models.Checkin)
-        .filter(models.Checkin.user_id == current_user.id)
-        .filter(models.Checkin.note.isnot(None))
-        .order_by(models.Checkin.date.asc())
-        .all()
+    total, max_id, max_updated = (
+        _reflections_query(db, current_user.id, after_date)
+        .with_entities(func.count(models.Checkin.id), func.max(models.Checkin.id), func.max(models.Checkin.updated_at))
+        .one()
     )
+    max_id = int(max_id or 0)
+    last_modified = max_updated.replace(tzinfo=timezone.utc) if max_updated is not None else None
+
+    next_after_date = None
+    if limit is not None and total > limit:
+        next_after_date = (
+            _reflections_query(db, current_user.id, after_date)
+            .with_entities(models.Checkin.date)
+            .order_by(models.Checkin.date.asc())
+            .offset(limit - 1)
+            .limit(1)
+            .scalar()
+        )
+    db.rollback()  # release the connection before the (possibly long) body is sent
+
+    validator = f"{current_user.id}:{total}:{max_id}:{max_updated}:{format}:{after_date}:{limit}"
+    etag = weak_etag(validator)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if next_after_date is not None:
+        params = {"format": format, "after_date": str(next_after_date), "limit": limit}
+        headers["Link"] = f'<{request.url.path}?{urlencode(params)}>; rel="next"'
+
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
 
-    return {
-        "count": len(rows),
-        "reflections": [
-            {"date": str(r.date), "mood": r.mood, "note": r.note}
-            for r in rows
-        ],
-    }
+    rows = _iter_rows(current_user.id, after_date, max_id, limit)
+    if format == "json":
+        body = _json_body(rows, next_after_date)
+    elif format == "ndjson":
+        body = _ndjson_body(rows)
+    else:
+        body = _csv_body(rows)
+        headers["Content-Disposition"] = 'attachment; filename="reflections.csv"'
+    return StreamingResponse(_batched(body), media_type=MEDIA_TYPES[format], headers=headers)
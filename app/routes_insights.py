@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 from .db import get_db
 from . import models, schemas
 from .security import get_current_user
-from .daily_insights_worker import upsert_insight_for_date
+from .daily_insights_worker import get_fresh_insight, upsert_insight_for_date
 
 router = APIRouter(prefix="/insights", tags=["insights"])
 
@@ -22,10 +22,13 @@ def get_today_insights(
 ):
     today: date_type = date_type.today()
 
-    # Compute and upsert (insert or update) the insight row for today.
-    insight = upsert_insight_for_date(db, user_id=current_user.id, target_date=today)
-    db.commit()
-    db.refresh(insight)
+    # Common case: the batch worker already computed today's row and nothing changed since.
+    insight = get_fresh_insight(db, user_id=current_user.id, target_date=today)
+    if insight is None:
+        # Compute and upsert (insert or update) the insight row for today.
+        insight = upsert_insight_for_date(db, user_id=current_user.id, target_date=today)
+        db.commit()
+        db.refresh(insight)
 
     # Ensure JSON string is always present (defensive)
     if not insight.habit_streaks_json:
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import os
 from datetime import datetime, time, timedelta
-from typing import Literal, List
+from functools import partial
+from typing import Dict, Literal, Optional
 
 from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
@@ -14,17 +16,113 @@ from sqlalchemy import func
 # NEW (Day 11 Monetization hooks)
 from .security import get_current_user
 from .entitlements import require_premium
+from .embedding_queue import get_embedding_queue, pending_embedding_stats
+from .embedding_cache import get_query_embedding_cache
+from .observability.db_gauges import DbGauges
+from .observability.registry import get_registry
+from .observability.rollups import DAY, MINUTE, get_rollup_accumulator, read_rollups
 
 router = APIRouter(tags=["metrics"])
 
 
-def _p95(values: List[int]) -> float | None:
-    if not values:
-        return None
-    values = sorted(values)
-    # Nearest-rank p95
-    idx = int(round(0.95 * (len(values) - 1)))
-    return float(values[idx])
+def _db_figures(db: Session) -> Dict[str, Optional[float]]:
+    """Today's counters and the durable embedding backlog (shared by both formats)."""
+    # IMPORTANT: check-in "date" is a date field users submit (local day).
+    # Using UTC date can be "tomorrow" in the evening and breaks the "today" counter.
+    today = date_type.today()
+    start_dt = datetime.combine(today, time.min)
+    end_dt = start_dt + timedelta(days=1)
+
+    checkins_today = db.query(models.Checkin).filter(models.Checkin.date == today).count()
+
+    # AI stats come from the per-minute rollups (one row per endpoint/provider/minute),
+    # not raw events.
+    rollup = read_rollups(db, start=start_dt, end=end_dt, bucket_seconds=MINUTE)
+    pending_stats = pending_embedding_stats(db, max_attempts=get_embedding_queue().max_attempts)
+    return {
+        "checkins_today": checkins_today,
+        "ai_suggestions_count_today": rollup.count,
+        "ai_suggestions_latency_ms_avg_today": rollup.latency_avg_ms,
+        "ai_suggestions_latency_ms_p95_today": rollup.latency_p95_ms,
+        "ai_suggestions_cache_hits_today": rollup.cache_hits,
+        "ai_suggestions_cache_hit_rate_today": rollup.cache_hit_rate,
+        "embedding_pending_total": pending_stats["pending"],
+        "embedding_lag_seconds": pending_stats["lag_seconds"],
+        "embedding_dead_total": pending_stats["dead"],
+    }
+
+
+_DB_GAUGES: Optional[DbGauges] = None
+
+
+def get_db_gauges() -> DbGauges:
+    """METRICS_DB_GAUGE_SECONDS (default 15): refresh interval of the DB-derived gauges."""
+    global _DB_GAUGES
+    if _DB_GAUGES is None:
+        _DB_GAUGES = DbGauges(_db_figures, refresh_seconds=float(os.getenv("METRICS_DB_GAUGE_SECONDS", "15")))
+    return _DB_GAUGES
+
+
+def _embedding_lag_now() -> Optional[float]:
+    # The oldest pending note keeps ageing between refreshes.
+    lag = get_db_gauges().get("embedding_lag_seconds")
+    return None if lag is None else round(lag + get_db_gauges().age_seconds(), 3)
+
+
+def _register_gauges(registry) -> None:
+    # DB-derived series, read from the last background refresh (no DB access per
+    # scrape). Every worker reports the same shared figures, hence merge="max".
+    for name, help_text in (
+        ("checkins_today", "Total check-ins created today"),
+        ("ai_suggestions_count_today", "Total AI suggestion requests today"),
+        ("ai_suggestions_cache_hits_today", "AI suggestions served from the suggestion cache today"),
+        ("ai_suggestions_cache_hit_rate_today", "Fraction of today's AI suggestions served from cache"),
+        ("ai_suggestions_latency_ms_avg_today", "Average AI suggestion latency in ms today"),
+        ("ai_suggestions_latency_ms_p95_today", "p95 AI suggestion latency in ms today"),
+        ("embedding_pending_total", "Check-in notes not yet embedded (durable backlog, excluding dead rows)"),
+        ("embedding_dead_total", "Pending embeddings that used up their attempts"),
+    ):
+        registry.gauge(f"mindgarden_{name}", help_text, partial(get_db_gauges().get, name), merge="max")
+    registry.gauge(
+        "mindgarden_embedding_lag_seconds",
+        "Age of the oldest check-in note still waiting for an embedding",
+        _embedding_lag_now,
+        merge="max",
+    )
+
+    # In-memory state of this worker.
+    registry.gauge(
+        "mindgarden_embedding_queue_depth",
+        "Check-in notes waiting in the in-process embedding queue",
+        lambda: get_embedding_queue().stats()["depth"],
+    )
+    registry.gauge(
+        "mindgarden_embedding_last_lag_seconds",
+        "Enqueue-to-stored delay of the most recently embedded note",
+        lambda: get_embedding_queue().stats()["last_lag_seconds"],
+        merge="max",
+    )
+    registry.gauge(
+        "mindgarden_query_embedding_cache_hits_total",
+        "RAG query embeddings served from cache",
+        lambda: get_query_embedding_cache().stats()["hits"],
+        kind="counter",
+    )
+    registry.gauge(
+        "mindgarden_query_embedding_cache_misses_total",
+        "RAG query embeddings that had to be encoded",
+        lambda: get_query_embedding_cache().stats()["misses"],
+        kind="counter",
+    )
+    registry.gauge(
+        "mindgarden_query_embedding_cache_hit_rate",
+        "Fraction of RAG query embeddings served from cache (mean across workers)",
+        lambda: get_query_embedding_cache().stats()["hit_rate"],
+        merge="mean",
+    )
+
+
+_register_gauges(get_registry())
 
 
 @router.get("/metrics")
@@ -34,67 +132,29 @@ def metrics(
 ):
     """Basic app metrics for debugging + recruiter demos.
 
-    - /metrics?format=json
-    - /metrics?format=prometheus
+    - /metrics?format=json: daily counters read from the database
+    - /metrics?format=prometheus: the in-process registry only (no DB access per scrape;
+      the DB-derived series are refreshed every METRICS_DB_GAUGE_SECONDS)
     """
+    if format == "prometheus":
+        return Response(content=get_registry().render(), media_type="text/plain; version=0.0.4")
 
-    # IMPORTANT: check-in "date" is a date field users submit (local day).
-    # Using UTC date can be "tomorrow" in the evening and breaks the "today" counter.
-    today = date_type.today()
-    today_utc = datetime.utcnow().date()
-
-    start_dt = datetime.combine(today, time.min)
-    end_dt = start_dt + timedelta(days=1)
-
-    checkins_today = db.query(models.Checkin).filter(models.Checkin.date == today).count()
+    # Flush this worker's pending AI counts first so the JSON view is current.
+    get_rollup_accumulator().flush()
+    figures = _db_figures(db)
+    queue_stats = get_embedding_queue().stats()
+    query_cache_stats = get_query_embedding_cache().stats()
 
-    ai_events_today = (
-        db.query(models.AIRequestEvent)
-        .filter(models.AIRequestEvent.created_at >= start_dt)
-        .filter(models.AIRequestEvent.created_at < end_dt)
-        .all()
-    )
-    latencies = [int(e.latency_ms) for e in ai_events_today if e.latency_ms is not None]
-    ai_count_today = len(ai_events_today)
-    avg_latency = (sum(latencies) / len(latencies)) if latencies else None
-    p95_latency = _p95(latencies)
-
-    payload = {
-        "date_utc": str(today_utc),
-        "checkins_today": checkins_today,
-        "ai_suggestions_count_today": ai_count_today,
-        "ai_suggestions_latency_ms_avg_today": round(avg_latency, 2) if avg_latency is not None else None,
-        "ai_suggestions_latency_ms_p95_today": p95_latency,
+    return {
+        "date_utc": str(datetime.utcnow().date()),
+        **figures,
+        "embedding_queue_depth": queue_stats["depth"],
+        "embedding_last_lag_seconds": queue_stats["last_lag_seconds"],
+        "query_embedding_cache_hits": query_cache_stats["hits"],
+        "query_embedding_cache_misses": query_cache_stats["misses"],
+        "query_embedding_cache_hit_rate": query_cache_stats["hit_rate"],
     }
 
-    if format == "json":
-        return payload
-
-    # Prometheus-compatible text format
-    lines = [
-        "# HELP mindgarden_checkins_today Total check-ins created today (UTC)",
-        "# TYPE mindgarden_checkins_today gauge",
-        f"mindgarden_checkins_today {checkins_today}",
-        "# HELP mindgarden_ai_suggestions_count_today Total AI suggestion requests today (UTC)",
-        "# TYPE mindgarden_ai_suggestions_count_today gauge",
-        f"mindgarden_ai_suggestions_count_today {ai_count_today}",
-    ]
-    if avg_latency is not None:
-        lines += [
-            "# HELP mindgarden_ai_suggestions_latency_ms_avg_today Average AI suggestion latency in ms today (UTC)",
-            "# TYPE mindgarden_ai_suggestions_latency_ms_avg_today gauge",
-            f"mindgarden_ai_suggestions_latency_ms_avg_today {round(avg_latency, 2)}",
-        ]
-    if p95_latency is not None:
-        lines += [
-            "# HELP mindgarden_ai_suggestions_latency_ms_p95_today p95 AI suggestion latency in ms today (UTC)",
-            "# TYPE mindgarden_ai_suggestions_latency_ms_p95_today gauge",
-            f"mindgarden_ai_suggestions_latency_ms_p95_today {p95_latency}",
-        ]
-
-    body = "\n".join(lines) + "\n"
-    return Response(content=body, media_type="text/plain; version=0.0.4")
-
 
 # NEW (Day 11): authenticated analytics window (freemium gate >30 days)
 @router.get("/metrics/analytics")
@@ -124,30 +184,23 @@ def metrics_analytics(
         .count()
     )
 
-    # AI events in window (inclusive)
-    start_dt = datetime.combine(window_start, time.min)
-    end_dt = datetime.combine(today, time.max)
-
-    ai_events_window = (
-        db.query(models.AIRequestEvent)
-        .filter(models.AIRequestEvent.user_id == current_user.id)
-        .filter(models.AIRequestEvent.created_at >= start_dt)
-        .filter(models.AIRequestEvent.created_at <= end_dt)
-        .all()
+    # AI events in window (inclusive), from the user's daily rollup rows
+    get_rollup_accumulator().flush()
+    rollup = read_rollups(
+        db,
+        start=datetime.combine(window_start, time.min),
+        end=datetime.combine(today, time.min) + timedelta(seconds=DAY),
+        bucket_seconds=DAY,
+        user_id=current_user.id,
     )
 
-    latencies = [int(e.latency_ms) for e in ai_events_window if e.latency_ms is not None]
-    ai_count_window = len(ai_events_window)
-    avg_latency = (sum(latencies) / len(latencies)) if latencies else None
-    p95_latency = _p95(latencies)
-
     return {
         "date_utc": str(today),
         "window_days": days,
         "window_start_utc": str(window_start),
         "checkins_window": checkins_window,
-        "ai_suggestions_count_window": ai_count_window,
-        "ai_suggestions_latency_ms_avg_window": round(avg_latency, 2) if avg_latency is not None else None,
-        "ai_suggestions_latency_ms_p95_window": p95_latency,
+        "ai_suggestions_count_window": rollup.count,
+        "ai_suggestions_latency_ms_avg_window": rollup.latency_avg_ms,
+        "ai_suggestions_latency_ms_p95_window": rollup.latency_p95_ms,
         "subscription_tier": getattr(current_user, "subscription_tier", "free"),
     }
@@ -81,6 +81,38 @@ class CheckinOut(BaseModel):
     note: Optional[str]
     habit_results: List[CheckinHabitResultOut]
 
+
+class CheckinPartialOut(BaseModel):
+    """A check-in restricted to the fields requested with GET /checkins?fields=."""
+
+    model_config = ConfigDict(from_attributes=True)
+    id: Optional[int] = None
+    date: date
+    mood: Optional[int] = None
+    note: Optional[str] = None
+    habit_results: Optional[List[CheckinHabitResultOut]] = None
+
+
+class CheckinPageOut(BaseModel):
+    checkins: List[CheckinPartialOut]
+    next_after_date: Optional[date] = None
+
+
+class CheckinImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class CheckinImportOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    received: int
+    imported: int
+    skipped: int
+    failed: int
+    errors: List[CheckinImportError]
+    duration_ms: int
+    rows_per_sec: float
+
 # --- Day 5: Insights schemas (ADD) ---
 from typing import Optional
 from datetime import date as date_type
@@ -1,33 +1,56 @@
 # app/security.py
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
 from .db import get_db
 from . import models
+from .password_hashing import PasswordHashPoolFull, get_password_hasher
 
 # For dev: you can hardcode this or read from env
 SECRET_KEY = "change-me-in-.env"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "1"))
 
 # tokenUrl must match your login endpoint path
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login_form")
 
 
+def _password_hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress. Please retry shortly.",
+        headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
+
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    """Hashes on the password hash pool; 503 + Retry-After when it is saturated."""
+    try:
+        return get_password_hasher().hash(password)
+    except PasswordHashPoolFull:
+        raise _password_hashing_busy() from None
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(matches, new_hash); new_hash is set when PASSWORD_HASH_ROUNDS changed since hashing."""
+    try:
+        return get_password_hasher().verify_and_update(plain_password, hashed_password)
+    except PasswordHashPoolFull:
+        raise _password_hashing_busy() from None
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return verify_and_update_password(plain_password, hashed_password)[0]
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -38,6 +61,80 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+# --- Cached user identity (get_current_user) ---
+
+_USER_SNAPSHOT_FIELDS = ("id", "email", "hashed_password", "subscription_tier", "created_at", "updated_at")
+
+
+class UserIdentityCache:
+    """
+    Short-TTL cache of User column snapshots keyed by user id.
+
+    We cache plain column values, not ORM instances (those are bound to one request's
+    Session). Writes that change a user must call invalidate(); other API workers pick
+    the change up when the TTL expires.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000):
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self._entries: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            hit = self._entries.get(user_id)
+            if hit is None:
+                return None
+            expires_at, snapshot = hit
+            if expires_at < time.monotonic():
+                self._entries.pop(user_id, None)
+                return None
+            return snapshot
+
+    def put(self, user: models.User) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        snapshot = {f: getattr(user, f) for f in _USER_SNAPSHOT_FIELDS}
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()  # crude, but bounded and rare
+            self._entries[int(user.id)] = (time.monotonic() + self.ttl_seconds, snapshot)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_identity_cache = UserIdentityCache(ttl_seconds=float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30")))
+
+
+def invalidate_cached_user(user_id: int) -> None:
+    """Call after any write to a User row (tier changes, password resets, ...)."""
+    user_identity_cache.invalidate(user_id)
+
+
+def _load_user(db: Session, user_id: int) -> Optional[models.User]:
+    snapshot = user_identity_cache.get(user_id)
+    if snapshot is not None:
+        # Rebuild a persistent instance in this session without a SELECT, so routes can
+        # still modify and commit current_user as usual.
+        user = models.User(**snapshot)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user is not None:
+        user_identity_cache.put(user)
+    return user
+
+
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.email == email).first()
 
@@ -46,8 +143,14 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[models
     user = get_user_by_email(db, email=email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    ok, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not ok:
         return None
+    if new_hash is not None:
+        # Cost settings changed since this hash was made: upgrade it transparently.
+        user.hashed_password = new_hash
+        db.commit()
+        invalidate_cached_user(user.id)
     return user
 
 
@@ -62,6 +165,12 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    # Per-request memo: resolve the user at most once per request, even if another
+    # dependency chain asks again.
+    memo = getattr(request.state, "current_user", None)
+    if memo is not None and memo[0] == token and object_session(memo[1]) is db:
+        return memo[1]
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: Optional[int] = payload.get("sub")
@@ -70,10 +179,11 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+    user = _load_user(db, int(user_id))
     if user is None:
         raise credentials_exception
 
     # Attach for observability middleware (request logging, etc.)
     request.state.user_id = user.id
+    request.state.current_user = (token, user)
     return user
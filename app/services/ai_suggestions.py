@@ -2,15 +2,16 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import date, timedelta
-from typing import List, Optional, Tuple, Dict, Any
+from typing import AsyncIterator, List, Optional, Tuple, Dict, Any
 import os
 import re
 
-import httpx
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import desc
 
 from app.models import Checkin
+from app.services.ollama_client import get_ollama_client
+from app.services.suggestion_cache import get_suggestion_cache, suggestion_fingerprint
 
 
 @dataclass
@@ -39,6 +40,8 @@ def fetch_last_7_checkins(db: Session, user_id: int, today: Optional[date] = Non
         .filter(Checkin.date >= start)
         .filter(Checkin.date <= end)
         .order_by(desc(Checkin.date))
+        # build_features reads every check-in's habit_results: load them in one extra query.
+        .options(selectinload(Checkin.habit_results))
     )
     return q.all()
 
@@ -123,18 +126,21 @@ def rule_based_suggestion(f: Features) -> tuple[str, str, Dict[str, Any]]:
     return suggestion, tone, ctx
 
 
-async def maybe_ollama_polish(suggestion: str, tone: str, ctx: Dict[str, Any]) -> str:
+def _ollama_target() -> Optional[Tuple[str, str]]:
+    """(url, model) when the provider settings allow an Ollama call, else None."""
     provider = os.getenv("AI_PROVIDER", "hybrid").lower()
     if provider not in ("hybrid", "ollama"):
-        return suggestion
+        return None
 
     ollama_url = os.getenv("OLLAMA_URL", "").strip()
     if not ollama_url:
-        return suggestion
+        return None
+
+    return ollama_url, os.getenv("OLLAMA_MODEL", "llama3").strip()
 
-    model = os.getenv("OLLAMA_MODEL", "llama3").strip()
 
-    prompt = (
+def polish_prompt(suggestion: str, tone: str, ctx: Dict[str, Any]) -> str:
+    return (
         "Rewrite the following as a personalized tiny challenge.\n"
         "Constraints: 1 to 2 sentences, no lists, no emojis.\n"
         f"Tone target: {tone}\n"
@@ -143,65 +149,33 @@ async def maybe_ollama_polish(suggestion: str, tone: str, ctx: Dict[str, Any]) -
         "Return only the rewritten text."
     )
 
-    try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            resp = await client.post(
-                f"{ollama_url.rstrip('/')}/api/generate",
-                json={"model": model, "prompt": prompt, "stream": False},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            out = (data.get("response") or "").strip()
 
-        if not out:
-            return suggestion
-        if _sentences_count(out) > 2:
-            return suggestion
-        if len(out) > 260:
-            return suggestion
+def _within_limits(text: str, *, max_sentences: int = 2, max_chars: int = 260) -> bool:
+    return _sentences_count(text) <= max_sentences and len(text.strip()) <= max_chars
+
 
-        return out
-    except Exception:
-        return suggestion
 async def maybe_ollama_polish_with_provider(
     suggestion: str,
     tone: str,
     ctx: Dict[str, Any],
 ) -> tuple[str, str]:
-    provider = os.getenv("AI_PROVIDER", "hybrid").lower()
-    if provider not in ("hybrid", "ollama"):
-        return suggestion, "rules"
-
-    ollama_url = os.getenv("OLLAMA_URL", "").strip()
-    if not ollama_url:
+    target = _ollama_target()
+    if target is None:
         return suggestion, "rules"
+    ollama_url, model = target
 
-    model = os.getenv("OLLAMA_MODEL", "llama3").strip()
-
-    prompt = (
-        "Rewrite the following as a personalized tiny challenge.\n"
-        "Constraints: 1 to 2 sentences, no lists, no emojis.\n"
-        f"Tone target: {tone}\n"
-        f"Context: {ctx}\n"
-        f"Text: {suggestion}\n"
-        "Return only the rewritten text."
-    )
+    prompt = polish_prompt(suggestion, tone, ctx)
 
     try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            resp = await client.post(
-                f"{ollama_url.rstrip('/')}/api/generate",
-                json={"model": model, "prompt": prompt, "stream": False},
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            out = (data.get("response") or "").strip()
+        # Shared pooled client (main.lifespan); while its circuit breaker is open this
+        # raises CircuitOpenError immediately instead of waiting on the timeout.
+        client = get_ollama_client(ollama_url)
+        data = await client.generate({"model": model, "prompt": prompt, "stream": False})
+        out = (data.get("response") or "").strip()
 
         if not out:
             return suggestion, "rules"
-        if _sentences_count(out) > 2:
-            return suggestion, "rules"
-        if len(out) > 260:
+        if not _within_limits(out):
             return suggestion, "rules"
 
         return out, "ollama"
@@ -209,6 +183,120 @@ async def maybe_ollama_polish_with_provider(
         return suggestion, "rules"
 
 
+def suggestion_cache_key(suggestion: str, tone: str, ctx: Dict[str, Any]) -> Optional[str]:
+    """
+    Cache key for a polish request, or None when it must not be cached.
+
+    Prompts carrying retrieved reflections are never cached: the rewrite may quote
+    a user's own notes, so it must not be served to anyone else.
+    """
+    target = _ollama_target()
+    if target is None or not get_suggestion_cache().enabled or ctx.get("retrieved_reflections"):
+        return None
+    return suggestion_fingerprint(template=suggestion, tone=tone, ctx=ctx, model=target[1])
+
+
+async def polish_with_cache(
+    suggestion: str,
+    tone: str,
+    ctx: Dict[str, Any],
+    *,
+    user_id: int,
+) -> tuple[str, str, bool]:
+    """
+    maybe_ollama_polish_with_provider behind the suggestion cache.
+    Returns (text, provider, cache_hit).
+    """
+    key = suggestion_cache_key(suggestion, tone, ctx)
+    if key is None:
+        out, used = await maybe_ollama_polish_with_provider(suggestion, tone, ctx)
+        return out, used, False
+
+    cache = get_suggestion_cache()
+    cached = cache.get(key, user_id=user_id)
+    if cached is not None:
+        return cached, "ollama", True
+
+    out, used = await maybe_ollama_polish_with_provider(suggestion, tone, ctx)
+    if used == "ollama":
+        cache.put(key, out, user_id=user_id)
+    return out, used, False
+
+
+@dataclass
+class StreamOutcome:
+    """Filled in by stream_polish once the stream is finished."""
+
+    text: str
+    provider: str = "rules"
+    cache_hit: bool = False
+
+
+async def stream_polish(
+    fallback: str,
+    *,
+    outcome: StreamOutcome,
+    prompt: str,
+    user_id: int,
+    cache_key: Optional[str] = None,
+    max_sentences: int = 2,
+    max_chars: int = 260,
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Streams an Ollama generation as ("token", chunk) items, checking the sentence and
+    length guards on every chunk.
+
+    If the guards trip, Ollama fails, or the output is empty, the stream ends with
+    ("replace", fallback) when tokens were already sent (the client must swap its text),
+    or ("token", fallback) when nothing was sent yet. outcome.text is always the final text.
+    """
+    target = _ollama_target()
+    if target is None:
+        outcome.text = fallback
+        yield "token", fallback
+        return
+    ollama_url, model = target
+
+    cache = get_suggestion_cache()
+    if cache_key is not None:
+        cached = cache.get(cache_key, user_id=user_id)
+        if cached is not None:
+            outcome.text, outcome.provider, outcome.cache_hit = cached, "ollama", True
+            yield "token", cached
+            return
+
+    sent = ""
+    completed = False
+    try:
+        tokens = get_ollama_client(ollama_url).stream_generate({"model": model, "prompt": prompt})
+        try:
+            async for token in tokens:
+                if not sent:
+                    token = token.lstrip()
+                    if not token:
+                        continue
+                if not _within_limits(sent + token, max_sentences=max_sentences, max_chars=max_chars):
+                    break
+                sent += token
+                yield "token", token
+            else:
+                completed = True
+        finally:
+            await tokens.aclose()
+    except Exception:
+        completed = False
+
+    out = sent.strip()
+    if completed and out:
+        outcome.text, outcome.provider = out, "ollama"
+        if cache_key is not None:
+            cache.put(cache_key, out, user_id=user_id)
+        return
+
+    outcome.text, outcome.provider = fallback, "rules"
+    yield ("replace" if sent else "token"), fallback
+
+
 async def maybe_ollama_polish(suggestion: str, tone: str, ctx: Dict[str, Any]) -> str:
     """Backwards-compatible wrapper.
 
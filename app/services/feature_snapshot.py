@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import asdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import Checkin, CheckinHabitResult, UserFeatureSnapshot
+from app.services.ai_suggestions import Features, _last_7_days_window, build_features, fetch_last_7_checkins
+
+logger = logging.getLogger("mindgarden.features")
+
+# day -> (mood, habits_done, habits_total)
+DayBuckets = Dict[date, Tuple[int, int, int]]
+
+
+def _load_days(snapshot: UserFeatureSnapshot) -> DayBuckets:
+    raw = json.loads(snapshot.days_json or "{}")
+    return {date.fromisoformat(k): (int(v[0]), int(v[1]), int(v[2])) for k, v in raw.items()}
+
+
+def _store(snapshot: UserFeatureSnapshot, days: DayBuckets, today: date) -> None:
+    """Drops days that can never re-enter a window (before today - 6) and refreshes the aggregates."""
+    start, _end = _last_7_days_window(today)
+    days = {d: v for d, v in days.items() if d >= start}
+    window = _window(days, today)
+
+    snapshot.days_json = json.dumps({d.isoformat(): list(v) for d, v in sorted(days.items())})
+    snapshot.window_end = today
+    snapshot.mood_sum = sum(v[0] for v in window.values())
+    snapshot.mood_count = len(window)
+    snapshot.habit_done = sum(v[1] for v in window.values())
+    snapshot.habit_total = sum(v[2] for v in window.values())
+    snapshot.latest_checkin_date = max(window) if window else None
+    snapshot.updated_at = datetime.utcnow()
+
+
+def _window(days: DayBuckets, today: date) -> DayBuckets:
+    start, end = _last_7_days_window(today)
+    return {d: v for d, v in days.items() if start <= d <= end}
+
+
+def _fetch_days(db: Session, *, user_id: int, since: date) -> DayBuckets:
+    """One grouped query: (mood, done, total) per check-in day on or after `since`."""
+    rows = (
+        db.query(
+            Checkin.date,
+            Checkin.mood,
+            func.coalesce(func.sum(case((CheckinHabitResult.done == True, 1), else_=0)), 0),  # noqa: E712
+            func.count(CheckinHabitResult.id),
+        )
+        .outerjoin(CheckinHabitResult, CheckinHabitResult.checkin_id == Checkin.id)
+        .filter(Checkin.user_id == user_id)
+        .filter(Checkin.date >= since)
+        .group_by(Checkin.id, Checkin.date, Checkin.mood)
+        .all()
+    )
+    return {d: (int(mood), int(done or 0), int(total or 0)) for d, mood, done, total in rows}
+
+
+def rebuild_feature_snapshot(db: Session, *, user_id: int, today: Optional[date] = None) -> UserFeatureSnapshot:
+    """Recomputes the user's snapshot from check-ins. Does NOT commit; caller should db.commit()."""
+    if today is None:
+        today = date.today()
+    start, _end = _last_7_days_window(today)
+
+    days = _fetch_days(db, user_id=user_id, since=start)
+    snapshot = db.query(UserFeatureSnapshot).filter(UserFeatureSnapshot.user_id == user_id).first()
+    if snapshot is None:
+        snapshot = UserFeatureSnapshot(user_id=user_id)
+        _store(snapshot, days, today)
+        try:
+            with db.begin_nested():
+                db.add(snapshot)
+            return snapshot
+        except IntegrityError:
+            # A concurrent request created the user's first snapshot; overwrite theirs,
+            # both were computed from the same check-ins.
+            snapshot = (
+                db.query(UserFeatureSnapshot)
+                .filter(UserFeatureSnapshot.user_id == user_id)
+                .with_for_update()
+                .one()
+            )
+    _store(snapshot, days, today)
+    db.flush()
+    return snapshot
+
+
+def apply_checkin_to_feature_snapshot(
+    db: Session,
+    *,
+    user_id: int,
+    checkin_date: date,
+    mood: int,
+    results: Iterable[Tuple[int, bool]],
+    today: Optional[date] = None,
+) -> None:
+    """
+    Folds one new check-in into the user's snapshot (O(1): at most ~7 day buckets).
+    Call after the check-in is flushed; if no snapshot exists yet it is rebuilt from
+    the check-ins table, which already includes this one. Does NOT commit.
+    """
+    if today is None:
+        today = date.today()
+
+    snapshot = (
+        db.query(UserFeatureSnapshot)
+        .filter(UserFeatureSnapshot.user_id == user_id)
+        .with_for_update()
+        .first()
+    )
+    if snapshot is None:
+        rebuild_feature_snapshot(db, user_id=user_id, today=today)
+        return
+
+    results = list(results)
+    days = _load_days(snapshot)
+    days[checkin_date] = (int(mood), sum(1 for _hid, done in results if done), len(results))
+    _store(snapshot, days, today)
+
+
+def features_from_snapshot(snapshot: UserFeatureSnapshot, today: Optional[date] = None) -> Features:
+    """Same Features build_features() would return for the last 7 days, without touching check-ins."""
+    if today is None:
+        today = date.today()
+
+    if snapshot.window_end == today:
+        days_in_window = None
+        mood_sum, mood_count = snapshot.mood_sum, snapshot.mood_count
+        done, total = snapshot.habit_done, snapshot.habit_total
+        latest = snapshot.latest_checkin_date
+    else:
+        # The window slid since the last write: re-aggregate the (at most 7) retained days.
+        days_in_window = _window(_load_days(snapshot), today)
+        mood_sum = sum(v[0] for v in days_in_window.values())
+        mood_count = len(days_in_window)
+        done = sum(v[1] for v in days_in_window.values())
+        total = sum(v[2] for v in days_in_window.values())
+        latest = max(days_in_window) if days_in_window else None
+
+    if mood_count == 0:
+        return build_features([], today)
+
+    if days_in_window is None:
+        has_yesterday = (today - timedelta(days=1)).isoformat() in json.loads(snapshot.days_json or "{}")
+    else:
+        has_yesterday = (today - timedelta(days=1)) in days_in_window
+
+    return Features(
+        days_with_checkins=mood_count,
+        mood_avg_7d=round(mood_sum / mood_count, 2),
+        habit_done_rate_7d=round(done / total, 2) if total > 0 else None,
+        latest_checkin_date=latest,
+        streak_broken=not has_yesterday,
+    )
+
+
+def _verify_enabled() -> bool:
+    return os.getenv("AI_FEATURES_VERIFY", "0").strip() == "1"
+
+
+def get_features(
+    db: Session,
+    user_id: int,
+    today: Optional[date] = None,
+    *,
+    verify: Optional[bool] = None,
+) -> Features:
+    """
+    Features for /ai/suggestions from the user's snapshot (rebuilt if missing).
+
+    Verification mode (verify=True, or AI_FEATURES_VERIFY=1) also recomputes them from
+    the check-ins with build_features(); on a mismatch it logs a warning, repairs the
+    snapshot and returns the recomputed value. Does NOT commit.
+    """
+    if today is None:
+        today = date.today()
+    if verify is None:
+        verify = _verify_enabled()
+
+    snapshot = db.query(UserFeatureSnapshot).filter(UserFeatureSnapshot.user_id == user_id).first()
+    if snapshot is None:
+        snapshot = rebuild_feature_snapshot(db, user_id=user_id, today=today)
+    features = features_from_snapshot(snapshot, today)
+
+    if verify:
+        expected = build_features(fetch_last_7_checkins(db, user_id, today), today)
+        if expected != features:
+            logger.warning(
+                "feature snapshot mismatch for user_id=%s: snapshot=%s recomputed=%s",
+                user_id,
+                asdict(features),
+                asdict(expected),
+            )
+            rebuild_feature_snapshot(db, user_id=user_id, today=today)
+            return expected
+    return features
+
+
+def latest_note_in_window(db: Session, user_id: int, today: Optional[date] = None) -> str:
+    """Note of the most recent check-in in the 7-day window ("" if none); used as the RAG query."""
+    if today is None:
+        today = date.today()
+    start, end = _last_7_days_window(today)
+    note = (
+        db.query(Checkin.note)
+        .filter(Checkin.user_id == user_id)
+        .filter(Checkin.date >= start)
+        .filter(Checkin.date <= end)
+        .order_by(Checkin.date.desc())
+        .limit(1)
+        .scalar()
+    )
+    return (note or "").strip()
+
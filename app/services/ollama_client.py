@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import httpx
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Ollama while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed    -> calls go through; `failure_threshold` failures in a row opens it
+    open      -> calls are rejected immediately for `reset_seconds`
+    half-open -> one trial call is let through; success closes, failure re-opens
+    """
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int = 3,
+        reset_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Ends a call that neither succeeded nor failed (cancelled by the caller)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # type: ignore  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+class OllamaClient:
+    """
+    Application-scoped, pooled HTTP client for Ollama (created in main.lifespan).
+
+    Keeps connections alive between suggestions, applies per-phase timeouts, and
+    short-circuits through a CircuitBreaker while Ollama is failing.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        timeout: httpx.Timeout,
+        limits: httpx.Limits,
+        http2: bool = False,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.breaker = breaker or CircuitBreaker()
+        self.loop = _running_loop()
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=limits,
+            http2=http2 and _http2_available(),
+        )
+
+    async def generate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST /api/generate. Raises CircuitOpenError without a network call when open."""
+        if not self.breaker.allow():
+            raise CircuitOpenError("ollama circuit open")
+        try:
+            resp = await self.http.post("/api/generate", json=payload)
+            resp.raise_for_status()
+            data = resp.json()
+        except asyncio.CancelledError:
+            # Cancelled by the caller (client gone, outer timeout): not an Ollama failure,
+            # but a half-open trial slot must be handed back or the breaker never closes.
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return data
+
+    async def stream_generate(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        POST /api/generate with stream=true, yielding response tokens as they arrive.
+        The read timeout applies between chunks, not to the whole generation.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("ollama circuit open")
+        try:
+            async with self.http.stream("POST", "/api/generate", json={**payload, "stream": True}) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise RuntimeError(f"ollama error: {data['error']}")
+                    token = data.get("response") or ""
+                    if token:
+                        yield token
+                    if data.get("done"):
+                        break
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped early (a guard tripped, the client went away): not an
+            # Ollama failure, but a half-open trial slot must be handed back.
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def build_ollama_client(base_url: str, *, breaker: Optional[CircuitBreaker] = None) -> OllamaClient:
+    """
+    Pool/timeout/breaker settings come from env:
+      OLLAMA_CONNECT_TIMEOUT (1.0s), OLLAMA_READ_TIMEOUT (3.0s), OLLAMA_WRITE_TIMEOUT (1.0s),
+      OLLAMA_POOL_TIMEOUT (0.5s), OLLAMA_MAX_CONNECTIONS (20), OLLAMA_MAX_KEEPALIVE (10),
+      OLLAMA_KEEPALIVE_EXPIRY (30s), OLLAMA_HTTP2 (1 = use HTTP/2 when the h2 package is
+      installed and the server negotiates it), OLLAMA_BREAKER_FAILURES (3),
+      OLLAMA_BREAKER_RESET_SECONDS (30s).
+    """
+    env = os.getenv
+    timeout = httpx.Timeout(
+        connect=float(env("OLLAMA_CONNECT_TIMEOUT", "1.0")),
+        read=float(env("OLLAMA_READ_TIMEOUT", "3.0")),
+        write=float(env("OLLAMA_WRITE_TIMEOUT", "1.0")),
+        pool=float(env("OLLAMA_POOL_TIMEOUT", "0.5")),
+    )
+    limits = httpx.Limits(
+        max_connections=int(env("OLLAMA_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(env("OLLAMA_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(env("OLLAMA_KEEPALIVE_EXPIRY", "30")),
+    )
+    if breaker is None:
+        breaker = CircuitBreaker(
+            failure_threshold=int(env("OLLAMA_BREAKER_FAILURES", "3")),
+            reset_seconds=float(env("OLLAMA_BREAKER_RESET_SECONDS", "30")),
+        )
+    return OllamaClient(
+        base_url,
+        timeout=timeout,
+        limits=limits,
+        http2=env("OLLAMA_HTTP2", "1").strip() == "1",
+        breaker=breaker,
+    )
+
+
+_CLIENT: Optional[OllamaClient] = None
+
+
+def get_ollama_client(base_url: str) -> OllamaClient:
+    """
+    Returns the shared client for base_url (normally created by main.lifespan).
+
+    Created lazily if the app lifespan didn't run (scripts, some tests). Pooled
+    connections belong to the event loop that opened them, so a caller on a different
+    loop gets a fresh pool (the breaker state carries over).
+    """
+    global _CLIENT
+    base_url = base_url.rstrip("/")
+    current = _CLIENT
+    if current is not None and current.base_url == base_url and current.loop in (None, _running_loop()):
+        if current.loop is None:
+            current.loop = _running_loop()
+        return current
+    breaker = current.breaker if current is not None and current.base_url == base_url else None
+    _CLIENT = build_ollama_client(base_url, breaker=breaker)
+    return _CLIENT
+
+
+async def start_ollama_client() -> Optional[OllamaClient]:
+    url = os.getenv("OLLAMA_URL", "").strip()
+    if not url:
+        return None
+    return get_ollama_client(url)
+
+
+async def close_ollama_client() -> None:
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    if client is not None:
+        await client.aclose()
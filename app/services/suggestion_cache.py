@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+def _bucket(value: Optional[float], step: float) -> Optional[float]:
+    if value is None:
+        return None
+    return round(round(float(value) / step) * step, 2)
+
+
+def suggestion_fingerprint(*, template: str, tone: str, ctx: Dict[str, Any], model: str) -> str:
+    """
+    Normalized cache key for a polished suggestion.
+
+    Features are bucketed (mood to 0.5, habit done rate to 0.1) so users in the same
+    situation share a key; the check-in date is left out on purpose.
+    """
+    features = {
+        "days_with_checkins": ctx.get("days_with_checkins"),
+        "mood_avg_7d": _bucket(ctx.get("mood_avg_7d"), 0.5),
+        "habit_done_rate_7d": _bucket(ctx.get("habit_done_rate_7d"), 0.1),
+        "streak_broken": bool(ctx.get("streak_broken")),
+    }
+    raw = json.dumps(
+        {"template": template, "tone": tone, "features": features, "model": model},
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class _Variant:
+    text: str
+    created_at: float
+
+
+class SuggestionCache:
+    """
+    TTL + LRU cache of polished suggestion texts, several variants per fingerprint.
+
+    Per-user freshness: a user is not served a variant they saw in their last
+    `user_history` suggestions. If every cached variant is stale for them, get() misses,
+    the caller polishes a new text and put() adds it (evicting the oldest variant).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_keys: int = 1024,
+        ttl_seconds: float = 3600.0,
+        variants_per_key: int = 3,
+        user_history: int = 3,
+        max_users: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_keys = max(0, int(max_keys))
+        self.ttl_seconds = float(ttl_seconds)
+        self.variants_per_key = max(1, int(variants_per_key))
+        self.user_history = max(0, int(user_history))
+        self.max_users = max(1, int(max_users))
+        self.clock = clock
+
+        self._entries: "OrderedDict[str, List[_Variant]]" = OrderedDict()
+        self._seen: "OrderedDict[int, Deque[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_keys > 0
+
+    def get(self, key: str, *, user_id: int) -> Optional[str]:
+        with self._lock:
+            variants = self._live_variants(key)
+            seen = self._seen.get(user_id, ())
+            for v in variants:
+                h = _text_hash(v.text)
+                if h not in seen:
+                    self._entries.move_to_end(key)
+                    self._mark_seen(user_id, h)
+                    self.hits += 1
+                    return v.text
+            self.misses += 1
+            return None
+
+    def put(self, key: str, text: str, *, user_id: Optional[int] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            variants = self._live_variants(key)
+            if all(v.text != text for v in variants):
+                variants.append(_Variant(text=text, created_at=self.clock()))
+                del variants[: max(0, len(variants) - self.variants_per_key)]
+            self._entries[key] = variants
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+            if user_id is not None:
+                self._mark_seen(user_id, _text_hash(text))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "keys": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _live_variants(self, key: str) -> List[_Variant]:
+        variants = self._entries.get(key)
+        if not variants:
+            return []
+        cutoff = self.clock() - self.ttl_seconds
+        live = [v for v in variants if v.created_at > cutoff]
+        if not live:
+            del self._entries[key]
+        elif len(live) != len(variants):
+            self._entries[key] = live
+        return live
+
+    def _mark_seen(self, user_id: int, text_hash: str) -> None:
+        if self.user_history == 0:
+            return
+        seen = self._seen.get(user_id)
+        if seen is None:
+            seen = deque(maxlen=self.user_history)
+            self._seen[user_id] = seen
+        seen.append(text_hash)
+        self._seen.move_to_end(user_id)
+        while len(self._seen) > self.max_users:
+            self._seen.popitem(last=False)
+
+
+_CACHE: Optional[SuggestionCache] = None
+
+
+def get_suggestion_cache() -> SuggestionCache:
+    """
+    AI_SUGGESTION_CACHE_MAX_KEYS (default 1024; 0 disables)
+    AI_SUGGESTION_CACHE_TTL_SECONDS (default 3600)
+    AI_SUGGESTION_CACHE_VARIANTS (default 3 texts per fingerprint)
+    AI_SUGGESTION_CACHE_USER_HISTORY (default 3; recent texts never repeated to a user)
+    """
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = SuggestionCache(
+            max_keys=int(os.getenv("AI_SUGGESTION_CACHE_MAX_KEYS", "1024")),
+            ttl_seconds=float(os.getenv("AI_SUGGESTION_CACHE_TTL_SECONDS", "3600")),
+            variants_per_key=int(os.getenv("AI_SUGGESTION_CACHE_VARIANTS", "3")),
+            user_history=int(os.getenv("AI_SUGGESTION_CACHE_USER_HISTORY", "3")),
+        )
+    return _CACHE
@@ -1,42 +1,109 @@
 # app/streaks.py
-from datetime import date, timedelta
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from . import models
 
+logger = logging.getLogger("mindgarden.streaks")
 
-def compute_habit_streak(db: Session, user_id: int, habit_id: int, as_of_date: date) -> int:
+# First chunk of days fetched per streak query; later chunks double in size.
+STREAK_CHUNK_DAYS = 32
+
+
+def _fetch_done_by_date(
+    db: Session,
+    *,
+    user_id: int,
+    habit_ids: Optional[list[int]],
+    start: date,
+    end: date,
+) -> Dict[int, Dict[date, bool]]:
     """
-    Basic MVP streak: counts consecutive days ending at as_of_date
-    where the user has a check-in AND that habit was marked done=True.
-    Stops at first miss or done=False.
+    One query: {habit_id: {date: done}} for the user's check-ins in [start, end].
+    habit_ids=None means every habit with a result row in the range.
     """
-    streak = 0
-    d = as_of_date
-
-    while True:
-        row = (
-            db.query(models.CheckinHabitResult.done)
-            .join(models.Checkin, models.Checkin.id == models.CheckinHabitResult.checkin_id)
-            .filter(
-                models.Checkin.user_id == user_id,
-                models.Checkin.date == d,
-                models.CheckinHabitResult.habit_id == habit_id,
-            )
-            .first()
+    q = (
+        db.query(
+            models.CheckinHabitResult.habit_id,
+            models.Checkin.date,
+            models.CheckinHabitResult.done,
         )
+        .join(models.Checkin, models.Checkin.id == models.CheckinHabitResult.checkin_id)
+        .filter(
+            models.Checkin.user_id == user_id,
+            models.Checkin.date >= start,
+            models.Checkin.date <= end,
+        )
+        .order_by(models.Checkin.date.desc())
+    )
+    if habit_ids is not None:
+        q = q.filter(models.CheckinHabitResult.habit_id.in_(habit_ids))
 
-        if not row:
-            break
+    out: Dict[int, Dict[date, bool]] = {hid: {} for hid in (habit_ids or [])}
+    for hid, d, done in q.all():
+        out.setdefault(hid, {})[d] = bool(done)
+    return out
 
-        done = bool(row[0])
-        if not done:
-            break
 
-        streak += 1
-        d = d - timedelta(days=1)
+def compute_habit_streaks(
+    db: Session,
+    user_id: int,
+    as_of_date: date,
+    habit_ids: Optional[Iterable[int]] = None,
+    *,
+    chunk_days: int = STREAK_CHUNK_DAYS,
+) -> Dict[int, int]:
+    """
+    Multi-habit streaks ending at as_of_date: {habit_id: streak}.
 
-    return streak
+    Fetches date-ordered done-vectors for all requested habits in one query per chunk
+    of days (newest chunk first) and runs compute_streak_from_daily_done on them. Only
+    habits whose streak spans the whole fetched range need another (twice as large)
+    chunk, so streaks shorter than chunk_days cost a single query.
+
+    With habit_ids=None, returns streaks for every habit that has a result in the first
+    chunk; habits not in the result have a streak of 0.
+    """
+    pending: Optional[list[int]] = list(habit_ids) if habit_ids is not None else None
+    daily: Dict[int, Dict[date, bool]] = {hid: {} for hid in (pending or [])}
+    streaks: Dict[int, int] = {hid: 0 for hid in (pending or [])}
+
+    end = as_of_date
+    span = max(1, int(chunk_days))
+    while pending is None or pending:
+        start = end - timedelta(days=span - 1)
+        fetched = _fetch_done_by_date(db, user_id=user_id, habit_ids=pending, start=start, end=end)
+        for hid, by_date in fetched.items():
+            daily.setdefault(hid, {}).update(by_date)
+
+        covered_days = (as_of_date - start).days + 1
+        next_pending: list[int] = []
+        for hid in fetched:
+            streaks[hid] = compute_streak_from_daily_done(daily[hid], as_of_date)
+            if streaks[hid] >= covered_days:
+                next_pending.append(hid)
+
+        pending = next_pending
+        end = start - timedelta(days=1)
+        span *= 2
+
+    return streaks
+
+
+def compute_habit_streak(db: Session, user_id: int, habit_id: int, as_of_date: date) -> int:
+    """
+    Basic MVP streak: counts consecutive days ending at as_of_date
+    where the user has a check-in AND that habit was marked done=True.
+    Stops at first miss or done=False.
+
+    Batched: one query per chunk of days rather than one per day of streak.
+    """
+    return compute_habit_streaks(db, user_id, as_of_date, [habit_id])[habit_id]
 
 
 # Day 5 addition: pure streak logic (no DB) for unit tests / edge cases
@@ -68,3 +135,222 @@ def compute_streak_from_daily_done(
         streak += 1
         d = d - timedelta(days=1)
     return streak
+
+
+# Materialized streak state (habit_streak_state), maintained on write.
+
+def _runs_from_done_dates(done_dates: list[date]) -> tuple[int, Optional[date], int]:
+    """
+    Pure helper: given ascending done dates, returns
+    (current_streak ending at the last done date, last_done_date, longest_streak).
+    """
+    if not done_dates:
+        return 0, None, 0
+    current = 0
+    longest = 0
+    prev: Optional[date] = None
+    for d in done_dates:
+        current = current + 1 if prev is not None and d == prev + timedelta(days=1) else 1
+        longest = max(longest, current)
+        prev = d
+    return current, prev, longest
+
+
+def _insert_streak_state(db: Session, *, user_id: int, habit_id: int) -> models.HabitStreakState:
+    """
+    Inserts an empty state row inside a savepoint. If a concurrent request created it
+    first, returns theirs (locked) for the caller to overwrite: both recompute it from
+    the same history.
+    """
+    state = models.HabitStreakState(user_id=user_id, habit_id=habit_id)
+    try:
+        with db.begin_nested():
+            db.add(state)
+        return state
+    except IntegrityError:
+        return (
+            db.query(models.HabitStreakState)
+            .filter(
+                models.HabitStreakState.user_id == user_id,
+                models.HabitStreakState.habit_id == habit_id,
+            )
+            .with_for_update()
+            .one()
+        )
+
+
+def rebuild_streak_state(
+    db: Session,
+    *,
+    user_id: int,
+    habit_ids: Optional[Iterable[int]] = None,
+) -> Dict[int, models.HabitStreakState]:
+    """
+    Repair path: recomputes habit_streak_state rows from full check-in history.
+    Used for out-of-order/backfilled check-ins and for habits with no state row yet.
+    Does NOT commit; caller should db.commit().
+    """
+    if habit_ids is None:
+        habit_ids = [r[0] for r in db.query(models.Habit.id).filter(models.Habit.user_id == user_id).all()]
+    habit_ids = list(habit_ids)
+    if not habit_ids:
+        return {}
+
+    rows = (
+        db.query(models.CheckinHabitResult.habit_id, models.Checkin.date)
+        .join(models.Checkin, models.Checkin.id == models.CheckinHabitResult.checkin_id)
+        .filter(
+            models.Checkin.user_id == user_id,
+            models.CheckinHabitResult.habit_id.in_(habit_ids),
+            models.CheckinHabitResult.done == True,  # noqa: E712
+        )
+        .order_by(models.Checkin.date.asc())
+        .all()
+    )
+    done_by_habit: Dict[int, list[date]] = {hid: [] for hid in habit_ids}
+    for hid, d in rows:
+        done_by_habit[hid].append(d)
+
+    existing = {
+        s.habit_id: s
+        for s in db.query(models.HabitStreakState)
+        .filter(
+            models.HabitStreakState.user_id == user_id,
+            models.HabitStreakState.habit_id.in_(habit_ids),
+        )
+        .with_for_update()
+        .all()
+    }
+
+    now = datetime.utcnow()
+    out: Dict[int, models.HabitStreakState] = {}
+    for hid in habit_ids:
+        current, last_done, longest = _runs_from_done_dates(done_by_habit[hid])
+        state = existing.get(hid)
+        if state is None:
+            state = _insert_streak_state(db, user_id=user_id, habit_id=hid)
+        state.current_streak = current
+        state.last_done_date = last_done
+        state.longest_streak = longest
+        state.updated_at = now
+        out[hid] = state
+    db.flush()
+    return out
+
+
+def apply_checkin_to_streak_state(
+    db: Session,
+    *,
+    user_id: int,
+    checkin_date: date,
+    results: Iterable[Tuple[int, bool]],
+) -> None:
+    """
+    Incrementally folds one new check-in's (habit_id, done) results into habit_streak_state.
+    Call after the check-in's habit results are flushed. Does NOT commit.
+
+    - done the day after last_done_date -> extend the streak
+    - done later than that             -> new streak of 1
+    - done on/before last_done_date    -> out of order: rebuild that habit from history
+    - not done                         -> nothing to store; reads as 0 for that day
+    """
+    done_ids = [hid for hid, done in results if done]
+    if not done_ids:
+        return
+
+    states = {
+        s.habit_id: s
+        for s in db.query(models.HabitStreakState)
+        .filter(
+            models.HabitStreakState.user_id == user_id,
+            models.HabitStreakState.habit_id.in_(done_ids),
+        )
+        .with_for_update()
+        .all()
+    }
+
+    repair: list[int] = []
+    now = datetime.utcnow()
+    for hid in done_ids:
+        state = states.get(hid)
+        if state is None or (state.last_done_date is not None and checkin_date <= state.last_done_date):
+            # No state yet (history may predate the table) or a backfill: rebuild.
+            repair.append(hid)
+            continue
+        if state.last_done_date is not None and checkin_date == state.last_done_date + timedelta(days=1):
+            state.current_streak += 1
+        else:
+            state.current_streak = 1
+        state.last_done_date = checkin_date
+        state.longest_streak = max(state.longest_streak, state.current_streak)
+        state.updated_at = now
+
+    if repair:
+        rebuild_streak_state(db, user_id=user_id, habit_ids=repair)
+
+
+def get_streak_state(
+    db: Session,
+    *,
+    user_id: int,
+    habit_ids: Iterable[int],
+) -> Dict[int, models.HabitStreakState]:
+    """Loads state rows for habit_ids, rebuilding any that are missing. Does NOT commit."""
+    habit_ids = list(habit_ids)
+    if not habit_ids:
+        return {}
+    states = {
+        s.habit_id: s
+        for s in db.query(models.HabitStreakState)
+        .filter(
+            models.HabitStreakState.user_id == user_id,
+            models.HabitStreakState.habit_id.in_(habit_ids),
+        )
+        .all()
+    }
+    missing = [hid for hid in habit_ids if hid not in states]
+    if missing:
+        states.update(rebuild_streak_state(db, user_id=user_id, habit_ids=missing))
+    return states
+
+
+def streak_from_state(state: models.HabitStreakState, as_of_date: date) -> Optional[int]:
+    """
+    Current streak as of as_of_date, or None if the state can't answer (as_of_date is
+    before the last recorded done day; use a history-based computation instead).
+    """
+    if state.last_done_date is None or as_of_date > state.last_done_date:
+        return 0
+    if as_of_date == state.last_done_date:
+        return int(state.current_streak)
+    return None
+
+
+def main() -> None:
+    """Repair job: python -m app.streaks [--user-id N]"""
+    import argparse
+
+    from .db import Base, SessionLocal, engine
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    parser = argparse.ArgumentParser(description="Rebuild habit_streak_state from check-in history.")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        q = db.query(models.User.id)
+        if args.user_id is not None:
+            q = q.filter(models.User.id == args.user_id)
+        user_ids = [r[0] for r in q.all()]
+        for uid in user_ids:
+            rebuild_streak_state(db, user_id=uid)
+            db.commit()
+        logger.info("rebuilt streak state users=%s", len(user_ids))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
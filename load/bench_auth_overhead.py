@@ -0,0 +1,74 @@
+"""
+Benchmark: authentication overhead per request with and without the user identity cache.
+
+Runs the app in-process (TestClient) against a throwaway SQLite DB and reports, for
+/habits and /ai/suggestions, the mean request time and the number of `users` SELECTs
+per request with AUTH_USER_CACHE_TTL_SECONDS=0 (before) vs. the cache enabled (after).
+
+    python -m load.bench_auth_overhead
+    REQUESTS=500 python -m load.bench_auth_overhead
+"""
+import os
+import tempfile
+import time
+
+_TMP = tempfile.mkdtemp()
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_TMP, 'bench.db')}"
+os.environ.setdefault("RAG_ENABLED", "0")
+os.environ["AI_PROVIDER"] = "rules"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.db import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.observability.rate_limit import set_rate_limit_backend  # noqa: E402
+from app.security import user_identity_cache  # noqa: E402
+
+REQUESTS = int(os.getenv("REQUESTS", "300"))
+AI_LIMIT_PER_USER = 30  # /ai/suggestions limit: rotate users to stay under it
+
+
+def _tokens(client, n: int) -> list:
+    out = []
+    for i in range(n):
+        r = client.post("/auth/signup", json={"email": f"bench{i}_{time.time_ns()}@example.com", "password": "pw123456"})
+        out.append({"Authorization": f"Bearer {r.json()['access_token']}"})
+    return out
+
+
+def _run(client, path: str, tokens: list) -> tuple:
+    user_selects = [0]
+
+    def on_exec(conn, cursor, statement, *args):
+        if "FROM users" in statement:
+            user_selects[0] += 1
+
+    event.listen(engine, "before_cursor_execute", on_exec)
+    try:
+        t0 = time.perf_counter()
+        for i in range(REQUESTS):
+            headers = tokens[(i // AI_LIMIT_PER_USER) % len(tokens)]
+            assert client.get(path, headers=headers).status_code == 200
+        elapsed = time.perf_counter() - t0
+    finally:
+        event.remove(engine, "before_cursor_execute", on_exec)
+    return elapsed / REQUESTS * 1000, user_selects[0] / REQUESTS
+
+
+def main() -> None:
+    with TestClient(app) as client:
+        tokens = _tokens(client, REQUESTS // AI_LIMIT_PER_USER + 1)
+        print(f"{'path':<16} {'cache':<6} {'ms/req':>8} {'user SELECTs/req':>17}")
+        for path in ("/habits", "/ai/suggestions"):
+            for label, ttl in (("off", 0.0), ("on", 30.0)):
+                user_identity_cache.ttl_seconds = ttl
+                user_identity_cache.clear()
+                set_rate_limit_backend(None)
+                ms, selects = _run(client, path, tokens)
+                print(f"{path:<16} {label:<6} {ms:>8.2f} {selects:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
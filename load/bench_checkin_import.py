@@ -0,0 +1,100 @@
+"""
+Benchmark: historical backfill throughput, POST /checkins per row vs. POST /checkins/import.
+
+Runs the app in-process (TestClient) against a throwaway SQLite DB. One user with
+HABITS habits backfills ROWS days of history (every other day has a note), first one
+request per check-in (the only path before the import endpoint), then as a single
+NDJSON and a single CSV import, each into a fresh user. Reports rows/sec end to end
+and the rows_per_sec the import endpoint reports for its server-side work.
+
+    python -m load.bench_checkin_import
+    ROWS=3650 HABITS=5 python -m load.bench_checkin_import
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+_TMP = tempfile.mkdtemp()
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_TMP, 'bench.db')}"
+os.environ.setdefault("RAG_ENABLED", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+ROWS = int(os.getenv("ROWS", "1000"))
+HABITS = int(os.getenv("HABITS", "3"))
+START = date(2020, 1, 1)
+
+
+def _user(client, name: str):
+    r = client.post("/auth/signup", json={"email": f"{name}_{time.time_ns()}@example.com", "password": "pw123456"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    habit_ids = [client.post("/habits", json={"name": f"h{i}"}, headers=headers).json()["id"] for i in range(HABITS)]
+    return headers, habit_ids
+
+
+def _history(habit_ids):
+    for i in range(ROWS):
+        yield {
+            "date": str(START + timedelta(days=i)),
+            "mood": 1 + i % 5,
+            "note": f"day {i}: slept fine, walked" if i % 2 == 0 else None,
+            "habit_results": [{"habit_id": hid, "done": (i + j) % 3 != 0} for j, hid in enumerate(habit_ids)],
+        }
+
+
+def _csv(rows, habit_ids) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["date", "mood", "note"] + [f"habit_{hid}" for hid in habit_ids])
+    for row in rows:
+        done = {hr["habit_id"]: 1 if hr["done"] else 0 for hr in row["habit_results"]}
+        writer.writerow([row["date"], row["mood"], row["note"] or ""] + [done[hid] for hid in habit_ids])
+    return out.getvalue()
+
+
+def per_row(client) -> float:
+    headers, habit_ids = _user(client, "per_row")
+    t0 = time.perf_counter()
+    for row in _history(habit_ids):
+        assert client.post("/checkins", headers=headers, json=row).status_code == 200
+    return ROWS / (time.perf_counter() - t0)
+
+
+def bulk(client, fmt: str) -> tuple:
+    headers, habit_ids = _user(client, fmt)
+    rows = list(_history(habit_ids))
+    if fmt == "ndjson":
+        body, content_type = "".join(json.dumps(r) + "\n" for r in rows), "application/x-ndjson"
+    else:
+        body, content_type = _csv(rows, habit_ids), "text/csv"
+    t0 = time.perf_counter()
+    resp = client.post("/checkins/import", content=body, headers={**headers, "Content-Type": content_type})
+    elapsed = time.perf_counter() - t0
+    report = resp.json()
+    assert resp.status_code == 200 and report["imported"] == ROWS, report
+    return ROWS / elapsed, report["rows_per_sec"]
+
+
+def main() -> None:
+    with TestClient(app) as client:
+        results = [("POST /checkins per row", per_row(client), None)]
+        for fmt in ("ndjson", "csv"):
+            results.append((f"POST /checkins/import ({fmt})", *bulk(client, fmt)))
+
+    base = results[0][1]
+    print(f"{ROWS} check-ins x {HABITS} habits")
+    print(f"{'variant':<32} {'rows/s':>10} {'server rows/s':>14} {'speedup':>8}")
+    for name, rate, server in results:
+        server_col = f"{server:>14.0f}" if server is not None else f"{'-':>14}"
+        print(f"{name:<32} {rate:>10.0f} {server_col} {rate / base:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
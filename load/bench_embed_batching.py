@@ -0,0 +1,83 @@
+"""
+Benchmark: embedding throughput with the shared MicroBatchEncoder at different batch sizes.
+
+N client threads each call encode([text]) repeatedly (the RagStore.embed_text pattern).
+Batch size 1 is the unbatched baseline.
+
+By default uses a fake model whose cost is a fixed per-call overhead plus a small
+per-text cost, which is the shape that makes batching pay off. Set USE_REAL_MODEL=1 to
+load EMBED_MODEL_NAME with sentence-transformers instead.
+
+    python -m load.bench_embed_batching
+    USE_REAL_MODEL=1 THREADS=32 CALLS=20 python -m load.bench_embed_batching
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.embedding_batcher import MicroBatchEncoder
+
+THREADS = int(os.getenv("THREADS", "32"))
+CALLS = int(os.getenv("CALLS", "50"))
+BATCH_SIZES = [int(x) for x in os.getenv("BATCH_SIZES", "1,8,32,64").split(",")]
+MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+
+class FakeModel:
+    """
+    ~2ms fixed overhead per encode() call + 0.05ms per text. Calls are serialized, like
+    one CPU-bound forward pass saturating the cores it has.
+    """
+
+    def __init__(self):
+        self._device = threading.Lock()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 384
+
+    def encode(self, texts, normalize_embeddings=False):
+        with self._device:
+            time.sleep(0.002 + 0.00005 * len(texts))
+        return np.zeros((len(texts), 384), dtype="float32")
+
+
+def _load_model():
+    if os.getenv("USE_REAL_MODEL", "0") == "1":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(os.getenv("EMBED_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2"))
+    return FakeModel()
+
+
+def _run(encoder) -> float:
+    barrier = threading.Barrier(THREADS)
+
+    def client(tid: int) -> None:
+        barrier.wait()
+        for i in range(CALLS):
+            encoder.encode([f"thread {tid} note {i}: slept well, walked, felt calm"])
+
+    threads = [threading.Thread(target=client, args=(t,)) for t in range(THREADS)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return (THREADS * CALLS) / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    model = _load_model()
+    print(f"threads={THREADS} calls/thread={CALLS} max_wait_ms={MAX_WAIT_MS}")
+    print(f"{'batch size':>10} {'texts/sec':>10} {'avg batch':>10}")
+    for size in BATCH_SIZES:
+        encoder = model if size <= 1 else MicroBatchEncoder(model, max_batch_size=size, max_wait_ms=MAX_WAIT_MS)
+        rate = _run(encoder)
+        avg = (encoder.texts / encoder.batches) if isinstance(encoder, MicroBatchEncoder) and encoder.batches else 1.0
+        print(f"{size:>10} {rate:>10.0f} {avg:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
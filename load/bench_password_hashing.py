@@ -0,0 +1,74 @@
+"""
+Benchmark: password verification throughput (logins/sec) with and without the hash pool.
+
+Runs N concurrent "login" threads, each verifying a pbkdf2_sha256 hash through a
+PasswordHasher, and reports logins/sec, logins/sec per busy core, and how long a trivial
+unrelated task waits on the same thread pool meanwhile (what other routes feel during
+a login burst).
+
+    python -m load.bench_password_hashing
+    LOGINS=400 CONCURRENCY=32 WORKER_COUNTS=0,1,2 PASSWORD_HASH_ROUNDS=29000 python -m load.bench_password_hashing
+
+WORKER_COUNTS: 0 = hash inline on the request threads (the old behaviour).
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.password_hashing import DEFAULT_ROUNDS, PasswordHasher, PasswordHashPoolFull
+
+LOGINS = int(os.getenv("LOGINS", "200"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "16"))
+ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", str(DEFAULT_ROUNDS)))
+CPUS = os.cpu_count() or 1
+WORKER_COUNTS = [int(x) for x in os.getenv("WORKER_COUNTS", ",".join(map(str, sorted({0, 1, CPUS})))).split(",") if x.strip()]
+
+
+def _run(workers: int) -> dict:
+    hasher = PasswordHasher(workers=workers, max_pending=CONCURRENCY + 1, rounds=ROUNDS)
+    hashed = hasher.hash("pw123456")  # also starts the pool before timing
+    rejected = 0
+
+    def login(_):
+        nonlocal rejected
+        try:
+            assert hasher.verify_and_update("pw123456", hashed)[0]
+        except PasswordHashPoolFull:
+            rejected += 1
+
+    # The same pool size Starlette gives sync routes would be 40; CONCURRENCY threads stand in.
+    with ThreadPoolExecutor(max_workers=CONCURRENCY + 1) as pool:
+        t0 = time.perf_counter()
+        futures = [pool.submit(login, i) for i in range(LOGINS)]
+        probe_waits = []
+        while not all(f.done() for f in futures):
+            p0 = time.perf_counter()
+            pool.submit(lambda: None).result()
+            probe_waits.append((time.perf_counter() - p0) * 1000)
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - t0
+    hasher.shutdown()
+
+    cores = min(workers, CPUS) if workers else min(CONCURRENCY, CPUS)
+    rate = (LOGINS - rejected) / elapsed
+    probe_waits.sort()
+    return {
+        "workers": workers,
+        "rate": rate,
+        "per_core": rate / cores,
+        "probe_p50": probe_waits[len(probe_waits) // 2] if probe_waits else 0.0,
+        "rejected": rejected,
+    }
+
+
+def main() -> None:
+    print(f"{LOGINS} logins, {CONCURRENCY} concurrent, pbkdf2_sha256 rounds={ROUNDS}, {CPUS} CPU(s)")
+    print(f"{'workers':>8} {'logins/s':>9} {'per core':>9} {'probe p50 ms':>13} {'rejected':>9}")
+    for workers in WORKER_COUNTS:
+        r = _run(workers)
+        label = "inline" if workers == 0 else str(workers)
+        print(f"{label:>8} {r['rate']:>9.1f} {r['per_core']:>9.1f} {r['probe_p50']:>13.2f} {r['rejected']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: RagStore.query_reflections latency vs. number of stored reflections.
+
+Compares a cold query (per-user FAISS index rebuilt from SQL, i.e. the old behavior on
+every request) with a warm query (index served from the in-process LRU cache).
+
+Uses an in-memory SQLite DB and a deterministic fake embedder so it runs without
+downloading a sentence-transformers model.
+
+    python -m load.bench_rag_index_cache
+    COUNTS=100,1000,10000 REPEAT=50 python -m load.bench_rag_index_cache
+"""
+import hashlib
+import os
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.db import Base
+from app.rag_store import RagStore, _normalize_rows
+
+DIM = int(os.getenv("DIM", "384"))
+COUNTS = [int(x) for x in os.getenv("COUNTS", "100,1000,5000,20000").split(",")]
+REPEAT = int(os.getenv("REPEAT", "30"))
+
+
+class FakeEmbedder:
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+
+    def encode(self, texts, normalize_embeddings=False):
+        out = []
+        for t in texts:
+            seed = int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:4], "little")
+            out.append(np.random.default_rng(seed).standard_normal(DIM).astype("float32"))
+        return np.vstack(out)
+
+
+def _seed(db, user_id: int, n: int) -> None:
+    db.add(models.User(id=user_id, email=f"bench{user_id}@example.com", hashed_password="x"))
+    rng = np.random.default_rng(user_id)
+    vecs = _normalize_rows(rng.standard_normal((n, DIM)).astype("float32"))
+    start = date(2000, 1, 1)
+    for i in range(n):
+        c = models.Checkin(id=user_id * 1_000_000 + i, user_id=user_id, date=start + timedelta(days=i), mood=3)
+        db.add(c)
+        db.add(
+            models.ReflectionEmbedding(
+                user_id=user_id,
+                checkin_id=c.id,
+                checkin_date=c.date,
+                text=f"note {i}",
+                embedding=vecs[i].tobytes(),
+            )
+        )
+    db.commit()
+
+
+def _time_ms(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def main() -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    store = RagStore(FakeEmbedder())
+
+    print(f"{'reflections':>12} {'cold p50 ms':>12} {'warm p50 ms':>12} {'speedup':>8}")
+    for user_id, n in enumerate(COUNTS, start=1):
+        db = Session()
+        try:
+            _seed(db, user_id, n)
+
+            def query():
+                store.query_reflections(db=db, user_id=user_id, query_text="slept badly, skipped walk", k=5)
+
+            cold = []
+            for _ in range(REPEAT):
+                store.index_cache.invalidate(user_id)
+                cold.append(_time_ms(query))
+
+            query()
+            warm = [_time_ms(query) for _ in range(REPEAT)]
+
+            c50, w50 = statistics.median(cold), statistics.median(warm)
+            print(f"{n:>12} {c50:>12.2f} {w50:>12.2f} {c50 / w50:>7.1f}x")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
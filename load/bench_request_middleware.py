@@ -0,0 +1,140 @@
+"""
+Benchmark: per-request overhead of the request logging middleware.
+
+Calls a minimal FastAPI app directly over ASGI (no sockets, no TestClient) and reports
+the mean time per request for:
+  - no middleware (baseline)
+  - the previous BaseHTTPMiddleware implementation, logging through a StreamHandler
+  - the current pure-ASGI RequestLoggingMiddleware, logging through QueueHandler/QueueListener
+  - the same with LOG_SAMPLE_RATE_2XX=0.1
+
+Log output goes to /dev/null so only the handler cost is measured, not the terminal.
+
+    python -m load.bench_request_middleware
+    REQUESTS=20000 python -m load.bench_request_middleware
+"""
+import asyncio
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.observability.logging_config import build_formatter
+from app.observability.middleware import RequestLoggingMiddleware
+
+REQUESTS = int(os.getenv("REQUESTS", "5000"))
+logger = logging.getLogger("mindgarden.request")
+
+
+class BaseHTTPRequestLogging(BaseHTTPMiddleware):
+    """The middleware as it was before the ASGI rewrite (kept here for comparison)."""
+
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            logger.info(
+                "request",
+                extra={
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status_code": status_code,
+                    "duration_ms": int((time.perf_counter() - start) * 1000),
+                    "user_id": getattr(request.state, "user_id", None),
+                },
+            )
+
+
+def _app(middleware=None, **kwargs) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping/{item_id}")
+    async def ping(item_id: int):
+        return {"item_id": item_id}
+
+    if middleware is not None:
+        app.add_middleware(middleware, **kwargs)
+    return app
+
+
+async def _call(app, path: str) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def _time(app) -> float:
+    for i in range(200):  # warm-up (route compilation, first-call imports)
+        await _call(app, f"/ping/{i}")
+    t0 = time.perf_counter()
+    for i in range(REQUESTS):
+        await _call(app, f"/ping/{i}")
+    return (time.perf_counter() - t0) / REQUESTS * 1e6
+
+
+def _use_handler(handler: logging.Handler) -> None:
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+async def main() -> None:
+    devnull = open(os.devnull, "w")
+    stream = logging.StreamHandler(devnull)
+    stream.setFormatter(build_formatter("text"))
+
+    results = []
+    results.append(("no middleware", await _time(_app())))
+
+    _use_handler(stream)
+    results.append(("BaseHTTPMiddleware + StreamHandler", await _time(_app(BaseHTTPRequestLogging))))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, stream)
+    listener.start()
+    _use_handler(logging.handlers.QueueHandler(records))
+    try:
+        results.append(("ASGI + QueueHandler", await _time(_app(RequestLoggingMiddleware, sample_rate_2xx=1.0))))
+        results.append(("ASGI + QueueHandler, 10% 2xx sampled", await _time(_app(RequestLoggingMiddleware, sample_rate_2xx=0.1))))
+    finally:
+        listener.stop()
+        devnull.close()
+
+    base = results[0][1]
+    print(f"{REQUESTS} requests per variant")
+    print(f"{'variant':<40} {'us/req':>8} {'overhead us':>12}")
+    for name, us in results:
+        print(f"{name:<40} {us:>8.1f} {us - base:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
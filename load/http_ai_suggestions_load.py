@@ -0,0 +1,184 @@
+"""
+Load test: /ai/suggestions throughput across concurrency levels.
+
+Against a running server:
+    BASE_URL=http://localhost:8000 python -m load.http_ai_suggestions_load
+
+Without BASE_URL it starts a server subprocess on a throwaway SQLite DB (rules provider)
+and stops it afterwards. With FAKE_EMBED_MS > 0 that server has RAG on, backed by a fake
+embedder whose encode() blocks for that long without holding the GIL (like a real model
+forward pass), and the query-embedding cache off, so every request pays for one encode.
+
+Env: CONCURRENCY_LEVELS (default "1,4,16,64"), REQUESTS_PER_LEVEL (default 256),
+TIMEOUT_S (default 30), FAKE_EMBED_MS (default 0).
+
+Each user may call /ai/suggestions 30 times an hour, so the script signs up enough users
+and spreads requests across them round-robin.
+"""
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+LEVELS = [int(x) for x in os.getenv("CONCURRENCY_LEVELS", "1,4,16,64").split(",") if x.strip()]
+REQUESTS_PER_LEVEL = int(os.getenv("REQUESTS_PER_LEVEL", "256"))
+TIMEOUT_S = float(os.getenv("TIMEOUT_S", "30"))
+FAKE_EMBED_MS = float(os.getenv("FAKE_EMBED_MS", "0"))
+PER_USER_LIMIT = 30
+
+
+class SlowFakeEmbedder:
+    """Deterministic vectors; encode() sleeps to stand in for model inference."""
+
+    DIM = 384
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.DIM
+
+    def encode(self, texts, normalize_embeddings=False):
+        import numpy as np
+
+        time.sleep(FAKE_EMBED_MS / 1000.0)
+        out = np.zeros((len(texts), self.DIM), dtype="float32")
+        for i, t in enumerate(texts):
+            out[i, hash(t) % self.DIM] = 1.0
+        return out
+
+
+def _serve(port: int) -> None:
+    """Server-process entry point (see _spawn_server)."""
+    import uvicorn
+
+    if FAKE_EMBED_MS > 0:
+        from app import embedding_model
+
+        embedding_model._EMBEDDER = SlowFakeEmbedder()
+    from app.main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn_server() -> tuple:
+    tmp = tempfile.mkdtemp()
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DB_URL": f"sqlite:///{os.path.join(tmp, 'load.db')}",
+        "AI_PROVIDER": os.getenv("AI_PROVIDER", "rules"),
+        "RAG_ENABLED": "1" if FAKE_EMBED_MS > 0 else "0",
+        "EMBED_CACHE_MAX_ENTRIES": "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    proc = subprocess.Popen([sys.executable, "-m", "load.http_ai_suggestions_load", "--serve", str(port)], env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/healthz", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("server did not start")
+
+
+async def _make_users(client: httpx.AsyncClient, base_url: str, n: int) -> list:
+    headers = []
+    today = date.today()
+    for i in range(n):
+        email = f"load{i}_{time.time_ns()}@example.com"
+        r = await client.post(f"{base_url}/auth/signup", json={"email": email, "password": "pw123456"})
+        r.raise_for_status()
+        h = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        for d in range(3):
+            await client.post(
+                f"{base_url}/checkins",
+                headers=h,
+                json={
+                    "date": str(today - timedelta(days=d)),
+                    "mood": 3 + d % 2,
+                    "note": f"user {i} day {d}: short walk, ok sleep",
+                    "habit_results": [],
+                },
+            )
+        headers.append(h)
+    return headers
+
+
+async def _run_level(client: httpx.AsyncClient, base_url: str, users: list, concurrency: int) -> dict:
+    user_cycle = itertools.cycle(users)
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(f"{base_url}/ai/suggestions", headers=next(user_cycle), timeout=TIMEOUT_S)
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append((time.perf_counter() - t0) * 1000)
+            errors += 0 if ok else 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(REQUESTS_PER_LEVEL)))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rps": REQUESTS_PER_LEVEL / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "errors": errors,
+    }
+
+
+async def main() -> None:
+    proc = None
+    base_url = os.getenv("BASE_URL", "").rstrip("/")
+    if not base_url:
+        proc, base_url = _spawn_server()
+    try:
+        limits = httpx.Limits(max_connections=max(LEVELS), max_keepalive_connections=max(LEVELS))
+        async with httpx.AsyncClient(limits=limits) as client:
+            # Each level gets its own users so the rate limiter never kicks in.
+            per_level = -(-REQUESTS_PER_LEVEL // PER_USER_LIMIT)
+            n_users = per_level * len(LEVELS)
+            print(f"signing up {n_users} users against {base_url} ...")
+            users = await _make_users(client, base_url, n_users)
+            if FAKE_EMBED_MS > 0:
+                await asyncio.sleep(2)  # let the embedding queue index the seeded notes
+
+            print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+            for i, level in enumerate(LEVELS):
+                res = await _run_level(client, base_url, users[i * per_level : (i + 1) * per_level], level)
+                print(f"{res['concurrency']:>11} {res['rps']:>8.1f} {res['p50']:>8.1f} {res['p95']:>8.1f} {res['errors']:>7}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--serve":
+        _serve(int(sys.argv[2]))
+    else:
+        asyncio.run(main())
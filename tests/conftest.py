@@ -11,8 +11,16 @@ os.environ["DB_URL"] = "sqlite:///./test.db"
 # Prevent RAG/model downloads during tests
 os.environ.setdefault("RAG_ENABLED", "0")
 
+# Hash passwords inline: a process pool per TestClient lifespan would dominate test time.
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
 from app.main import app  # noqa: E402
 from app.db import Base, engine  # noqa: E402
+from app.observability.rate_limit import set_rate_limit_backend  # noqa: E402
+from app.observability.registry import get_registry  # noqa: E402
+from app.observability.rollups import get_rollup_accumulator  # noqa: E402
+from app.security import user_identity_cache  # noqa: E402
+from app.services.suggestion_cache import get_suggestion_cache  # noqa: E402
 
 
 @pytest.fixture()
@@ -20,6 +28,12 @@ def client():
     # Fresh schema per test to avoid state bleed
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # User ids restart at 1 with the fresh schema; drop per-user in-process state too.
+    set_rate_limit_backend(None)
+    user_identity_cache.clear()
+    get_suggestion_cache().clear()
+    get_rollup_accumulator().clear()
+    get_registry().reset()
 
     # Using TestClient as a context manager ensures FastAPI lifespan runs too
     with TestClient(app) as c:
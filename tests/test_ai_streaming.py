@@ -0,0 +1,143 @@
+# tests/test_ai_streaming.py
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import models
+from app.db import SessionLocal
+from app.services import ollama_client
+
+
+class StreamingStubOllama:
+    """Answers POST /api/generate with Ollama's NDJSON stream format."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                lines = [json.dumps({"response": t, "done": False}) for t in stub.tokens]
+                lines.append(json.dumps({"response": "", "done": True}))
+                body = ("\n".join(lines) + "\n").encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _events(text):
+    out = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def _headers(client, email, upgrade=False):
+    client.post("/auth/signup", json={"email": email, "password": "strongpassword123"})
+    token = client.post("/auth/login", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/checkins", headers=headers, json={"date": str(date.today()), "mood": 4, "habit_results": []})
+    if upgrade:
+        client.post("/upgrade", headers=headers)
+    return headers
+
+
+@pytest.fixture()
+def ollama(monkeypatch):
+    stubs = []
+
+    def start(tokens):
+        stub = StreamingStubOllama(tokens)
+        stubs.append(stub)
+        monkeypatch.setenv("AI_PROVIDER", "hybrid")
+        monkeypatch.setenv("OLLAMA_URL", stub.url)
+        return stub
+
+    yield start
+    ollama_client._CLIENT = None
+    for stub in stubs:
+        stub.close()
+
+
+def test_suggestion_stream_forwards_tokens_and_records_ttfb(client, ollama):
+    ollama(["Walk ", "for ten minutes. ", "Then log it."])
+    headers = _headers(client, "stream1@example.com")
+
+    resp = client.get("/ai/suggestions/stream", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(resp.text)
+    assert [e for e, _ in events] == ["token", "token", "token", "done"]
+    assert "".join(d["text"] for e, d in events if e == "token") == "Walk for ten minutes. Then log it."
+    done = events[-1][1]
+    assert done["provider"] == "ollama"
+    assert done["text"] == "Walk for ten minutes. Then log it."
+    assert done["tone"] in ("gentle", "neutral", "pushy")
+
+    db = SessionLocal()
+    try:
+        event = db.query(models.AIRequestEvent).one()
+    finally:
+        db.close()
+    assert event.endpoint == "/ai/suggestions/stream"
+    assert event.provider == "ollama"
+    assert event.ttfb_ms is not None and event.ttfb_ms <= event.latency_ms
+
+
+def test_suggestion_stream_replaces_text_when_guard_trips(client, ollama):
+    ollama(["One. ", "Two. ", "Three. ", "Four."])
+    headers = _headers(client, "stream2@example.com")
+
+    events = _events(client.get("/ai/suggestions/stream", headers=headers).text)
+    kinds = [e for e, _ in events]
+    assert kinds == ["token", "token", "replace", "done"]
+    assert events[-1][1]["provider"] == "rules"
+    assert events[-1][1]["text"] == events[2][1]["text"]
+    assert "Three" not in events[-1][1]["text"]
+
+
+def test_suggestion_stream_without_ollama_sends_rules_text(client, monkeypatch):
+    monkeypatch.setenv("AI_PROVIDER", "rules")
+    headers = _headers(client, "stream3@example.com")
+
+    events = _events(client.get("/ai/suggestions/stream", headers=headers).text)
+    assert [e for e, _ in events] == ["token", "done"]
+    assert events[0][1]["text"] == events[1][1]["text"]
+    assert events[1][1]["provider"] == "rules"
+
+
+def test_deep_dive_stream_is_premium_only(client, ollama):
+    ollama(["Focus on sleep. ", "Protect one evening routine."])
+    free = _headers(client, "stream4@example.com")
+    assert client.post("/ai/deep_dive/stream", headers=free, json={"topic": "sleep"}).status_code == 403
+
+    premium = _headers(client, "stream5@example.com", upgrade=True)
+    resp = client.post("/ai/deep_dive/stream", headers=premium, json={"topic": "sleep"})
+    assert resp.status_code == 200
+    done = _events(resp.text)[-1][1]
+    assert done == {
+        "topic": "sleep",
+        "text": "Focus on sleep. Protect one evening routine.",
+        "provider": "ollama",
+    }
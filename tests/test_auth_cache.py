@@ -0,0 +1,57 @@
+# tests/test_auth_cache.py
+import uuid
+
+from sqlalchemy import event
+
+from app.db import engine
+from app.security import user_identity_cache
+
+
+def _signup(client) -> dict:
+    r = client.post(
+        "/auth/signup",
+        json={"email": f"authc_{uuid.uuid4().hex[:8]}@example.com", "password": "strongpassword123"},
+    )
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _user_selects(client, method, path, headers, **kwargs):
+    statements = []
+
+    def on_exec(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", on_exec)
+    try:
+        resp = getattr(client, method)(path, headers=headers, **kwargs)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_exec)
+    assert resp.status_code < 500, resp.text
+    return resp, [s for s in statements if "FROM users" in s]
+
+
+def test_user_is_loaded_from_db_once_then_served_from_cache(client):
+    headers = _signup(client)
+
+    _resp, first = _user_selects(client, "get", "/habits", headers)
+    assert len(first) == 1
+
+    _resp, second = _user_selects(client, "get", "/habits", headers)
+    assert second == []
+
+    # Rate-limited route resolves the user for both the route and the limiter: still one lookup
+    user_identity_cache.clear()
+    _resp, ai = _user_selects(client, "get", "/ai/suggestions", headers)
+    assert len(ai) == 1
+
+
+def test_upgrade_invalidates_cached_tier(client):
+    headers = _signup(client)
+    assert client.post("/ai/deep_dive", json={"topic": "sleep"}, headers=headers).status_code == 403
+
+    r = client.post("/upgrade", headers=headers)
+    assert r.status_code == 200, r.text
+    assert r.json()["subscription_tier"] == "premium"
+
+    assert client.post("/ai/deep_dive", json={"topic": "sleep"}, headers=headers).status_code == 200
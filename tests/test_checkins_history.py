@@ -0,0 +1,112 @@
+# tests/test_checkins_history.py
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from app.db import engine
+
+
+def _user(client, email="history@example.com"):
+    token = client.post("/auth/signup", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    habit_id = client.post("/habits", json={"name": "Sleep"}, headers=headers).json()["id"]
+    return headers, habit_id
+
+
+def _checkins(client, headers, habit_id, days):
+    start = date(2025, 1, 1)
+    for i in range(days):
+        body = {
+            "date": str(start + timedelta(days=i)),
+            "mood": 1 + i % 5,
+            "note": f"note {i}",
+            "habit_results": [{"habit_id": habit_id, "done": i % 2 == 0}],
+        }
+        assert client.post("/checkins", headers=headers, json=body).status_code == 200
+
+
+def test_range_and_keyset_pages_cover_every_day_once(client):
+    headers, habit_id = _user(client)
+    _checkins(client, headers, habit_id, 10)
+
+    seen, url, pages = [], "/checkins?start=2025-01-02&end=2025-01-08&limit=3", 0
+    while url:
+        resp = client.get(url, headers=headers)
+        assert resp.status_code == 200
+        seen += [c["date"] for c in resp.json()["checkins"]]
+        link = resp.headers.get("link")
+        url = link[1 : link.index(">")] if link else None
+        pages += 1
+    assert pages == 3
+    assert seen == [str(date(2025, 1, d)) for d in range(2, 9)]
+
+    page = client.get("/checkins?after_date=2025-01-08", headers=headers).json()
+    assert page["next_after_date"] is None
+    first = page["checkins"][0]
+    assert first == {
+        "id": first["id"],
+        "date": "2025-01-09",
+        "mood": 4,
+        "note": "note 8",
+        "habit_results": [{"habit_id": habit_id, "done": True}],
+    }
+
+
+def test_fields_projection(client):
+    headers, habit_id = _user(client)
+    _checkins(client, headers, habit_id, 3)
+
+    calendar = client.get("/checkins?fields=mood", headers=headers).json()
+    assert calendar["checkins"] == [
+        {"date": "2025-01-01", "mood": 1},
+        {"date": "2025-01-02", "mood": 2},
+        {"date": "2025-01-03", "mood": 3},
+    ]
+    with_results = client.get("/checkins?fields=date,habit_results&limit=1", headers=headers).json()
+    assert with_results["checkins"] == [{"date": "2025-01-01", "habit_results": [{"habit_id": habit_id, "done": True}]}]
+    assert with_results["next_after_date"] == "2025-01-01"
+
+    assert client.get("/checkins?fields=mood,secret", headers=headers).status_code == 400
+
+
+def test_habit_results_load_in_one_query_per_page(client):
+    headers, habit_id = _user(client)
+    _checkins(client, headers, habit_id, 20)
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if "checkin_habit_results" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        assert len(client.get("/checkins?limit=20", headers=headers).json()["checkins"]) == 20
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    assert len(statements) == 1
+
+
+def test_conditional_requests(client):
+    headers, habit_id = _user(client)
+    _checkins(client, headers, habit_id, 2)
+
+    first = client.get("/checkins?fields=mood", headers=headers)
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+    assert client.get("/checkins?fields=mood", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get("/checkins?fields=mood", headers={**headers, "If-Modified-Since": last_modified}).status_code == 304
+    # Another projection is another representation.
+    assert client.get("/checkins", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    client.post("/checkins", headers=headers, json={"date": "2025-02-01", "mood": 5, "habit_results": []})
+    again = client.get("/checkins?fields=mood", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 200
+    assert again.headers["etag"] != etag
+    assert len(again.json()["checkins"]) == 3
+
+
+def test_only_own_checkins(client):
+    headers, habit_id = _user(client)
+    _checkins(client, headers, habit_id, 2)
+    other, _ = _user(client, "other@example.com")
+    assert client.get("/checkins", headers=other).json() == {"checkins": [], "next_after_date": None}
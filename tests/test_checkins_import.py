@@ -0,0 +1,153 @@
+# tests/test_checkins_import.py
+import json
+from datetime import date, timedelta
+
+from app import models
+from app.db import SessionLocal
+
+
+def _user(client, email="import@example.com"):
+    token = client.post("/auth/signup", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    habit_ids = [client.post("/habits", json={"name": n}, headers=headers).json()["id"] for n in ("Sleep", "Study")]
+    return headers, habit_ids
+
+
+def _ndjson(rows):
+    return "\n".join(json.dumps(r) for r in rows) + "\n"
+
+
+def _import(client, headers, body, content_type="application/x-ndjson", **params):
+    return client.post(
+        "/checkins/import", params=params, content=body, headers={**headers, "Content-Type": content_type}
+    )
+
+
+def test_ndjson_import_writes_checkins_results_and_recomputes_streaks(client):
+    headers, (sleep, study) = _user(client)
+    today = date.today()
+    rows = [
+        {
+            "date": str(today - timedelta(days=d)),
+            "mood": 1 + d % 5,
+            "note": f"day {d}" if d % 2 == 0 else None,
+            "habit_results": [{"habit_id": sleep, "done": True}, {"habit_id": study, "done": d < 2}],
+        }
+        for d in range(30)
+    ]
+
+    resp = _import(client, headers, _ndjson(rows))
+    assert resp.status_code == 200, resp.text
+    report = resp.json()
+    assert (report["received"], report["imported"], report["skipped"], report["failed"]) == (30, 30, 0, 0)
+    assert report["rows_per_sec"] > 0
+
+    db = SessionLocal()
+    try:
+        assert db.query(models.Checkin).count() == 30
+        assert db.query(models.CheckinHabitResult).count() == 60
+        states = {s.habit_id: s for s in db.query(models.HabitStreakState).all()}
+        assert (states[sleep].current_streak, states[sleep].last_done_date) == (30, today)
+        assert states[study].current_streak == 2
+        snapshot = db.query(models.UserFeatureSnapshot).one()
+        assert snapshot.mood_count == 7
+        assert db.query(models.Insight).filter(models.Insight.date == today).count() == 1
+    finally:
+        db.close()
+
+    insights = client.get("/insights/today", headers=headers).json()
+    streaks = {h["habit_id"]: h["streak"] for h in json.loads(insights["habit_streaks_json"])["habits"]}
+    assert streaks == {sleep: 30, study: 2}
+
+
+def test_existing_days_are_skipped_and_bad_rows_reported(client):
+    headers, (sleep, _study) = _user(client)
+    client.post("/checkins", headers=headers, json={"date": "2025-01-02", "mood": 5, "note": "kept", "habit_results": []})
+
+    body = "\n".join(
+        [
+            json.dumps({"date": "2025-01-01", "mood": 3, "habit_results": [{"habit_id": sleep, "done": True}]}),
+            json.dumps({"date": "2025-01-02", "mood": 1, "note": "ignored", "habit_results": []}),
+            json.dumps({"date": "2025-01-03", "mood": 9, "habit_results": []}),
+            "{not json",
+            json.dumps({"date": "2025-01-04", "mood": 2, "habit_results": [{"habit_id": 9999, "done": True}]}),
+            json.dumps({"date": "2025-01-01", "mood": 2, "habit_results": []}),
+        ]
+    )
+    report = _import(client, headers, body).json()
+    assert (report["received"], report["imported"], report["skipped"], report["failed"]) == (6, 1, 1, 4)
+    assert [e["line"] for e in report["errors"]] == [3, 4, 5, 6]
+    assert "mood" in report["errors"][0]["detail"]
+    assert "9999" in report["errors"][2]["detail"]
+    assert "Duplicate date" in report["errors"][3]["detail"]
+
+    db = SessionLocal()
+    try:
+        kept = db.query(models.Checkin).filter(models.Checkin.date == date(2025, 1, 2)).one()
+        assert (kept.mood, kept.note) == (5, "kept")
+    finally:
+        db.close()
+
+    # Re-importing the same payload is a no-op.
+    again = _import(client, headers, body).json()
+    assert (again["imported"], again["skipped"]) == (0, 2)
+
+
+def test_csv_import_with_habit_columns(client):
+    headers, (sleep, study) = _user(client)
+    body = (
+        f"date,mood,note,habit_{sleep},habit_{study}\r\n"
+        f'2025-03-01,4,"walked, then ""slept""\nwell",1,0\r\n'
+        f"2025-03-02,2,,yes,\r\n"
+        f"2025-03-03,3,,maybe,1\r\n"
+    )
+    report = _import(client, headers, body, content_type="text/csv").json()
+    assert (report["imported"], report["failed"]) == (2, 1)
+    assert report["errors"][0]["line"] == 5  # the quoted note spans two physical lines
+
+    db = SessionLocal()
+    try:
+        first = db.query(models.Checkin).filter(models.Checkin.date == date(2025, 3, 1)).one()
+        assert first.note == 'walked, then "slept"\nwell'
+        assert {(r.habit_id, r.done) for r in first.habit_results} == {(sleep, True), (study, False)}
+        second = db.query(models.Checkin).filter(models.Checkin.date == date(2025, 3, 2)).one()
+        assert [(r.habit_id, r.done) for r in second.habit_results] == [(sleep, True)]
+    finally:
+        db.close()
+
+
+def test_rejects_unusable_payloads(client, monkeypatch):
+    headers, _ = _user(client)
+    assert _import(client, headers, "x", content_type="application/json").status_code == 415
+    assert _import(client, headers, "when,mood\n", content_type="text/csv").status_code == 400
+    assert _import(client, headers, "date,mood,colour\n", content_type="text/csv").status_code == 400
+
+    monkeypatch.setenv("CHECKIN_IMPORT_MAX_BYTES", "10")
+    resp = _import(client, headers, json.dumps({"date": "2025-01-01", "mood": 3}), format="ndjson")
+    assert resp.status_code == 413
+
+
+def test_notes_are_queued_for_embedding_in_one_batch(client, monkeypatch):
+    import app.checkin_import as checkin_import
+    import app.routes_checkins as routes_checkins
+
+    submitted = []
+
+    class _Queue:
+        def submit(self, checkin_id):
+            submitted.append(checkin_id)
+            return len(submitted) < 2  # full after two: the rest wait for the sweep
+
+    monkeypatch.setattr(checkin_import, "rag_enabled", lambda: True)
+    monkeypatch.setattr(routes_checkins, "get_embedding_queue", lambda: _Queue())
+    headers, _ = _user(client)
+    rows = [{"date": f"2025-02-0{d}", "mood": 3, "note": "   " if d == 2 else f"note {d}"} for d in range(1, 6)]
+    assert _import(client, headers, _ndjson(rows)).json()["imported"] == 5
+
+    db = SessionLocal()
+    try:
+        pending = db.query(models.PendingEmbedding.checkin_id).all()
+        assert len(pending) == 4
+        assert submitted == sorted(cid for (cid,) in pending)[:2]
+    finally:
+        db.close()
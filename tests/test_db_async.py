@@ -0,0 +1,78 @@
+# tests/test_db_async.py
+import asyncio
+import threading
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.db import Base, configure_sqlite, engine
+from app.db_async import AsyncSessionLocal, async_url, dispose_async_engine, get_async_db
+
+
+def test_async_url_maps_drivers():
+    assert async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert async_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert async_url("postgresql+psycopg2://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert async_url("postgresql+asyncpg://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+
+
+def test_sqlite_pragmas_applied_on_connect():
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_async_session_reads_what_the_sync_layer_wrote(client):
+    client.post("/auth/signup", json={"email": "async@example.com", "password": "strongpassword123"})
+
+    async def run():
+        try:
+            gen = get_async_db()
+            db = await gen.__anext__()
+            try:
+                email = (await db.execute(select(models.User.email))).scalar_one()
+                mode = (await db.execute(text("PRAGMA journal_mode"))).scalar_one()
+            finally:
+                await gen.aclose()
+            async with AsyncSessionLocal() as db2:
+                count = (await db2.execute(text("SELECT COUNT(*) FROM users"))).scalar_one()
+            return email, mode, count
+        finally:
+            await dispose_async_engine()
+
+    assert asyncio.run(run()) == ("async@example.com", "wal", 1)
+    assert client.get("/healthz").json() == {"status": "ok", "db_ok": True}
+
+
+def test_concurrent_writers_do_not_hit_database_locked(tmp_path):
+    eng = create_engine(f"sqlite:///{tmp_path / 'w.db'}", connect_args={"check_same_thread": False})
+    configure_sqlite(eng)
+    Base.metadata.create_all(bind=eng)
+    Session = sessionmaker(bind=eng)
+    errors = []
+
+    def writer(n):
+        db = Session()
+        try:
+            user = models.User(email=f"w{n}@example.com", hashed_password="x")
+            db.add(user)
+            db.commit()
+            for i in range(20):
+                db.add(models.Habit(user_id=user.id, name=f"h{i}"))
+                db.commit()
+                db.query(models.Habit).filter(models.Habit.user_id == user.id).count()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    eng.dispose()
+
+    assert errors == []
@@ -0,0 +1,140 @@
+# tests/test_embedding_batcher.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.embedding_batcher import MicroBatchEncoder, maybe_batched
+from tests.test_rag_store import FakeEmbedder
+
+
+class RecordingEmbedder(FakeEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def encode(self, texts, normalize_embeddings=False):
+        self.batch_sizes.append(len(texts))
+        return super().encode(texts, normalize_embeddings=normalize_embeddings)
+
+
+def test_concurrent_calls_are_coalesced_and_fanned_back_out():
+    inner = RecordingEmbedder()
+    encoder = MicroBatchEncoder(inner, max_batch_size=64, max_wait_ms=50)
+    texts = [f"note {i}" for i in range(20)]
+    results = {}
+    barrier = threading.Barrier(len(texts))
+
+    def call(t):
+        barrier.wait()
+        results[t] = encoder.encode([t])
+
+    threads = [threading.Thread(target=call, args=(t,)) for t in texts]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    reference = FakeEmbedder()
+    for t in texts:
+        np.testing.assert_allclose(results[t], reference.encode([t]))
+    assert sum(inner.batch_sizes) == len(texts)
+    assert len(inner.batch_sizes) < len(texts)
+
+
+def test_batch_never_exceeds_max_size():
+    inner = RecordingEmbedder()
+    encoder = MicroBatchEncoder(inner, max_batch_size=4, max_wait_ms=50)
+    threads = [threading.Thread(target=encoder.encode, args=([f"t{i}"],)) for i in range(12)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert max(inner.batch_sizes) <= 4
+
+
+def test_encode_errors_propagate_to_callers():
+    class Broken(FakeEmbedder):
+        def encode(self, texts, normalize_embeddings=False):
+            raise RuntimeError("model crashed")
+
+    encoder = MicroBatchEncoder(Broken(), max_batch_size=8, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="model crashed"):
+        encoder.encode(["x"])
+
+
+def test_wrong_row_count_fails_every_caller_in_the_batch():
+    class Short(FakeEmbedder):
+        def encode(self, texts, normalize_embeddings=False):
+            return super().encode(texts[:1])
+
+    encoder = MicroBatchEncoder(Short(), max_batch_size=8, max_wait_ms=1)
+    with pytest.raises(ValueError, match="1 rows for 2 texts"):
+        encoder.encode(["a", "b"])
+
+
+def test_callers_wait_at_most_timeout_s():
+    release = threading.Event()
+
+    class Slow(FakeEmbedder):
+        def encode(self, texts, normalize_embeddings=False):
+            release.wait(5)
+            return super().encode(texts)
+
+    encoder = MicroBatchEncoder(Slow(), max_batch_size=8, max_wait_ms=1, timeout_s=0.1)
+    with pytest.raises(TimeoutError):
+        encoder.encode(["slow"])
+    release.set()
+    assert encoder.encode(["fast"]).shape == (1, FakeEmbedder().get_sentence_embedding_dimension())
+
+
+def test_queued_callers_get_the_error_when_the_thread_dies():
+    class Fatal(BaseException):
+        pass
+
+    started, release = threading.Event(), threading.Event()
+
+    class Dying(FakeEmbedder):
+        calls = 0
+
+        def encode(self, texts, normalize_embeddings=False):
+            Dying.calls += 1
+            if Dying.calls == 1:
+                started.set()
+                release.wait(5)
+                raise Fatal("worker killed")
+            return super().encode(texts)
+
+    encoder = MicroBatchEncoder(Dying(), max_batch_size=1, max_wait_ms=0, timeout_s=5)
+    errors = []
+
+    def call(text):
+        try:
+            encoder.encode([text])
+        except Fatal as exc:
+            errors.append(exc)
+
+    first = threading.Thread(target=call, args=("in batch",))
+    first.start()
+    assert started.wait(5)
+    queued = threading.Thread(target=call, args=("queued",))
+    queued.start()
+    while encoder._requests.empty():
+        time.sleep(0.01)
+    release.set()
+    first.join(5)
+    queued.join(5)
+
+    assert len(errors) == 2
+    # The next call starts a fresh thread.
+    assert encoder.encode(["again"]).shape[0] == 1
+
+
+def test_maybe_batched_respects_env(monkeypatch):
+    inner = FakeEmbedder()
+    monkeypatch.setenv("EMBED_BATCH_MAX_SIZE", "1")
+    assert maybe_batched(inner) is inner
+    monkeypatch.setenv("EMBED_BATCH_MAX_SIZE", "16")
+    wrapped = maybe_batched(inner)
+    assert isinstance(wrapped, MicroBatchEncoder) and wrapped.max_batch_size == 16
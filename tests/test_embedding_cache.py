@@ -0,0 +1,79 @@
+# tests/test_embedding_cache.py
+import os
+
+import numpy as np
+import pytest
+
+from app.embedding_cache import EmbeddingCache
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = EmbeddingCache(max_entries=2, namespace="m")
+    a, b, c = (np.full((1, 4), v, dtype="float32") for v in (1, 2, 3))
+
+    assert cache.get("a") is None
+    cache.put("a", a)
+    cache.put("b", b)
+    np.testing.assert_array_equal(cache.get("a"), a)  # "b" is now least recently used
+    cache.put("c", c)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert (stats["hits"], stats["misses"]) == (3, 2)
+    assert stats["hit_rate"] == pytest.approx(0.6)
+
+
+def test_namespace_separates_models():
+    assert EmbeddingCache(max_entries=1, namespace="m1").key("x") != EmbeddingCache(max_entries=1, namespace="m2").key("x")
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    vec = np.arange(4, dtype="float32").reshape(1, 4)
+    EmbeddingCache(max_entries=8, disk_dir=str(tmp_path), namespace="m").put("recent mood and habits", vec)
+
+    restarted = EmbeddingCache(max_entries=8, disk_dir=str(tmp_path), namespace="m")
+    np.testing.assert_array_equal(restarted.get("recent mood and habits"), vec)
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def _npy_files(root):
+    return sorted(n for _d, _s, names in os.walk(root) for n in names if n.endswith(".npy"))
+
+
+def test_disk_tier_is_bounded_oldest_first(tmp_path):
+    cache = EmbeddingCache(max_entries=0, disk_dir=str(tmp_path), namespace="m", disk_max_files=10)
+    vec = np.ones((1, 4), dtype="float32")
+    for i in range(10):
+        cache.put(f"q{i}", vec)
+        os.utime(cache._path(cache.key(f"q{i}")), (1000 + i, 1000 + i))
+    assert len(_npy_files(tmp_path)) == 10
+
+    cache.put("q10", vec)
+    # Over the limit: pruned to 90%, oldest first.
+    assert len(_npy_files(tmp_path)) == 9
+    assert cache.get("q0") is None and cache.get("q1") is None
+    assert cache.get("q2") is not None and cache.get("q10") is not None
+
+    restarted = EmbeddingCache(max_entries=0, disk_dir=str(tmp_path), namespace="m", disk_max_files=4)
+    assert len(_npy_files(tmp_path)) == 4
+    # The disk hits above refreshed q2 and q10, so they survive the startup prune.
+    assert restarted.get("q2") is not None and restarted.get("q10") is not None
+
+
+def test_rag_query_embeddings_are_cached(client):
+    pytest.importorskip("faiss")
+    from app.rag_store import RagStore
+    from tests.test_rag_store import FakeEmbedder
+
+    embedder = FakeEmbedder()
+    store = RagStore(embedder, query_cache=EmbeddingCache(max_entries=8, namespace="fake"))
+    store.embed_query("recent mood and habits")
+    store.embed_query("recent mood and habits")
+
+    assert embedder.calls == 1
+    assert store.query_cache.stats()["hits"] == 1
+
+    metrics = client.get("/metrics?format=json").json()
+    assert "query_embedding_cache_hit_rate" in metrics
@@ -0,0 +1,135 @@
+# tests/test_embedding_queue.py
+import uuid
+from datetime import date, datetime
+
+import pytest
+
+from app import models
+from app.db import SessionLocal
+from app import embedding_queue as eq
+
+pytest.importorskip("faiss")
+
+from app.rag_store import RagStore  # noqa: E402
+from tests.test_rag_store import FakeEmbedder  # noqa: E402
+
+
+@pytest.fixture()
+def fake_rag(monkeypatch):
+    monkeypatch.setenv("RAG_ENABLED", "1")
+    store = RagStore(FakeEmbedder())
+    monkeypatch.setattr(eq, "get_embedder", lambda: object())
+    monkeypatch.setattr(eq, "get_rag_store", lambda embedder: store)
+    return store
+
+
+def _signup(client) -> dict:
+    email = f"embq_{uuid.uuid4().hex[:8]}@example.com"
+    r = client.post("/auth/signup", json={"email": email, "password": "strongpassword123"})
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_post_checkin_enqueues_instead_of_embedding_inline(client, fake_rag):
+    headers = _signup(client)
+    r = client.post(
+        "/checkins",
+        headers=headers,
+        json={"date": "2025-05-01", "mood": 4, "note": "walked by the river", "habit_results": []},
+    )
+    assert r.status_code == 200, r.text
+    checkin_id = r.json()["id"]
+    assert fake_rag.embedder.calls == 0
+
+    db = SessionLocal()
+    try:
+        assert db.query(models.PendingEmbedding).filter_by(checkin_id=checkin_id).count() == 1
+        assert db.query(models.ReflectionEmbedding).filter_by(checkin_id=checkin_id).count() == 0
+    finally:
+        db.close()
+
+    metrics = client.get("/metrics?format=json").json()
+    assert metrics["embedding_pending_total"] == 1
+    assert metrics["embedding_queue_depth"] >= 1
+
+    assert eq.get_embedding_queue().drain() >= 1
+
+    db = SessionLocal()
+    try:
+        assert db.query(models.PendingEmbedding).filter_by(checkin_id=checkin_id).count() == 0
+        assert db.query(models.ReflectionEmbedding).filter_by(checkin_id=checkin_id).count() == 1
+    finally:
+        db.close()
+    assert client.get("/metrics?format=json").json()["embedding_pending_total"] == 0
+
+
+def test_checkin_without_note_is_not_enqueued(client, fake_rag):
+    headers = _signup(client)
+    r = client.post("/checkins", headers=headers, json={"date": "2025-05-02", "mood": 3, "habit_results": []})
+    assert r.status_code == 200, r.text
+
+    db = SessionLocal()
+    try:
+        assert db.query(models.PendingEmbedding).count() == 0
+    finally:
+        db.close()
+
+
+def test_recover_picks_up_pending_rows_after_restart(client, fake_rag):
+    db = SessionLocal()
+    try:
+        user = models.User(email=f"embq_{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        checkin = models.Checkin(user_id=user.id, date=date(2025, 5, 3), mood=2, note="left over from a crash")
+        db.add(checkin)
+        db.flush()
+        db.add(models.PendingEmbedding(user_id=user.id, checkin_id=checkin.id, created_at=datetime.utcnow()))
+        db.commit()
+        checkin_id = checkin.id
+    finally:
+        db.close()
+
+    fresh = eq.EmbeddingQueue(maxsize=10)  # a new process: nothing in memory yet
+    assert fresh.recover() == 1
+    assert fresh.drain() == 1
+    assert fresh.stats()["processed"] == 1
+
+    db = SessionLocal()
+    try:
+        assert db.query(models.ReflectionEmbedding).filter_by(checkin_id=checkin_id).count() == 1
+    finally:
+        db.close()
+
+
+def test_submit_reports_full_queue(client):
+    q = eq.EmbeddingQueue(maxsize=1)
+    assert q.submit(1) is True
+    assert q.submit(1) is True  # already queued, not a second slot
+    assert q.submit(2) is False
+
+
+def test_dead_rows_are_counted_apart_from_the_backlog_and_can_be_requeued(client):
+    db = SessionLocal()
+    try:
+        user = models.User(email=f"embq_{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for day, attempts, created_at in ((1, 5, datetime(2020, 1, 1)), (2, 1, datetime.utcnow())):
+            checkin = models.Checkin(user_id=user.id, date=date(2025, 6, day), mood=3, note="n")
+            db.add(checkin)
+            db.flush()
+            db.add(models.PendingEmbedding(user_id=user.id, checkin_id=checkin.id, attempts=attempts, created_at=created_at))
+        db.commit()
+
+        stats = eq.pending_embedding_stats(db, max_attempts=5)
+        assert (stats["pending"], stats["dead"]) == (1, 1)
+        assert stats["lag_seconds"] < 60  # the 2020 dead row does not count toward lag
+
+        queue = eq.EmbeddingQueue(maxsize=10, max_attempts=5)
+        assert queue.recover() == 1
+        assert queue.requeue_dead() == 1
+        assert eq.pending_embedding_stats(db, max_attempts=5)["dead"] == 0
+        assert queue.recover() == 1  # the requeued row is swept again
+    finally:
+        db.close()
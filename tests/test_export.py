@@ -0,0 +1,92 @@
+# tests/test_export.py
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+
+def _premium(client, email="export@example.com"):
+    client.post("/auth/signup", json={"email": email, "password": "strongpassword123"})
+    token = client.post("/auth/login", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.post("/upgrade", headers=headers).status_code == 200
+    return headers
+
+
+def _checkins(client, headers, notes):
+    start = date(2025, 1, 1)
+    for i, note in enumerate(notes):
+        body = {"date": str(start + timedelta(days=i)), "mood": 1 + i % 5, "habit_results": []}
+        if note is not None:
+            body["note"] = note
+        assert client.post("/checkins", headers=headers, json=body).status_code == 200
+
+
+def test_json_export_keeps_shape_and_skips_days_without_notes(client):
+    headers = _premium(client)
+    _checkins(client, headers, ["first", None, "third"])
+
+    resp = client.get("/export/reflections", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/json")
+    assert resp.json() == {
+        "count": 2,
+        "reflections": [
+            {"date": "2025-01-01", "mood": 1, "note": "first"},
+            {"date": "2025-01-03", "mood": 3, "note": "third"},
+        ],
+    }
+
+
+def test_ndjson_and_csv_formats(client):
+    headers = _premium(client)
+    _checkins(client, headers, ['walked, then "slept"\nwell', "plain"])
+
+    ndjson = client.get("/export/reflections?format=ndjson", headers=headers)
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [r["note"] for r in lines] == ['walked, then "slept"\nwell', "plain"]
+
+    resp = client.get("/export/reflections?format=csv", headers=headers)
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(resp.text)))
+    assert rows == [["date", "mood", "note"], ["2025-01-01", "1", 'walked, then "slept"\nwell'], ["2025-01-02", "2", "plain"]]
+
+
+def test_after_date_and_limit_paginate_through_everything(client):
+    headers = _premium(client)
+    _checkins(client, headers, [f"note {i}" for i in range(7)])
+
+    seen, url, pages = [], "/export/reflections?format=ndjson&limit=3", 0
+    while url:
+        resp = client.get(url, headers=headers)
+        seen += [json.loads(line)["note"] for line in resp.text.splitlines()]
+        link = resp.headers.get("link")
+        url = link[1 : link.index(">")] if link else None
+        pages += 1
+    assert pages == 3
+    assert seen == [f"note {i}" for i in range(7)]
+
+    page = client.get("/export/reflections?after_date=2025-01-02&limit=2", headers=headers).json()
+    assert [r["date"] for r in page["reflections"]] == ["2025-01-03", "2025-01-04"]
+    assert page["count"] == 2
+    assert page["next_after_date"] == "2025-01-04"
+
+
+def test_conditional_requests(client):
+    headers = _premium(client)
+    _checkins(client, headers, ["one"])
+
+    first = client.get("/export/reflections", headers=headers)
+    etag, last_modified = first.headers["etag"], first.headers["last-modified"]
+
+    assert client.get("/export/reflections", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get("/export/reflections", headers={**headers, "If-Modified-Since": last_modified}).status_code == 304
+    # Different representation, different validator.
+    assert client.get("/export/reflections?format=csv", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    client.post("/checkins", headers=headers, json={"date": "2025-02-01", "mood": 4, "note": "two", "habit_results": []})
+    again = client.get("/export/reflections", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 200
+    assert again.headers["etag"] != etag
+    assert again.json()["count"] == 2
@@ -0,0 +1,146 @@
+# tests/test_feature_snapshot.py
+import logging
+import random
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from app import models
+from app.db import SessionLocal, engine
+from app.services.ai_suggestions import build_features, fetch_last_7_checkins
+from app.services.feature_snapshot import get_features, rebuild_feature_snapshot
+
+
+def _signup(client, email):
+    client.post("/auth/signup", json={"email": email, "password": "strongpassword123"})
+    token = client.post("/auth/login", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _user_id(db, email):
+    return db.query(models.User.id).filter(models.User.email == email).scalar()
+
+
+def test_snapshot_matches_recompute_for_random_histories(client):
+    rng = random.Random(14)
+    today = date.today()
+    emails = [f"features{i}@example.com" for i in range(4)]
+
+    for email in emails:
+        headers = _signup(client, email)
+        habit_ids = [
+            client.post("/habits", headers=headers, json={"name": f"h{j}"}).json()["id"] for j in range(rng.randint(0, 3))
+        ]
+        # Out-of-order writes, including backfills outside the window and a future date.
+        offsets = rng.sample(range(-1, 10), rng.randint(0, 9))
+        for offset in offsets:
+            results = [{"habit_id": hid, "done": rng.random() < 0.6} for hid in habit_ids if rng.random() < 0.8]
+            resp = client.post(
+                "/checkins",
+                headers=headers,
+                json={"date": str(today - timedelta(days=offset)), "mood": rng.randint(1, 5), "habit_results": results},
+            )
+            assert resp.status_code in (200, 201), resp.text
+
+    db = SessionLocal()
+    try:
+        for email in emails:
+            user_id = _user_id(db, email)
+            for days_later in (0, 1, 3, 8):
+                as_of = today + timedelta(days=days_later)
+                expected = build_features(fetch_last_7_checkins(db, user_id, as_of), as_of)
+                assert get_features(db, user_id, as_of, verify=False) == expected, (email, days_later)
+    finally:
+        db.close()
+
+
+def test_missing_snapshot_is_rebuilt_and_verify_mode_repairs_drift(client, caplog):
+    headers = _signup(client, "drift@example.com")
+    today = date.today()
+    for offset, mood in ((0, 5), (1, 3)):
+        client.post("/checkins", headers=headers, json={"date": str(today - timedelta(days=offset)), "mood": mood, "habit_results": []})
+
+    db = SessionLocal()
+    try:
+        user_id = _user_id(db, "drift@example.com")
+        db.query(models.UserFeatureSnapshot).delete()
+        db.commit()
+        assert get_features(db, user_id).mood_avg_7d == 4.0
+        db.commit()
+
+        snapshot = db.query(models.UserFeatureSnapshot).filter_by(user_id=user_id).one()
+        snapshot.mood_sum = 100
+        db.commit()
+        assert get_features(db, user_id, verify=False).mood_avg_7d == 50.0
+
+        with caplog.at_level(logging.WARNING, logger="mindgarden.features"):
+            assert get_features(db, user_id, verify=True).mood_avg_7d == 4.0
+        assert "feature snapshot mismatch" in caplog.text
+        assert get_features(db, user_id, verify=False).mood_avg_7d == 4.0
+    finally:
+        db.close()
+
+
+def test_first_snapshot_insert_race_falls_back_to_the_winners_row(client):
+    headers = _signup(client, "race@example.com")
+    client.post("/checkins", headers=headers, json={"date": str(date.today()), "mood": 2, "habit_results": []})
+
+    db = SessionLocal()
+    try:
+        user_id = _user_id(db, "race@example.com")
+        db.query(models.UserFeatureSnapshot).delete()
+        db.commit()
+
+        raced = []
+
+        def other_request_wins(session, instance):
+            # Another worker inserts the user's first snapshot between our read and insert.
+            if raced:
+                return
+            raced.append(instance)
+            other = SessionLocal()
+            try:
+                rebuild_feature_snapshot(other, user_id=user_id)
+                other.commit()
+            finally:
+                other.close()
+
+        event.listen(db, "after_attach", other_request_wins)
+        try:
+            snapshot = rebuild_feature_snapshot(db, user_id=user_id)
+        finally:
+            event.remove(db, "after_attach", other_request_wins)
+        db.commit()
+        assert raced
+        assert snapshot.mood_sum == 2
+        assert db.query(models.UserFeatureSnapshot).filter_by(user_id=user_id).count() == 1
+    finally:
+        db.close()
+
+
+def test_recompute_path_loads_habit_results_eagerly(client):
+    headers = _signup(client, "eager@example.com")
+    habit_id = client.post("/habits", headers=headers, json={"name": "walk"}).json()["id"]
+    today = date.today()
+    for offset in range(7):
+        client.post(
+            "/checkins",
+            headers=headers,
+            json={"date": str(today - timedelta(days=offset)), "mood": 3, "habit_results": [{"habit_id": habit_id, "done": True}]},
+        )
+
+    db = SessionLocal()
+    try:
+        user_id = _user_id(db, "eager@example.com")
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            features = build_features(fetch_last_7_checkins(db, user_id, today), today)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+    finally:
+        db.close()
+
+    assert features.habit_done_rate_7d == 1.0
+    assert len(statements) == 2  # check-ins + one selectin for all habit results
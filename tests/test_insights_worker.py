@@ -0,0 +1,139 @@
+# tests/test_insights_worker.py
+import json
+import uuid
+from datetime import date, datetime, timedelta
+
+from app import models
+from app.db import SessionLocal
+from app.daily_insights_worker import compute_metrics_for_date, get_fresh_insight, run_batch
+
+
+def _seed_user(db, days, *, end: date, habit_done=True) -> models.User:
+    user = models.User(email=f"worker_{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    habit = models.Habit(user_id=user.id, name="Read", active=True)
+    db.add(habit)
+    db.flush()
+    for i in range(days):
+        c = models.Checkin(user_id=user.id, date=end - timedelta(days=i), mood=1 + i % 5)
+        db.add(c)
+        db.flush()
+        db.add(models.CheckinHabitResult(checkin_id=c.id, habit_id=habit.id, done=habit_done))
+    db.commit()
+    return user
+
+
+def test_run_batch_matches_per_user_computation(client):
+    today = date(2025, 6, 10)
+    db = SessionLocal()
+    try:
+        users = [_seed_user(db, n, end=today) for n in (1, 3, 9)]
+        run = run_batch(db, target_date=today, chunk_size=2)
+
+        assert run.users_processed == 3
+        assert run.rows_upserted == 3
+        assert run.finished_at is not None and run.duration_ms >= 0
+
+        for u in users:
+            expected = compute_metrics_for_date(db, user_id=u.id, target_date=today)
+            row = db.query(models.Insight).filter_by(user_id=u.id, date=today).one()
+            assert row.mood_avg_7d == expected.mood_avg_7d
+            assert json.loads(row.habit_streaks_json)["habits"] == expected.habit_streaks
+    finally:
+        db.close()
+
+
+def test_second_run_only_recomputes_changed_users(client):
+    today = date(2025, 6, 10)
+    db = SessionLocal()
+    try:
+        quiet = _seed_user(db, 2, end=today - timedelta(days=1))
+        busy = _seed_user(db, 2, end=today - timedelta(days=1))
+        run_batch(db, target_date=today)
+
+        # Pretend the first run happened a while ago, then a new check-in arrives.
+        db.query(models.InsightWorkerRun).update({"watermark": datetime.utcnow() - timedelta(minutes=10)})
+        db.query(models.Checkin).update({"updated_at": datetime.utcnow() - timedelta(minutes=20)})
+        db.add(models.Checkin(user_id=busy.id, date=today, mood=5, updated_at=datetime.utcnow()))
+        db.commit()
+
+        run = run_batch(db, target_date=today)
+        assert run.users_processed == 1
+
+        row = db.query(models.Insight).filter_by(user_id=busy.id, date=today).one()
+        assert row.mood_avg_7d == compute_metrics_for_date(db, user_id=busy.id, target_date=today).mood_avg_7d
+        assert db.query(models.Insight).filter_by(user_id=quiet.id, date=today).count() == 1
+    finally:
+        db.close()
+
+
+def test_fresh_insight_goes_stale_on_new_checkin_or_habit(client):
+    today = date(2025, 6, 10)
+    db = SessionLocal()
+    try:
+        user = _seed_user(db, 3, end=today)
+        run_batch(db, target_date=today)
+        assert get_fresh_insight(db, user_id=user.id, target_date=today) is not None
+
+        db.add(models.Habit(user_id=user.id, name="Walk", active=True))
+        db.commit()
+        assert get_fresh_insight(db, user_id=user.id, target_date=today) is None
+
+        run_batch(db, target_date=today + timedelta(days=1))  # new date: window users refreshed
+        run_batch(db, target_date=today)
+        assert get_fresh_insight(db, user_id=user.id, target_date=today) is not None
+    finally:
+        db.close()
+
+
+def _seed_random_history(db, rng, *, end: date, days: int) -> models.User:
+    user = models.User(email=f"prop_{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    habits = [models.Habit(user_id=user.id, name=f"h{i}", active=(i != 2)) for i in range(3)]
+    db.add_all(habits)
+    db.flush()
+
+    p_gap = rng.choice([0.0, 0.05, 0.3])
+    p_done = rng.choice([0.5, 0.9, 1.0])
+    for i in range(days):
+        if rng.random() < p_gap:
+            continue
+        c = models.Checkin(user_id=user.id, date=end - timedelta(days=i), mood=rng.randint(1, 5))
+        db.add(c)
+        db.flush()
+        for h in habits:
+            if rng.random() < 0.1:
+                continue  # no result row for this habit that day
+            db.add(models.CheckinHabitResult(checkin_id=c.id, habit_id=h.id, done=rng.random() < p_done))
+    db.commit()
+    return user
+
+
+def test_streak_engines_match_legacy_python_logic(client):
+    import random
+
+    from app.daily_insights_worker import _compute_habit_streaks, _compute_habit_streaks_legacy
+    from app.streaks import compute_habit_streak, compute_habit_streaks
+
+    rng = random.Random(1234)
+    end = date(2025, 6, 30)
+    db = SessionLocal()
+    try:
+        for _ in range(25):
+            user = _seed_random_history(db, rng, end=end, days=rng.choice([0, 5, 20, 70, 150]))
+            for target in (end, end - timedelta(days=1), end - timedelta(days=rng.randint(2, 40)), end + timedelta(days=1)):
+                expected = _compute_habit_streaks_legacy(db, user_id=user.id, target_date=target)
+                habit_ids = [e["habit_id"] for e in expected]
+
+                chunked = compute_habit_streaks(db, user.id, target, habit_ids, chunk_days=rng.choice([1, 7, 32]))
+                assert [{"habit_id": h, "streak": chunked[h]} for h in habit_ids] == expected, (user.id, target)
+
+                for e in expected:
+                    assert compute_habit_streak(db, user.id, e["habit_id"], target) == e["streak"]
+
+                via_state = _compute_habit_streaks(db, user_id=user.id, target_date=target)
+                assert [{"habit_id": r["habit_id"], "streak": r["streak"]} for r in via_state] == expected, (user.id, target)
+    finally:
+        db.close()
@@ -0,0 +1,119 @@
+# tests/test_metrics_registry.py
+import json
+import os
+from datetime import date
+
+from sqlalchemy import event
+
+from app.db import engine
+from app.observability.registry import Registry, render_prometheus
+from app.routes_metrics import get_db_gauges
+
+
+def _signup(client, email):
+    client.post("/auth/signup", json={"email": email, "password": "strongpassword123"})
+    token = client.post("/auth/login", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_histogram_renders_cumulative_buckets_and_escapes_labels():
+    reg = Registry()
+    hist = reg.histogram("demo_ms", "Demo latency", ("route",), buckets=(10, 100))
+    for value in (3, 50, 50, 5000):
+        hist.observe(value, route='/x/"{id}"')
+    reg.counter("demo_total", "Demo counter").inc(2)
+
+    text = reg.render()
+    assert "# TYPE demo_ms histogram" in text
+    assert 'demo_ms_bucket{route="/x/\\"{id}\\"",le="10"} 1' in text
+    assert 'demo_ms_bucket{route="/x/\\"{id}\\"",le="100"} 3' in text
+    assert 'demo_ms_bucket{route="/x/\\"{id}\\"",le="+Inf"} 4' in text
+    assert 'demo_ms_count{route="/x/\\"{id}\\""} 4' in text
+    assert 'demo_ms_sum{route="/x/\\"{id}\\""} 5103' in text
+    assert "demo_total 2" in text
+
+
+def test_multiprocess_snapshots_are_merged(tmp_path):
+    reg = Registry(multiproc_dir=str(tmp_path))
+    reg.counter("jobs_total", "Jobs", ("kind",)).inc(kind="a")
+    reg.histogram("job_ms", "Job time", buckets=(10,)).observe(5)
+    reg.gauge("depth", "Queue depth", lambda: 3)
+
+    # Snapshot left behind by a worker that has since exited.
+    other = Registry()
+    other.counter("jobs_total", "Jobs", ("kind",)).inc(4, kind="a")
+    other.histogram("job_ms", "Job time", buckets=(10,)).observe(50)
+    other.gauge("depth", "Queue depth", lambda: 100)
+    snap = other.snapshot()
+    snap["pid"] = 2**22 + 12345
+    (tmp_path / f"metrics_{snap['pid']}.json").write_text(json.dumps(snap))
+
+    text = reg.render()
+    assert os.path.exists(tmp_path / f"metrics_{os.getpid()}.json")
+    assert 'jobs_total{kind="a"} 5' in text
+    assert 'job_ms_bucket{le="10"} 1' in text
+    assert "job_ms_count 2" in text
+    assert "depth 3" in text  # the dead worker's gauge is dropped
+
+    assert render_prometheus([reg.snapshot(), snap]).count("jobs_total{") == 1
+
+
+def test_gauge_merge_modes():
+    snaps = []
+    for value in (2, 6):
+        reg = Registry()
+        reg.gauge("shared", "Same figure in every worker", lambda v=value: v, merge="max")
+        reg.gauge("rate", "Per-worker ratio", lambda v=value: v / 10, merge="mean")
+        reg.gauge("unset", "Not known yet", lambda: None, merge="max")
+        snaps.append(reg.snapshot())
+
+    text = render_prometheus(snaps)
+    assert "shared 6" in text
+    assert "rate 0.4" in text
+    assert "\nunset " not in text
+
+
+def test_prometheus_scrape_uses_registry_without_db(client):
+    headers = _signup(client, "registry@example.com")
+    habit_id = client.post("/habits", headers=headers, json={"name": "walk"}).json()["id"]
+    client.delete(f"/habits/{habit_id}", headers=headers)
+    assert client.get("/ai/suggestions", headers=headers).status_code == 200
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        resp = client.get("/metrics?format=prometheus")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert resp.status_code == 200
+    assert statements == []
+    text = resp.text
+    assert 'mindgarden_http_requests_total{method="DELETE",route="/habits/{habit_id}",status="204"} 1' in text
+    assert 'mindgarden_ai_requests_total{endpoint="/ai/suggestions",provider="rules",outcome="ok"} 1' in text
+    assert 'mindgarden_ai_latency_ms_count{endpoint="/ai/suggestions",provider="rules"} 1' in text
+    assert 'mindgarden_db_query_duration_ms_count{statement="select"}' in text
+    assert "mindgarden_embedding_queue_depth" in text
+
+
+def test_db_derived_series_are_scraped_from_the_last_refresh(client):
+    headers = _signup(client, "gauges@example.com")
+    body = {"date": str(date.today()), "mood": 4, "note": "slept well", "habit_results": []}
+    assert client.post("/checkins", headers=headers, json=body).status_code == 200
+    get_db_gauges().refresh()
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        text = client.get("/metrics?format=prometheus").text
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert statements == []
+    assert "mindgarden_checkins_today 1" in text
+    assert "mindgarden_ai_suggestions_count_today 0" in text
+    assert "mindgarden_embedding_dead_total 0" in text
+    assert "# TYPE mindgarden_embedding_pending_total gauge" in text
+    assert "# TYPE mindgarden_query_embedding_cache_hit_rate gauge" in text
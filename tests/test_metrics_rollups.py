@@ -0,0 +1,142 @@
+# tests/test_metrics_rollups.py
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import models
+from app.db import SessionLocal, engine
+from app.observability.rollups import (
+    DAY,
+    MINUTE,
+    LATENCY_BUCKETS_MS,
+    RollupAccumulator,
+    backfill_rollups,
+    hist_quantile,
+    prune_rollups,
+    read_rollups,
+)
+
+
+def _signup(client, email):
+    client.post("/auth/signup", json={"email": email, "password": "strongpassword123"})
+    token = client.post("/auth/login", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_hist_quantile_stays_within_bucket_of_exact_p95():
+    rng = random.Random(17)
+    latencies = [int(rng.lognormvariate(4, 1)) for _ in range(2000)]
+    acc = RollupAccumulator()
+    at = datetime(2026, 1, 1, 12, 0, 0)
+    for ms in latencies:
+        acc.record(user_id=1, endpoint="/ai/suggestions", provider="rules", latency_ms=ms, success=True, at=at)
+    hist = next(agg.hist for key, agg in acc._pending.items() if key[1] == MINUTE)
+
+    exact = sorted(latencies)[int(round(0.95 * (len(latencies) - 1)))]
+    estimate = hist_quantile(hist, 0.95)
+    bounds = (0,) + LATENCY_BUCKETS_MS
+    i = next(i for i, b in enumerate(LATENCY_BUCKETS_MS) if exact <= b)
+    assert bounds[i] <= estimate <= bounds[i + 1]
+    assert hist_quantile([0] * len(hist), 0.95) is None
+
+
+def test_flush_merges_into_existing_buckets(client):
+    at = datetime.utcnow().replace(second=5, microsecond=0)
+    first, second = RollupAccumulator(), RollupAccumulator()
+    first.record(user_id=7, endpoint="/ai/suggestions", provider="rules", latency_ms=40, success=True, at=at)
+    second.record(user_id=7, endpoint="/ai/suggestions", provider="rules", latency_ms=400, success=False, cache_hit=True, at=at)
+    assert first.flush() == 2
+    assert second.flush() == 2
+    assert first.flush() == 0
+
+    db = SessionLocal()
+    try:
+        assert db.query(models.AIMetricsRollup).count() == 2
+        start = at.replace(second=0)
+        minute = read_rollups(db, start=start, end=start + timedelta(minutes=1), bucket_seconds=MINUTE)
+        assert (minute.count, minute.error_count, minute.cache_hits, minute.latency_avg_ms) == (2, 1, 1, 220.0)
+
+        daily = read_rollups(db, start=start - timedelta(days=1), end=start + timedelta(days=1), bucket_seconds=DAY, user_id=7)
+        assert daily.count == 2
+        assert read_rollups(db, start=start, end=start + timedelta(days=1), bucket_seconds=DAY, user_id=8).count == 0
+    finally:
+        db.close()
+
+
+def test_metrics_reads_rollups_not_raw_events(client):
+    headers = _signup(client, "rollup@example.com")
+    for _ in range(3):
+        assert client.get("/ai/suggestions", headers=headers).status_code == 200
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        metrics = client.get("/metrics?format=json").json()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert metrics["ai_suggestions_count_today"] == 3
+    assert metrics["ai_suggestions_latency_ms_p95_today"] is not None
+    assert not any("FROM ai_request_events" in s for s in statements)
+
+    analytics = client.get("/metrics/analytics?days=7", headers=headers).json()
+    assert analytics["ai_suggestions_count_window"] == 3
+    assert analytics["ai_suggestions_latency_ms_avg_window"] is not None
+
+
+def test_prune_rollups_keeps_daily_rows(client):
+    old = datetime.utcnow() - timedelta(days=30)
+    acc = RollupAccumulator()
+    acc.record(user_id=1, endpoint="/ai/suggestions", provider="rules", latency_ms=10, success=True, at=old)
+    acc.flush()
+
+    db = SessionLocal()
+    try:
+        assert prune_rollups(db, older_than=timedelta(days=14)) == 1
+        assert [r.bucket_seconds for r in db.query(models.AIMetricsRollup).all()] == [DAY]
+    finally:
+        db.close()
+
+
+def test_backfill_folds_in_events_from_before_the_rollups(client):
+    headers = _signup(client, "history@example.com")
+    live = datetime.utcnow().replace(microsecond=0)
+    db = SessionLocal()
+    try:
+        user_id = db.query(models.User.id).scalar()
+        for days_ago, latency_ms, cache_hit in ((3, 50, False), (3, 150, True), (20, 80, False)):
+            db.add(
+                models.AIRequestEvent(
+                    user_id=user_id,
+                    endpoint="/ai/suggestions",
+                    provider="rules",
+                    latency_ms=latency_ms,
+                    success=True,
+                    cache_hit=cache_hit,
+                    created_at=live - timedelta(days=days_ago),
+                )
+            )
+        db.commit()
+        # The live accumulator has been writing since `live`; its events stay as they are.
+        acc = RollupAccumulator()
+        acc.record(user_id=user_id, endpoint="/ai/suggestions", provider="rules", latency_ms=10, success=True, at=live)
+        acc.flush()
+
+        assert backfill_rollups(db, before=live) == 3
+        window = read_rollups(db, start=live - timedelta(days=7), end=live + timedelta(days=1), bucket_seconds=DAY, user_id=user_id)
+        assert (window.count, window.cache_hits, window.latency_sum_ms) == (3, 1, 210)
+        minutes = read_rollups(db, start=live - timedelta(days=30), end=live + timedelta(days=1), bucket_seconds=MINUTE)
+        assert minutes.count == 4
+
+        # Running again folds nothing in twice.
+        assert backfill_rollups(db) == 0
+        with pytest.raises(ValueError):
+            backfill_rollups(db, before=live)
+    finally:
+        db.close()
+
+    analytics = client.get("/metrics/analytics?days=30", headers=headers).json()
+    assert analytics["ai_suggestions_count_window"] == 4
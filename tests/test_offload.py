@@ -0,0 +1,41 @@
+# tests/test_offload.py
+import asyncio
+import threading
+import time
+
+from app.offload import run_model_work, shutdown_model_executor
+
+
+def test_model_work_runs_off_the_event_loop(monkeypatch):
+    monkeypatch.setenv("AI_MODEL_WORKERS", "2")
+    shutdown_model_executor()
+
+    def blocking(x):
+        time.sleep(0.2)
+        return x, threading.current_thread().name
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        t = asyncio.create_task(ticker())
+        results = await asyncio.gather(run_model_work(blocking, 1), run_model_work(blocking, 2))
+        t.cancel()
+        return results, ticks
+
+    start = time.perf_counter()
+    try:
+        results, ticks = asyncio.run(run())
+    finally:
+        shutdown_model_executor()
+    elapsed = time.perf_counter() - start
+
+    assert [r[0] for r in results] == [1, 2]
+    assert all(name.startswith("ai-model") for _x, name in results)
+    assert elapsed < 0.35  # both calls ran in parallel
+    assert ticks >= 5  # the loop kept serving other work meanwhile
@@ -0,0 +1,164 @@
+# tests/test_ollama_client.py
+import asyncio
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import ollama_client
+from app.services.ai_suggestions import maybe_ollama_polish_with_provider
+from app.services.ollama_client import CircuitBreaker, CircuitOpenError, build_ollama_client
+
+
+class StubOllama:
+    """Minimal keep-alive HTTP/1.1 server answering POST /api/generate."""
+
+    def __init__(self, status=200, response="Do one habit today. Then write one line about it."):
+        self.status = status
+        self.response = response
+        self.requests = 0
+        self.client_ports = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                stub.requests += 1
+                stub.client_ports.add(self.client_address[1])
+                body = json.dumps({"response": stub.response}).encode("utf-8")
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _reset_shared_client():
+    ollama_client._CLIENT = None
+    yield
+    ollama_client._CLIENT = None
+
+
+def test_sequential_generates_reuse_one_connection():
+    async def run(url):
+        client = build_ollama_client(url)
+        try:
+            for _ in range(5):
+                data = await client.generate({"model": "m", "prompt": "p", "stream": False})
+                assert data["response"]
+        finally:
+            await client.aclose()
+
+    with StubOllama() as stub:
+        asyncio.run(run(stub.url))
+
+    assert stub.requests == 5
+    assert len(stub.client_ports) == 1
+
+
+def test_polish_path_uses_shared_client(monkeypatch):
+    async def run():
+        for _ in range(3):
+            out, provider = await maybe_ollama_polish_with_provider("Do one habit.", "gentle", {})
+            assert provider == "ollama"
+            assert out.startswith("Do one habit today")
+        await ollama_client.close_ollama_client()
+
+    with StubOllama() as stub:
+        monkeypatch.setenv("AI_PROVIDER", "hybrid")
+        monkeypatch.setenv("OLLAMA_URL", stub.url)
+        asyncio.run(run())
+
+    assert stub.requests == 3
+    assert len(stub.client_ports) == 1
+
+
+def test_breaker_skips_ollama_after_consecutive_failures(monkeypatch):
+    monkeypatch.setenv("OLLAMA_BREAKER_FAILURES", "2")
+    monkeypatch.setenv("OLLAMA_BREAKER_RESET_SECONDS", "60")
+
+    async def run(url):
+        client = build_ollama_client(url)
+        try:
+            for _ in range(2):
+                with pytest.raises(Exception):
+                    await client.generate({"model": "m", "prompt": "p"})
+            with pytest.raises(CircuitOpenError):
+                await client.generate({"model": "m", "prompt": "p"})
+        finally:
+            await client.aclose()
+
+    with StubOllama(status=500) as stub:
+        asyncio.run(run(stub.url))
+
+    assert stub.requests == 2
+
+
+def test_breaker_half_open_trial():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.allow() is False
+
+    now[0] = 10.0
+    assert breaker.allow() is True  # the single trial call
+    assert breaker.allow() is False
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 20.0
+    assert breaker.allow() is True
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() is True
+
+
+def test_cancelled_half_open_trial_hands_the_slot_back():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 10.0
+
+    # Accepts connections but never answers.
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    async def run():
+        client = build_ollama_client(f"http://127.0.0.1:{server.getsockname()[1]}", breaker=breaker)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(client.generate({"model": "m", "prompt": "p"}), timeout=0.2)
+        finally:
+            await client.aclose()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.close()
+
+    assert breaker.state == "half-open"
+    assert breaker.allow() is True  # the next trial is let through
@@ -0,0 +1,48 @@
+# tests/test_openapi_cache.py
+from fastapi import APIRouter
+
+from app import main
+
+
+def test_both_paths_share_one_cached_payload_with_etag(client, monkeypatch):
+    calls = []
+    build = main._build_openapi_schema
+    monkeypatch.setattr(main, "_build_openapi_schema", lambda: calls.append(1) or build())
+    main.openapi_cache.invalidate()
+
+    first = client.get("/openapi.json")
+    second = client.get("/api/openapi.json")
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert first.headers["etag"] == second.headers["etag"]
+    assert "/checkins" in first.json()["paths"]
+    assert len(calls) == 1
+
+    cached = client.get("/api/openapi.json", headers={"If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert len(calls) == 1
+    # Same conditional-request rules as the other endpoints (app/http_caching.py).
+    assert client.get("/openapi.json", headers={"If-None-Match": "*"}).status_code == 304
+    assert client.get("/openapi.json", headers={"If-None-Match": '"other", ' + first.headers["etag"]}).status_code == 304
+    assert client.get("/openapi.json", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_routes_added_later_invalidate_the_cache(client):
+    before = client.get("/openapi.json")
+
+    router = APIRouter()
+
+    @router.get("/late-route")
+    def late_route():
+        return {}
+
+    main.app.include_router(router)
+    try:
+        after = client.get("/openapi.json", headers={"If-None-Match": before.headers["etag"]})
+        assert after.status_code == 200
+        assert after.headers["etag"] != before.headers["etag"]
+        assert "/late-route" in after.json()["paths"]
+    finally:
+        main.app.router.routes[:] = [r for r in main.app.router.routes if getattr(r, "path", None) != "/late-route"]
+        main.openapi_cache.invalidate()
@@ -0,0 +1,55 @@
+# tests/test_password_hashing.py
+import pytest
+
+from app import models, password_hashing
+from app.db import SessionLocal
+from app.password_hashing import PasswordHasher, PasswordHashPoolFull
+
+
+def _stored_hash(email):
+    db = SessionLocal()
+    try:
+        return db.query(models.User.hashed_password).filter(models.User.email == email).scalar()
+    finally:
+        db.close()
+
+
+def test_process_pool_hashes_and_bounds_pending_work():
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=1000)
+    try:
+        hashed = hasher.hash("pw123456")
+        assert hashed.startswith("$pbkdf2-sha256$1000$")
+        assert hasher.verify_and_update("pw123456", hashed) == (True, None)
+        assert hasher.verify_and_update("wrong", hashed) == (False, None)
+
+        hasher._pending = hasher.max_pending  # every slot taken by in-flight logins
+        with pytest.raises(PasswordHashPoolFull):
+            hasher.hash("pw123456")
+    finally:
+        hasher.shutdown()
+
+
+def test_login_rehashes_when_rounds_change(client, monkeypatch):
+    payload = {"email": "rehash@example.com", "password": "strongpassword123"}
+    client.post("/auth/signup", json=payload)
+    old = _stored_hash(payload["email"])
+    assert f"${password_hashing.DEFAULT_ROUNDS}$" in old
+
+    monkeypatch.setattr(password_hashing, "_HASHER", PasswordHasher(workers=0, max_pending=1, rounds=1000))
+    assert client.post("/auth/login", json=payload).status_code == 200
+    new = _stored_hash(payload["email"])
+    assert new.startswith("$pbkdf2-sha256$1000$")
+
+    assert client.post("/auth/login", json=payload).status_code == 200
+    assert _stored_hash(payload["email"]) == new  # already current: no rewrite
+    assert client.post("/auth/login", json={**payload, "password": "nope"}).status_code == 401
+
+
+def test_saturated_pool_returns_503_with_retry_after(client, monkeypatch):
+    busy = PasswordHasher(workers=1, max_pending=1)
+    busy._pending = 1
+    monkeypatch.setattr(password_hashing, "_HASHER", busy)
+
+    resp = client.post("/auth/signup", json={"email": "busy@example.com", "password": "strongpassword123"})
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
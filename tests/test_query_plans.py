@@ -0,0 +1,262 @@
+# tests/test_query_plans.py
+"""
+Query plan regression suite: runs each hot query through the code that issues it,
+captures the SELECTs it sends, and fails if the planner answers any of them with a
+full table scan.
+
+SQLite (EXPLAIN QUERY PLAN) always runs. PostgreSQL (EXPLAIN with enable_seqscan off,
+so tiny test tables still show whether an index path exists) runs when
+TEST_POSTGRES_URL points at a throwaway database; its tables are dropped and recreated.
+"""
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.db import Base, SessionLocal
+from app.migrations import ensure_indexes
+from app.observability.rate_limit import DatabaseRateLimitBackend
+from app.observability.rollups import DAY, MINUTE, empty_hist, read_rollups
+from app.rag_store import RagStore, faiss
+from app.routes_checkins import fetch_checkins_page
+from app.routes_export import _reflections_query
+from app.services.ai_suggestions import fetch_last_7_checkins
+from app.services.feature_snapshot import latest_note_in_window, rebuild_feature_snapshot
+
+TODAY = date(2025, 6, 30)
+DIM = 8
+
+
+class _Embedder:
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+
+def _seed(db: Session) -> int:
+    users = [models.User(email=f"plan{i}@example.com", hashed_password="x") for i in range(3)]
+    db.add_all(users)
+    db.flush()
+    for user in users:
+        habits = [models.Habit(user_id=user.id, name=f"h{j}") for j in range(2)]
+        db.add_all(habits)
+        db.flush()
+        for d in range(20):
+            day = TODAY - timedelta(days=d)
+            checkin = models.Checkin(user_id=user.id, date=day, mood=1 + d % 5, note=f"note {d}")
+            db.add(checkin)
+            db.flush()
+            db.add_all(models.CheckinHabitResult(checkin_id=checkin.id, habit_id=h.id, done=d % 2 == 0) for h in habits)
+            db.add(
+                models.ReflectionEmbedding(
+                    user_id=user.id,
+                    checkin_id=checkin.id,
+                    checkin_date=day,
+                    text=checkin.note,
+                    embedding=np.ones(DIM, dtype="float32").tobytes(),
+                )
+            )
+            at = datetime.combine(day, datetime.min.time())
+            db.add(models.RateLimitEvent(user_id=user.id, endpoint="/ai/suggestions", created_at=at))
+            db.add(models.AIRequestEvent(user_id=user.id, endpoint="/ai/suggestions", latency_ms=5, created_at=at))
+            for size, owner in ((MINUTE, 0), (DAY, user.id)):
+                db.add(
+                    models.AIMetricsRollup(
+                        bucket_start=at,
+                        bucket_seconds=size,
+                        user_id=owner,
+                        endpoint="/ai/suggestions",
+                        provider=f"rules-{user.id}",
+                        count=1,
+                        latency_hist_json=json.dumps(empty_hist()),
+                    )
+                )
+    db.commit()
+    return users[1].id
+
+
+def _hot_queries(db: Session, user_id: int):
+    window_start = datetime.combine(TODAY - timedelta(days=6), datetime.min.time())
+    window_end = window_start + timedelta(days=7)
+
+    def rag_index():
+        if faiss is None:
+            pytest.skip("faiss-cpu is not installed")
+        RagStore(_Embedder(), query_cache=object())._build_index(db, user_id=user_id, version=1)
+
+    return {
+        "checkins_7d_window": lambda: fetch_last_7_checkins(db, user_id, TODAY),
+        "feature_snapshot_rebuild": lambda: rebuild_feature_snapshot(db, user_id=user_id, today=TODAY),
+        "latest_note_in_window": lambda: latest_note_in_window(db, user_id, TODAY),
+        "rate_limit_window": lambda: DatabaseRateLimitBackend().hit(
+            key=f"{user_id}:/ai/suggestions", limit=1000, window_seconds=3600, db=db
+        ),
+        "ai_request_events_user_window": lambda: (
+            db.query(models.AIRequestEvent.latency_ms)
+            .filter(models.AIRequestEvent.user_id == user_id)
+            .filter(models.AIRequestEvent.created_at >= window_start)
+            .filter(models.AIRequestEvent.created_at < window_end)
+            .all()
+        ),
+        "reflection_embeddings_for_user": rag_index,
+        "rollups_user_daily": lambda: read_rollups(db, start=window_start, end=window_end, bucket_seconds=DAY, user_id=user_id),
+        "rollups_global_minutes": lambda: read_rollups(db, start=window_start, end=window_end, bucket_seconds=MINUTE),
+        "export_page": lambda: (
+            _reflections_query(db, user_id, TODAY - timedelta(days=10))
+            .with_entities(models.Checkin.date, models.Checkin.mood, models.Checkin.note)
+            .order_by(models.Checkin.date.asc())
+            .limit(5)
+            .all()
+        ),
+        "checkins_calendar_page": lambda: fetch_checkins_page(
+            db,
+            user_id=user_id,
+            start=TODAY - timedelta(days=30),
+            end=TODAY,
+            after_date=TODAY - timedelta(days=10),
+            limit=5,
+            fields=("date", "mood"),
+        ),
+        "checkins_page_with_results": lambda: fetch_checkins_page(
+            db, user_id=user_id, start=TODAY - timedelta(days=30), end=TODAY, after_date=None, limit=5
+        ),
+    }
+
+
+def _captured_selects(db: Session, run) -> list:
+    bind = db.get_bind()
+    seen = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            seen.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", on_execute)
+    try:
+        run()
+    finally:
+        event.remove(bind, "before_cursor_execute", on_execute)
+        db.rollback()
+    assert seen, "hot query issued no SELECT"
+    return seen
+
+
+# Index constraint SQLite must report for each query: every filter column is served by
+# one composite index, not just its leading user_id column.
+EXPECTED_SQLITE_SEARCH = {
+    "checkins_7d_window": "(user_id=? AND date>? AND date<?)",
+    "feature_snapshot_rebuild": "(user_id=? AND date>?)",
+    "latest_note_in_window": "(user_id=? AND date>? AND date<?)",
+    "rate_limit_window": "(user_id=? AND endpoint=? AND created_at>?)",
+    "ai_request_events_user_window": "(user_id=? AND created_at>? AND created_at<?)",
+    "reflection_embeddings_for_user": "USING INDEX ix_reflection_embeddings_user_date",
+    "rollups_user_daily": "(user_id=? AND bucket_seconds=? AND bucket_start>? AND bucket_start<?)",
+    "rollups_global_minutes": "(user_id=? AND bucket_seconds=? AND bucket_start>? AND bucket_start<?)",
+    "export_page": "(user_id=? AND date>?)",
+    "checkins_calendar_page": "COVERING INDEX ix_checkins_user_date_mood (user_id=? AND date>? AND date<?)",
+    "checkins_page_with_results": "(user_id=? AND date>? AND date<?)",
+}
+
+
+def _sqlite_plan(db: Session, statement: str, parameters) -> list:
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return [r[-1] for r in rows]
+
+
+def _sqlite_full_scans(details: list) -> list:
+    # "SCAN <table>" (with or without an index) walks the whole table; "SEARCH" is a lookup.
+    # A temp b-tree means rows were sorted after the fact instead of read in index order.
+    return [
+        d
+        for d in details
+        if (d.startswith("SCAN ") and d.split()[1] in Base.metadata.tables) or "TEMP B-TREE" in d
+    ]
+
+
+def _postgres_seq_scans(db: Session, statement: str, parameters) -> list:
+    conn = db.connection()
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    found = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan":
+            found.append(f"Seq Scan on {node.get('Relation Name')}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return found
+
+
+HOT_QUERY_NAMES = list(_hot_queries(None, 0))
+
+
+@pytest.fixture()
+def sqlite_db(client):
+    db = SessionLocal()
+    try:
+        yield db, _seed(db)
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("name", HOT_QUERY_NAMES)
+def test_sqlite_hot_query_uses_indexes(sqlite_db, name):
+    db, user_id = sqlite_db
+    plans = []
+    for statement, parameters in _captured_selects(db, _hot_queries(db, user_id)[name]):
+        details = _sqlite_plan(db, statement, parameters)
+        db.rollback()
+        assert not _sqlite_full_scans(details), f"{name}: {details}\n{statement}"
+        plans += details
+    assert any(EXPECTED_SQLITE_SEARCH[name] in d for d in plans), f"{name}: {plans}"
+
+
+@pytest.fixture(scope="module")
+def postgres_sessionmaker():
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    db = factory()
+    try:
+        user_id = _seed(db)
+    finally:
+        db.close()
+    yield factory, user_id
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("name", HOT_QUERY_NAMES)
+def test_postgres_hot_query_uses_indexes(postgres_sessionmaker, name):
+    factory, user_id = postgres_sessionmaker
+    db = factory()
+    try:
+        for statement, parameters in _captured_selects(db, _hot_queries(db, user_id)[name]):
+            scans = _postgres_seq_scans(db, statement, parameters)
+            db.rollback()
+            assert not scans, f"{name}: {scans}\n{statement}"
+    finally:
+        db.close()
+
+
+def test_ensure_indexes_adds_composite_indexes_to_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_rate_limit_events_user_endpoint_created")
+        conn.exec_driver_sql("DROP INDEX ix_checkins_user_date_mood")
+
+    assert ensure_indexes(engine) == ["ix_checkins_user_date_mood", "ix_rate_limit_events_user_endpoint_created"]
+    names = {ix["name"] for ix in inspect(engine).get_indexes("rate_limit_events")}
+    assert "ix_rate_limit_events_user_endpoint_created" in names
+    assert ensure_indexes(engine) == []
@@ -0,0 +1,199 @@
+# tests/test_rag_store.py
+import hashlib
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app import models
+from app.db import SessionLocal
+
+faiss = pytest.importorskip("faiss")
+
+from app.rag_store import (  # noqa: E402
+    RagStore,
+    UserIndexCache,
+    _bump_index_version,
+    _bump_index_version_fallback,
+    _CachedIndex,
+)
+
+DIM = 16
+
+
+class FakeEmbedder:
+    """Deterministic per-text vectors so tests don't need a real model."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIM
+
+    def encode(self, texts, normalize_embeddings=False):
+        self.calls += 1
+        out = []
+        for t in texts:
+            seed = int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:4], "little")
+            out.append(np.random.default_rng(seed).standard_normal(DIM).astype("float32"))
+        return np.vstack(out)
+
+
+def _make_user(db) -> models.User:
+    user = models.User(email=f"rag_{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _add_checkin(db, store, user, d: date, note: str) -> None:
+    c = models.Checkin(user_id=user.id, date=d, mood=3, note=note)
+    db.add(c)
+    db.flush()
+    store.add_reflection_for_checkin(db=db, user_id=user.id, checkin=c)
+    db.commit()
+
+
+def test_query_returns_exact_note_first_and_reuses_cached_index(client):
+    store = RagStore(FakeEmbedder())
+    db = SessionLocal()
+    try:
+        user = _make_user(db)
+        start = date(2025, 1, 1)
+        for i in range(5):
+            _add_checkin(db, store, user, start + timedelta(days=i), f"note number {i}")
+
+        store.index_cache.clear()
+        results = store.query_reflections(db=db, user_id=user.id, query_text="note number 3", k=2)
+        assert results[0].text == "note number 3"
+
+        cached = store.index_cache.get(user.id, 5)
+        assert cached is not None and cached.index.ntotal == 5
+
+        # Second query must hit the same cached index object
+        store.query_reflections(db=db, user_id=user.id, query_text="note number 1", k=2)
+        assert store.index_cache.get(user.id, 5) is cached
+    finally:
+        db.close()
+
+
+def test_add_reflection_appends_to_cached_index_in_place(client):
+    store = RagStore(FakeEmbedder())
+    db = SessionLocal()
+    try:
+        user = _make_user(db)
+        _add_checkin(db, store, user, date(2025, 2, 1), "first")
+        store.query_reflections(db=db, user_id=user.id, query_text="first", k=1)
+        cached = store.index_cache.get(user.id, 1)
+
+        _add_checkin(db, store, user, date(2025, 2, 2), "second")
+
+        assert store.index_cache.get(user.id, 2) is cached
+        assert cached.index.ntotal == 2
+        results = store.query_reflections(db=db, user_id=user.id, query_text="second", k=1)
+        assert results[0].text == "second"
+    finally:
+        db.close()
+
+
+def test_rollback_does_not_leave_phantom_vector(client):
+    store = RagStore(FakeEmbedder())
+    db = SessionLocal()
+    try:
+        user = _make_user(db)
+        _add_checkin(db, store, user, date(2025, 3, 1), "kept")
+        store.query_reflections(db=db, user_id=user.id, query_text="kept", k=1)
+
+        c = models.Checkin(user_id=user.id, date=date(2025, 3, 2), mood=3, note="rolled back")
+        db.add(c)
+        db.flush()
+        store.add_reflection_for_checkin(db=db, user_id=user.id, checkin=c)
+        db.rollback()
+
+        cached = store.index_cache.get(user.id, 1)
+        assert cached is not None and cached.index.ntotal == 1
+    finally:
+        db.close()
+
+
+def test_write_from_another_worker_invalidates_cache(client):
+    store_a = RagStore(FakeEmbedder())
+    store_b = RagStore(FakeEmbedder())  # simulates a second API process
+    db = SessionLocal()
+    try:
+        user = _make_user(db)
+        _add_checkin(db, store_a, user, date(2025, 4, 1), "from worker a")
+        store_a.query_reflections(db=db, user_id=user.id, query_text="x", k=5)
+
+        _add_checkin(db, store_b, user, date(2025, 4, 2), "from worker b")
+
+        results = store_a.query_reflections(db=db, user_id=user.id, query_text="from worker b", k=5)
+        assert {r.text for r in results} == {"from worker a", "from worker b"}
+        assert results[0].text == "from worker b"
+    finally:
+        db.close()
+
+
+def test_dev_reseed_invalidates_cached_index(client, monkeypatch):
+    from app.routes_dev import seed_demo
+
+    store = RagStore(FakeEmbedder())
+    db = SessionLocal()
+    try:
+        user = _make_user(db)
+        _add_checkin(db, store, user, date(2025, 5, 1), "before the reseed")
+        assert store.query_reflections(db=db, user_id=user.id, query_text="before the reseed", k=1)
+
+        monkeypatch.setenv("ENABLE_DEV_ROUTES", "1")
+        monkeypatch.setenv("DEV_SEED_KEY", "k")
+        monkeypatch.setenv("DEMO_EMAIL", user.email)
+        seed_db = SessionLocal()
+        try:
+            seed_demo(db=seed_db, x_dev_seed_key="k")
+        finally:
+            seed_db.close()
+
+        # The next reflection must not be appended onto the index of the deleted ones
+        # (whose ids SQLite may even hand out again).
+        _add_checkin(db, store, user, date(2025, 5, 2), "after the reseed")
+        results = store.query_reflections(db=db, user_id=user.id, query_text="before the reseed", k=5)
+        assert [r.text for r in results] == ["after the reseed"]
+    finally:
+        db.close()
+
+
+def test_index_version_bump_upserts_the_first_row(client):
+    db = SessionLocal()
+    try:
+        user, other = _make_user(db), _make_user(db)
+        assert [_bump_index_version(db, user.id) for _ in range(3)] == [1, 2, 3]
+        db.commit()
+        # Dialects without ON CONFLICT: UPDATE, else INSERT.
+        now = datetime.utcnow()
+        assert _bump_index_version_fallback(db, other.id, now) == 1
+        assert _bump_index_version_fallback(db, other.id, now) == 2
+        assert _bump_index_version(db, user.id) == 4
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_index_cache_evicts_least_recently_used_by_size():
+    def entry_of(n: int):
+        index = faiss.IndexFlatIP(DIM)
+        index.add(np.zeros((n, DIM), dtype="float32"))
+        return _CachedIndex(version=1, index=index, reflection_ids=list(range(n)))
+
+    one_entry = 10 * DIM * 4
+    cache = UserIndexCache(max_bytes=2 * one_entry)
+    cache.put(1, entry_of(10))
+    cache.put(2, entry_of(10))
+    assert cache.get(1, 1) is not None  # touch user 1 -> user 2 is now LRU
+
+    cache.put(3, entry_of(10))
+
+    assert cache.get(2, 1) is None
+    assert cache.get(1, 1) is not None
+    assert cache.get(3, 1) is not None
+    assert cache.stats()["bytes"] <= cache.max_bytes
@@ -0,0 +1,150 @@
+# tests/test_rate_limit.py
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.db import SessionLocal
+from app.observability.rate_limit import (
+    DatabaseRateLimitBackend,
+    FallbackRateLimitBackend,
+    InMemoryRateLimitBackend,
+    SharedStoreRateLimitBackend,
+    prune_rate_limit_events,
+    set_rate_limit_backend,
+)
+
+
+class FakeClock:
+    def __init__(self, t: float):
+        self.t = t
+
+    def __call__(self) -> float:
+        return self.t
+
+
+class FakeRedis:
+    """Just enough of redis-py for the shared-store backend."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    def incr(self, k):
+        self.data[k] = int(self.data.get(k, 0)) + 1
+        return self.data[k]
+
+    def decr(self, k):
+        self.data[k] = int(self.data.get(k, 0)) - 1
+        return self.data[k]
+
+    def get(self, k):
+        v = self.data.get(k)
+        return None if v is None else str(v).encode()
+
+    def expire(self, k, seconds):
+        self.ttl[k] = seconds
+
+
+@pytest.fixture(params=["memory", "shared"])
+def backend_and_clock(request):
+    clock = FakeClock(3600 * 1000)  # start exactly on a window boundary
+    if request.param == "memory":
+        return InMemoryRateLimitBackend(clock=clock), clock
+    return SharedStoreRateLimitBackend(FakeRedis(), clock=clock), clock
+
+
+def test_sliding_window_allows_limit_then_blocks(backend_and_clock):
+    backend, clock = backend_and_clock
+    for _ in range(3):
+        assert backend.hit(key="1:/x", limit=3, window_seconds=60).allowed
+    decision = backend.hit(key="1:/x", limit=3, window_seconds=60)
+    assert not decision.allowed
+    # All 3 hits are in the current window: wait for the roll-over (60s) plus the time
+    # for the carried-over estimate 3 * (60 - e) / 60 to drop to 2 (e >= 20s).
+    assert decision.retry_after == 80
+
+    assert backend.hit(key="2:/x", limit=3, window_seconds=60).allowed  # other users unaffected
+
+
+def test_retry_after_is_accurate(backend_and_clock):
+    backend, clock = backend_and_clock
+    for _ in range(3):
+        backend.hit(key="1:/x", limit=3, window_seconds=60)
+    decision = backend.hit(key="1:/x", limit=3, window_seconds=60)
+
+    clock.t += decision.retry_after - 1
+    assert not backend.hit(key="1:/x", limit=3, window_seconds=60).allowed
+    clock.t += 1
+    assert backend.hit(key="1:/x", limit=3, window_seconds=60).allowed
+
+
+def test_in_memory_backend_drops_idle_keys():
+    clock = FakeClock(3600 * 1000)
+    backend = InMemoryRateLimitBackend(clock=clock, sweep_seconds=60)
+    for user in range(100):
+        backend.hit(key=f"{user}:/x", limit=3, window_seconds=60)
+
+    clock.t += 60  # the previous window still counts
+    backend.hit(key="0:/x", limit=3, window_seconds=60)
+    assert len(backend._windows) == 100
+
+    clock.t += 60
+    backend.hit(key="0:/x", limit=3, window_seconds=60)
+    assert list(backend._windows) == ["0:/x"]
+
+
+def test_rejected_hits_are_not_counted_in_shared_store():
+    store = FakeRedis()
+    backend = SharedStoreRateLimitBackend(store, clock=FakeClock(0))
+    for _ in range(5):
+        backend.hit(key="1:/x", limit=2, window_seconds=60)
+    assert list(store.data.values()) == [2]
+
+
+def test_fallback_uses_db_when_store_is_down(client):
+    class Down:
+        def incr(self, k):
+            raise ConnectionError("redis down")
+
+    db = SessionLocal()
+    try:
+        user = models.User(email=f"rl_{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        backend = FallbackRateLimitBackend(SharedStoreRateLimitBackend(Down()), DatabaseRateLimitBackend())
+        assert backend.hit(key=f"{user.id}:/x", limit=1, window_seconds=60, db=db).allowed
+        decision = backend.hit(key=f"{user.id}:/x", limit=1, window_seconds=60, db=db)
+        assert not decision.allowed
+        assert 1 <= decision.retry_after <= 60
+    finally:
+        db.close()
+
+
+def test_db_backend_endpoint_and_retention(client):
+    set_rate_limit_backend(DatabaseRateLimitBackend())
+    try:
+        os.environ["AI_PROVIDER"] = "rules"
+        r = client.post(
+            "/auth/signup",
+            json={"email": f"rl_{uuid.uuid4().hex[:8]}@example.com", "password": "strongpassword123"},
+        )
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        for _ in range(10):
+            assert client.post("/ai/deep_dive", json={}, headers=headers).status_code == 403
+        blocked = client.post("/ai/deep_dive", json={}, headers=headers)
+        assert blocked.status_code == 429
+        assert 3590 <= int(blocked.headers["Retry-After"]) <= 3600
+    finally:
+        set_rate_limit_backend(None)
+
+    db = SessionLocal()
+    try:
+        db.query(models.RateLimitEvent).update({"created_at": datetime.utcnow() - timedelta(days=3)})
+        db.commit()
+        assert prune_rate_limit_events(db, older_than=timedelta(hours=48)) == 10
+        assert db.query(models.RateLimitEvent).count() == 0
+    finally:
+        db.close()
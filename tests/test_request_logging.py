@@ -0,0 +1,97 @@
+# tests/test_request_logging.py
+import json
+import logging
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.observability.logging_config import build_formatter
+from app.observability.middleware import RequestLoggingMiddleware
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _captured():
+    handler = _Capture()
+    logging.getLogger("mindgarden.request").addHandler(handler)
+    return handler
+
+
+def _demo_app(**kwargs) -> FastAPI:
+    demo = FastAPI()
+
+    @demo.get("/ok/{item_id}")
+    def ok(item_id: int, request: Request):
+        request.state.user_id = 42
+        return {"item_id": item_id}
+
+    @demo.get("/missing")
+    def missing():
+        raise HTTPException(status_code=404)
+
+    @demo.get("/stream")
+    def stream():
+        return StreamingResponse((f"chunk{i}\n" for i in range(3)), media_type="text/plain")
+
+    demo.add_middleware(RequestLoggingMiddleware, **kwargs)
+    return demo
+
+
+def test_logs_status_duration_and_user_id_from_request_state():
+    handler = _captured()
+    try:
+        with TestClient(_demo_app()) as c:
+            assert c.get("/ok/7").status_code == 200
+            assert c.get("/stream").text == "chunk0\nchunk1\nchunk2\n"
+    finally:
+        logging.getLogger("mindgarden.request").removeHandler(handler)
+
+    first, second = handler.records
+    assert (first.method, first.path, first.status_code, first.user_id) == ("GET", "/ok/7", 200, 42)
+    assert isinstance(first.duration_ms, int)
+    assert (second.path, second.status_code, second.user_id) == ("/stream", 200, None)
+
+
+def test_user_id_set_by_auth_dependency_is_logged(client):
+    client.post("/auth/signup", json={"email": "logme@example.com", "password": "strongpassword123"})
+    token = client.post("/auth/login", json={"email": "logme@example.com", "password": "strongpassword123"}).json()["access_token"]
+    handler = _captured()
+    try:
+        assert client.get("/habits", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    finally:
+        logging.getLogger("mindgarden.request").removeHandler(handler)
+
+    assert [(r.path, r.user_id is not None) for r in handler.records] == [("/habits", True)]
+
+
+def test_sampling_drops_only_successful_requests():
+    handler = _captured()
+    try:
+        with TestClient(_demo_app(sample_rate_2xx=0.25, rand=iter([0.1, 0.9, 0.9]).__next__)) as c:
+            c.get("/ok/1")  # 0.1 < 0.25: kept
+            c.get("/ok/2")  # 0.9: sampled out
+            c.get("/missing")  # errors are never sampled
+            c.get("/ok/3")  # 0.9: sampled out
+    finally:
+        logging.getLogger("mindgarden.request").removeHandler(handler)
+
+    assert [(r.path, r.status_code) for r in handler.records] == [("/ok/1", 200), ("/missing", 404)]
+
+
+def test_json_formatter_emits_one_object_per_record():
+    record = logging.LogRecord("mindgarden.request", logging.INFO, __file__, 1, "request", None, None)
+    record.method, record.path, record.status_code, record.duration_ms = "GET", "/habits", 200, 3
+    entry = json.loads(build_formatter("json").format(record))
+    assert entry["msg"] == "request"
+    assert (entry["path"], entry["status_code"], entry["user_id"]) == ("/habits", 200, None)
+
+    bare = logging.LogRecord("mindgarden.request", logging.INFO, __file__, 1, "started", None, None)
+    assert "method=- path=-" in build_formatter("text").format(bare)
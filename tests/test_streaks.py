@@ -1,7 +1,15 @@
 # tests/test_streaks.py
+import uuid
 from datetime import date, timedelta
 
-from app.streaks import compute_streak_from_daily_done
+from app import models, streaks
+from app.db import SessionLocal
+from app.streaks import (
+    _runs_from_done_dates,
+    compute_streak_from_daily_done,
+    rebuild_streak_state,
+    streak_from_state,
+)
 
 
 def test_no_history_streak_zero():
@@ -58,3 +66,151 @@ def test_today_false_streak_zero():
     today = date(2025, 12, 16)
     daily = {today: False}
     assert compute_streak_from_daily_done(daily, today) == 0
+
+
+# --- Materialized streak state (habit_streak_state) ---
+
+
+def test_runs_from_done_dates_current_and_longest():
+    d = date(2025, 12, 1)
+    days = [d, d + timedelta(days=1), d + timedelta(days=2), d + timedelta(days=5), d + timedelta(days=6)]
+    assert _runs_from_done_dates(days) == (2, d + timedelta(days=6), 3)
+    assert _runs_from_done_dates([]) == (0, None, 0)
+
+
+def _signup(client) -> dict:
+    r = client.post(
+        "/auth/signup",
+        json={"email": f"streak_{uuid.uuid4().hex[:8]}@example.com", "password": "strongpassword123"},
+    )
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _state(habit_id):
+    db = SessionLocal()
+    try:
+        s = db.query(models.HabitStreakState).filter_by(habit_id=habit_id).one()
+        return s.current_streak, s.last_done_date, s.longest_streak
+    finally:
+        db.close()
+
+
+def test_streak_state_maintained_on_checkin_and_repaired_on_backfill(client):
+    headers = _signup(client)
+    habit_id = client.post("/habits", json={"name": "Run"}, headers=headers).json()["id"]
+    d0 = date(2025, 3, 1)
+
+    def post(d, done):
+        r = client.post(
+            "/checkins",
+            headers=headers,
+            json={"date": str(d), "mood": 3, "habit_results": [{"habit_id": habit_id, "done": done}]},
+        )
+        assert r.status_code == 200, r.text
+
+    post(d0, True)
+    post(d0 + timedelta(days=1), True)
+    post(d0 + timedelta(days=2), True)
+    assert _state(habit_id) == (3, d0 + timedelta(days=2), 3)
+
+    post(d0 + timedelta(days=4), True)  # gap on day 3
+    assert _state(habit_id) == (1, d0 + timedelta(days=4), 3)
+
+    post(d0 + timedelta(days=3), True)  # backfill closes the gap -> repair from history
+    assert _state(habit_id) == (5, d0 + timedelta(days=4), 5)
+
+    post(d0 + timedelta(days=5), False)
+    assert _state(habit_id) == (5, d0 + timedelta(days=4), 5)
+
+    db = SessionLocal()
+    try:
+        state = db.query(models.HabitStreakState).filter_by(habit_id=habit_id).one()
+        assert streak_from_state(state, d0 + timedelta(days=4)) == 5
+        assert streak_from_state(state, d0 + timedelta(days=5)) == 0
+        assert streak_from_state(state, d0 + timedelta(days=2)) is None
+
+        rebuilt = rebuild_streak_state(db, user_id=state.user_id, habit_ids=[habit_id])[habit_id]
+        assert (rebuilt.current_streak, rebuilt.last_done_date, rebuilt.longest_streak) == (5, d0 + timedelta(days=4), 5)
+    finally:
+        db.close()
+
+
+def test_multi_habit_streaks_single_query_for_short_streaks(client):
+    from sqlalchemy import event
+
+    from app.db import engine
+    from app.streaks import compute_habit_streaks
+
+    db = SessionLocal()
+    try:
+        user = models.User(email=f"multi_{uuid.uuid4().hex[:8]}@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        a, b = models.Habit(user_id=user.id, name="a"), models.Habit(user_id=user.id, name="b")
+        db.add_all([a, b])
+        db.flush()
+        today = date(2025, 12, 16)
+        for i in range(5):
+            c = models.Checkin(user_id=user.id, date=today - timedelta(days=i), mood=3)
+            db.add(c)
+            db.flush()
+            db.add(models.CheckinHabitResult(checkin_id=c.id, habit_id=a.id, done=True))
+            db.add(models.CheckinHabitResult(checkin_id=c.id, habit_id=b.id, done=i < 2))
+        db.commit()
+        user_id, a_id, b_id = user.id, a.id, b.id
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            result = compute_habit_streaks(db, user_id, today)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+
+        assert result == {a_id: 5, b_id: 2}
+        assert len(statements) == 1
+    finally:
+        db.close()
+
+
+def test_state_row_created_concurrently_is_reused_not_a_500_or_409(client, monkeypatch):
+    headers = _signup(client)
+    habit_id = client.post("/habits", json={"name": "Read"}, headers=headers).json()["id"]
+    real_insert = streaks._insert_streak_state
+    raced = []
+
+    def other_request_inserts_first(db, *, user_id, habit_id):
+        # Another request inserts the (user, habit) row between our read and our insert.
+        raced.append(habit_id)
+        db.execute(
+            models.HabitStreakState.__table__.insert().values(
+                user_id=user_id, habit_id=habit_id, current_streak=7, longest_streak=7
+            )
+        )
+        return real_insert(db, user_id=user_id, habit_id=habit_id)
+
+    monkeypatch.setattr(streaks, "_insert_streak_state", other_request_inserts_first)
+
+    # POST /checkins: the missing row is rebuilt from history (a false 409 before).
+    today = date.today()
+    r = client.post(
+        "/checkins",
+        headers=headers,
+        json={"date": str(today), "mood": 4, "habit_results": [{"habit_id": habit_id, "done": True}]},
+    )
+    assert r.status_code == 200, r.text
+    assert raced == [habit_id]
+    assert _state(habit_id) == (1, today, 1)
+
+    # GET /insights/today: the read path rebuilds a missing row too (a 500 before).
+    db = SessionLocal()
+    try:
+        db.query(models.HabitStreakState).delete()
+        db.commit()
+    finally:
+        db.close()
+    r = client.get("/insights/today", headers=headers)
+    assert r.status_code == 200, r.text
+    assert raced == [habit_id, habit_id]
+    assert _state(habit_id) == (1, today, 1)
@@ -0,0 +1,118 @@
+# tests/test_suggestion_cache.py
+import itertools
+from datetime import date
+
+from sqlalchemy import create_engine, inspect
+
+from app import models
+from app.db import SessionLocal
+from app.migrations import add_missing_columns
+from app.services import ai_suggestions
+from app.services.suggestion_cache import SuggestionCache, suggestion_fingerprint
+
+CTX = {"days_with_checkins": 3, "mood_avg_7d": 3.4, "habit_done_rate_7d": 0.42, "streak_broken": False}
+
+
+def test_fingerprint_buckets_features_and_ignores_date():
+    a = suggestion_fingerprint(template="t", tone="gentle", ctx={**CTX, "latest_checkin_date": "2025-01-01"}, model="m")
+    b = suggestion_fingerprint(
+        template="t",
+        tone="gentle",
+        ctx={**CTX, "mood_avg_7d": 3.6, "habit_done_rate_7d": 0.38, "latest_checkin_date": "2025-02-01"},
+        model="m",
+    )
+    assert a == b
+    assert a != suggestion_fingerprint(template="t", tone="gentle", ctx={**CTX, "mood_avg_7d": 2.0}, model="m")
+    assert a != suggestion_fingerprint(template="t", tone="gentle", ctx=CTX, model="other")
+
+
+def test_user_is_not_served_the_same_variant_twice():
+    cache = SuggestionCache(max_keys=10, variants_per_key=2, user_history=2)
+    cache.put("k", "first", user_id=1)
+
+    # Another user shares the cached text; its author doesn't get it back.
+    assert cache.get("k", user_id=2) == "first"
+    assert cache.get("k", user_id=1) is None
+
+    cache.put("k", "second", user_id=1)
+    assert cache.get("k", user_id=2) == "second"
+    # User 2 has now seen both variants.
+    assert cache.get("k", user_id=2) is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_ttl_and_lru_eviction():
+    now = [0.0]
+    cache = SuggestionCache(max_keys=2, ttl_seconds=10, user_history=0, clock=lambda: now[0])
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a", user_id=1) == "A"  # "a" is now most recent
+    cache.put("c", "C")
+    assert cache.get("b", user_id=1) is None
+    assert cache.get("a", user_id=1) == "A"
+
+    now[0] = 11.0
+    assert cache.get("a", user_id=1) is None
+    assert cache.stats()["keys"] == 1  # expired "a" dropped on access
+
+
+def test_add_missing_columns_upgrades_old_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE ai_request_events (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "endpoint VARCHAR NOT NULL, provider VARCHAR NOT NULL, latency_ms INTEGER NOT NULL, "
+            "success BOOLEAN NOT NULL, created_at DATETIME NOT NULL)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO ai_request_events (user_id, endpoint, provider, latency_ms, success, created_at) "
+            "VALUES (1, '/ai/suggestions', 'rules', 5, 1, '2025-01-01 00:00:00')"
+        )
+
+    assert "ai_request_events.cache_hit" in add_missing_columns(engine)
+    assert "cache_hit" in {c["name"] for c in inspect(engine).get_columns("ai_request_events")}
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT cache_hit FROM ai_request_events").scalar() in (0, False)
+    assert add_missing_columns(engine) == []
+
+
+def test_similar_users_share_polished_suggestion(client, monkeypatch):
+    monkeypatch.setenv("AI_PROVIDER", "hybrid")
+    monkeypatch.setenv("OLLAMA_URL", "http://ollama.invalid")
+    counter = itertools.count(1)
+
+    async def fake_polish(suggestion, tone, ctx):
+        return f"Polished take {next(counter)}.", "ollama"
+
+    monkeypatch.setattr(ai_suggestions, "maybe_ollama_polish_with_provider", fake_polish)
+
+    tokens = []
+    for i in range(3):
+        email = f"cache{i}@example.com"
+        client.post("/auth/signup", json={"email": email, "password": "strongpassword123"})
+        token = client.post("/auth/login", json={"email": email, "password": "strongpassword123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        resp = client.post("/checkins", headers=headers, json={"date": str(date.today()), "mood": 4, "habit_results": []})
+        assert resp.status_code in (200, 201), resp.text
+        tokens.append(headers)
+
+    first = client.get("/ai/suggestions", headers=tokens[0]).json()
+    second = client.get("/ai/suggestions", headers=tokens[1]).json()
+    third = client.get("/ai/suggestions", headers=tokens[2]).json()
+    assert first["suggestion"] == second["suggestion"] == third["suggestion"] == "Polished take 1."
+    assert {first["provider"], second["provider"]} == {"ollama"}
+
+    # The first user asks again: they get a fresh variant instead of the one they saw.
+    again = client.get("/ai/suggestions", headers=tokens[0]).json()
+    assert again["suggestion"] == "Polished take 2."
+
+    db = SessionLocal()
+    try:
+        hits = [e.cache_hit for e in db.query(models.AIRequestEvent).order_by(models.AIRequestEvent.id).all()]
+    finally:
+        db.close()
+    assert hits == [False, True, True, False]
+
+    metrics = client.get("/metrics?format=json").json()
+    assert metrics["ai_suggestions_cache_hits_today"] == 2
+    assert metrics["ai_suggestions_cache_hit_rate_today"] == 0.5